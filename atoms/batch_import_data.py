@@ -0,0 +1,125 @@
+import os
+import glob
+import numpy
+from atoms import atoms_helpers
+from atoms.dataset import Dataset
+from atoms.import_data import ImportData
+from concurrent.futures import ProcessPoolExecutor
+
+
+class BatchImportData:
+    """
+    BatchImportData class: import, normalize and split multiple .mat files in parallel. Each file is processed by an
+    ImportData object in a pool of worker processes, and the results are returned in the same order of the input
+    files.
+
+    To bound the memory used by the workers, each worker processes one file at a time, does not cache the loaded data,
+    and returns to the main process only the generated datasets.
+    """
+    def __init__(self, n_workers=None, debug=False):
+        self.debug = debug
+        self.n_workers = os.cpu_count() if n_workers is None else n_workers
+        self.datasets = {}
+        self.scale_factors = {}
+        self.helpers = atoms_helpers.Helpers()
+
+        if debug:
+            self.logger = atoms_helpers.Helpers.init_logger()
+
+    def __str__(self):
+        return f" BatchImportData class object \n" \
+               f" Number of workers: {self.n_workers} \n" \
+               f" Imported files: {list(self.datasets.keys())}"
+
+    def ingest(self, files, variables_list, data_list=None, splitting_values=None, ref_data_name='time',
+               normalize_list=None, normalize_mode='max_abs', concatenate=False):
+        """
+        Import multiple .mat files. For each file, the following steps are done (see the ImportData class):
+            - load the data in variables_list;
+            - normalize the data in normalize_list (optional);
+            - split the data in data_list at the splitting_values (optional).
+        :param files: a list of .mat files, or a glob pattern (e.g. 'data/dataset_test_bench_*.mat'). Files matching
+        the pattern are sorted by name.
+        :param variables_list: the list of variables to load from each file.
+        :param data_list: the list of data in each dataset. If None, variables_list is used.
+        :param splitting_values: the values at which to split the data. If None, data are not split and each file
+        generates a single dataset.
+        :param ref_data_name: the name of the data which contains the splitting_values.
+        :param normalize_list: the list of data to normalize. If None, data are not normalized. Note that each file is
+        normalized with its own scale factors, which are stored in self.scale_factors.
+        :param normalize_mode: the normalization mode (see ImportData.normalize).
+        :param concatenate: if True, all datasets are concatenated in a single dataset.
+        :return: a dict with the datasets of each file, or a single Dataset object if concatenate is True.
+        """
+        if isinstance(files, str):
+            files = sorted(glob.glob(files))
+        elif not isinstance(files, list):
+            raise ValueError('[ingest]: files must be a list or a glob pattern.')
+
+        if len(files) == 0:
+            raise ValueError('[ingest]: no files to import.')
+
+        if self.helpers.check_if_list_or_string(variables_list) == 'str':
+            variables_list = [variables_list]
+        data_list = variables_list if data_list is None else data_list
+
+        tasks = [(file_name, variables_list, data_list, splitting_values, ref_data_name, normalize_list,
+                  normalize_mode) for file_name in files]
+
+        if self.n_workers == 1:
+            results = [_ingest_file(task) for task in tasks]
+        else:
+            # map returns the results in the order of the tasks, independently of the order of completion
+            with ProcessPoolExecutor(max_workers=min(self.n_workers, len(tasks))) as executor:
+                results = list(executor.map(_ingest_file, tasks))
+
+        for file_name, (datasets, scale_factors) in zip(files, results):
+            self.datasets.update({file_name: datasets})
+            self.scale_factors.update({file_name: scale_factors})
+            if self.debug:
+                self.logger.debug(f'[ingest]: file {file_name} imported, {len(datasets)} datasets generated.')
+
+        if concatenate:
+            return self.concatenate(files)
+        else:
+            return {file_name: self.datasets[file_name] for file_name in files}
+
+    def concatenate(self, files=None):
+        """
+        Concatenate the datasets of the imported files in a single dataset, in the order of the files and of the
+        datasets of each file. All datasets must have the same columns.
+        :param files: the list of files whose datasets are concatenated. If None, all imported files are used.
+        :return: a Dataset object.
+        """
+        files = list(self.datasets.keys()) if files is None else files
+        datasets = [dataset for file_name in files for dataset in self.datasets[file_name].values()]
+
+        if len(datasets) == 0:
+            raise ValueError('[concatenate]: no datasets to concatenate.')
+        for dataset in datasets:
+            if dataset.names != datasets[0].names:
+                raise ValueError('[concatenate]: all datasets must have the same columns.')
+
+        return Dataset(datasets[0].names, numpy.concatenate([dataset.values for dataset in datasets], axis=0))
+
+
+def _ingest_file(task):
+
+    # process a single file in a worker process. Data are not cached, and only the datasets are returned
+    file_name, variables_list, data_list, splitting_values, ref_data_name, normalize_list, normalize_mode = task
+    import_data = ImportData()
+    import_data.load(file_name, variables_list, use_cache=False)
+
+    if normalize_list is not None:
+        import_data.normalize(normalize_list, mode=normalize_mode)
+
+    if splitting_values is None:
+        datasets = {'dataset_0': Dataset(data_list, [import_data.data[data_name] for data_name in data_list])}
+    else:
+        import_data.split(data_list, splitting_values, ref_data_name)
+        datasets = import_data.datasets
+
+    # lazily loaded data are read before being sent to the main process
+    datasets = {dataset_name: Dataset(dataset.names, dataset.values) for dataset_name, dataset in datasets.items()}
+
+    return datasets, import_data.scale_factors
@@ -0,0 +1,149 @@
+import os
+import numpy as np
+from atoms.atoms_helpers import Helpers
+from atoms.linearMPC import LinearMPC
+from atoms.mpc_simulator import ClosedLoopSimulator
+from concurrent.futures import ProcessPoolExecutor
+
+# MPC problem of the worker process, set up once by the pool initializer and reused for all scenarios
+_worker_mpc = None
+
+
+class BatchLinearMPC:
+    """
+    BatchLinearMPC class: solve the same MPC problem (see the LinearMPC class) for many scenarios, i.e. initial
+    states and references, in parallel. Each worker process sets up and factorizes the QP once, and then only updates
+    x_0 and x_r for each scenario. Scenarios are sent to the workers in chunks, and the results are returned stacked in
+    the order of the scenarios. Each scenario starts OSQP from zero, so that the results do not depend on the order in
+    which the workers process the scenarios. Likewise, the previous input u_prev of each scenario is the one of the MPC
+    variables.
+
+    Scenarios which OSQP does not solve are not fatal: their results (in closed loop, from the failed step on) are set
+    to NaN, and their indexes are stored in self.failed.
+    """
+    def __init__(self, variables, formulation='sparse', n_workers=None, debug=False):
+        """
+        :param variables: the variables of the MPC problem (see LinearMPC.setup). x_0 and x_r are the default initial
+        state and reference of the scenarios.
+        :param formulation: the formulation of the QP (see LinearMPC.setup).
+        :param n_workers: the maximum number of worker processes. If None, the number of CPUs is used. With 1 worker,
+        scenarios are solved in the calling process.
+        """
+        self.variables = variables
+        self.formulation = formulation
+        self.n_workers = os.cpu_count() if n_workers is None else n_workers
+        self.failed = []
+        self.debug = debug
+
+        if self.n_workers < 1:
+            raise ValueError('[BatchLinearMPC]: the number of workers must be positive.')
+
+        if debug:
+            self.logger = Helpers.init_logger()
+
+    def __str__(self):
+        return f" BatchLinearMPC class object \n" \
+               f" Number of workers: {self.n_workers} \n" \
+               f" Formulation: {self.formulation}"
+
+    def solve(self, x_0, x_r=None):
+        """
+        Solve the MPC problem for each scenario.
+        :param x_0: the initial states, of shape (n_scenarios, n_x).
+        :param x_r: the references, of shape (n_scenarios, n_x) or (n_scenarios, N+1, n_x). If None, the reference of
+        the MPC variables is used for all scenarios.
+        :return: the solutions, of shape (n_scenarios, n_z), with the layout of LinearMPC.solve.
+        """
+        results = self.__run('solve', x_0, x_r, 0)
+        return np.concatenate(results, axis=0)
+
+    def simulate(self, x_0, x_r=None, n_steps=250):
+        """
+        Simulate each scenario in closed loop: at each step, the MPC problem is solved, the first input is applied to
+        the model x(k+1) = A*x(k) + B*u(k), and x_0 is updated.
+        :param x_0: the initial states, of shape (n_scenarios, n_x).
+        :param x_r: the references, of shape (n_scenarios, n_x) or (n_scenarios, N+1, n_x). If None, the reference of
+        the MPC variables is used for all scenarios.
+        :param n_steps: the number of closed loop steps.
+        :return: the states, of shape (n_scenarios, n_steps+1, n_x), and the inputs, of shape
+        (n_scenarios, n_steps, n_u).
+        """
+        results = self.__run('simulate', x_0, x_r, n_steps)
+        states = np.concatenate([result[0] for result in results], axis=0)
+        inputs = np.concatenate([result[1] for result in results], axis=0)
+        return states, inputs
+
+    def __run(self, mode, x_0, x_r, n_steps):
+
+        x_0 = np.atleast_2d(np.asarray(x_0, dtype=float))
+        n_scenarios = x_0.shape[0]
+        if x_r is None:
+            x_r = np.broadcast_to(self.variables['x_r'], (n_scenarios,) + np.shape(self.variables['x_r']))
+        if len(x_r) != n_scenarios:
+            raise ValueError(f'[{mode}]: {n_scenarios} initial states and {len(x_r)} references given.')
+
+        # a few chunks per worker balance the load, with a small overhead per chunk
+        n_workers = min(self.n_workers, n_scenarios)
+        n_chunks = min(n_scenarios, 4 * n_workers)
+        bounds = np.linspace(0, n_scenarios, n_chunks + 1).astype(int)
+        u_prev = np.broadcast_to(np.asarray(self.variables.get('u_prev', 0.0), dtype=float),
+                                 np.shape(self.variables['B'])[1:])
+        tasks = [(mode, x_0[start:stop], x_r[start:stop], n_steps, start, u_prev)
+                 for start, stop in zip(bounds[:-1], bounds[1:])]
+
+        if n_workers == 1:
+            _init_worker(self.variables, self.formulation)
+            results = [_solve_scenarios(task) for task in tasks]
+        else:
+            with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker,
+                                     initargs=(self.variables, self.formulation)) as executor:
+                results = list(executor.map(_solve_scenarios, tasks))
+
+        self.failed = [index for result in results for index in result[-1]]
+        if self.debug:
+            self.logger.debug(f'[{mode}]: {n_scenarios} scenarios solved, {len(self.failed)} failed.')
+
+        return [result[0] if mode == 'solve' else result[:2] for result in results]
+
+
+def _init_worker(variables, formulation):
+
+    # set up the MPC problem once per worker process
+    global _worker_mpc
+    _worker_mpc = LinearMPC()
+    _worker_mpc.setup(variables, formulation=formulation)
+    _worker_mpc.solver.update_settings(verbose=False)
+
+
+def _solve_scenarios(task):
+
+    # solve a chunk of scenarios with the MPC problem of the worker. Returns the results and the failed scenarios
+    mode, x_0, x_r, n_steps, first_index, u_prev = task
+    n_x = _worker_mpc.parameters['n_x']
+    n_u = _worker_mpc.parameters['n_u']
+    failed = []
+
+    if mode == 'solve':
+        solutions = np.full((len(x_0), len(_worker_mpc.parameters['shift_index'])), np.nan)
+        for index in range(len(x_0)):
+            _worker_mpc.update(x_0=x_0[index], x_r=x_r[index], u_prev=u_prev)
+            _worker_mpc.reset_warm_start()
+            try:
+                solutions[index] = _worker_mpc.solve()
+            except ValueError:
+                failed.append(first_index + index)
+        return solutions, failed
+
+    states = np.empty((len(x_0), n_steps + 1, n_x))
+    inputs = np.empty((len(x_0), n_steps, n_u))
+    simulator = ClosedLoopSimulator(_worker_mpc)
+    for index in range(len(x_0)):
+        _worker_mpc.update(x_r=x_r[index])
+        _worker_mpc.reset_warm_start()
+        try:
+            simulator.simulate(x_0[index], n_steps, u_prev=u_prev)
+        except ValueError:
+            failed.append(first_index + index)
+        states[index] = simulator.states
+        inputs[index] = simulator.inputs
+    return states, inputs, failed
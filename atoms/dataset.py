@@ -0,0 +1,122 @@
+import numpy
+from atoms import atoms_helpers
+
+
+class Dataset:
+    """
+    Dataset class: columnar store of the data of a dataset. All columns are stored in a single 2-D array with one row
+    per sample and one column per data, so that the dataset can be used as a feature matrix (e.g. with scikit-learn,
+    the KalmanFilter or the LinearMPC classes) without copying data. Each column can be accessed by name, as in a dict.
+
+    Datasets of lazily loaded data (see Hdf5MatArray) store one lazy object per column, and the 2-D array is read from
+    disk when it is requested.
+    """
+    def __init__(self, names, values):
+        """
+        :param names: the list with the names of the columns.
+        :param values: a 2-D array with one column per name, or a list with one column per name. Columns are stacked in
+        a 2-D array, unless they are lazily loaded.
+        """
+        self.helpers = atoms_helpers.Helpers()
+        self.names = list(names)
+        self.columns = None
+
+        if isinstance(values, list):
+            if any(not isinstance(column, numpy.ndarray) for column in values):
+                # lazily loaded columns are not read
+                self.columns = values
+                values = None
+            else:
+                values = self.stack(values)
+
+        if values is not None and (values.ndim != 2 or values.shape[1] != len(self.names)):
+            raise ValueError(f'[Dataset]: values of shape {values.shape} do not match the {len(self.names)} names.')
+
+        self._values = values
+
+    def __str__(self):
+        return f" Dataset class object \n" \
+               f" Columns: {self.names} \n" \
+               f" Shape: {self.shape}"
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __contains__(self, name):
+        return name in self.names
+
+    def __getitem__(self, name):
+
+        if not self.helpers.check_if_data_in_list(self.names, name):
+            raise KeyError(f'[Dataset]: data {name} not found in the dataset columns.')
+
+        index = self.names.index(name)
+        if self.columns is not None:
+            return self.columns[index]
+        else:
+            # the column is returned as a (n_rows, 1) view, as the data loaded from .mat files
+            return self._values[:, index:index + 1]
+
+    def __array__(self, dtype=None, copy=None):
+        values = self.values
+        return values if dtype is None else values.astype(dtype, copy=False)
+
+    @property
+    def shape(self):
+        if self.columns is not None:
+            return (len(self.columns[0]) if len(self.columns) > 0 else 0), len(self.names)
+        return self._values.shape
+
+    @property
+    def dtype(self):
+        if self.columns is not None:
+            return numpy.result_type(*[column.dtype for column in self.columns])
+        return self._values.dtype
+
+    @property
+    def values(self):
+        """
+        The 2-D array with all data. For datasets of lazily loaded data, the array is read from disk.
+        """
+        if self.columns is not None:
+            return self.stack([numpy.asarray(column) for column in self.columns])
+        return self._values
+
+    def keys(self):
+        return list(self.names)
+
+    def items(self):
+        return [(name, self[name]) for name in self.names]
+
+    def select(self, names):
+        """
+        Get the 2-D array with the selected columns, in the given order. A view is returned when the columns are
+        adjacent in the dataset, otherwise data are copied.
+        :param names: the list of columns to select.
+        """
+        indexes = []
+        for name in names:
+            if not self.helpers.check_if_data_in_list(self.names, name):
+                raise KeyError(f'[select]: data {name} not found in the dataset columns.')
+            indexes.append(self.names.index(name))
+
+        values = self.values
+        if len(indexes) > 0 and indexes == list(range(indexes[0], indexes[0] + len(indexes))):
+            return values[:, indexes[0]:indexes[0] + len(indexes)]
+        else:
+            return values[:, indexes]
+
+    @staticmethod
+    def stack(columns):
+        """
+        Stack columns of the same length in a single C-contiguous 2-D array. Columns can be 1-D or (n_rows, 1) arrays.
+        """
+        n_rows = len(columns[0]) if len(columns) > 0 else 0
+        values = numpy.empty((n_rows, len(columns)), dtype=numpy.result_type(*columns) if len(columns) > 0 else float)
+
+        for index, column in enumerate(columns):
+            if len(column) != n_rows:
+                raise ValueError('[stack]: all columns must have the same length.')
+            values[:, index] = numpy.reshape(column, n_rows)
+
+        return values
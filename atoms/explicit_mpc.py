@@ -0,0 +1,238 @@
+import numpy as np
+from atoms.atoms_helpers import Helpers
+from atoms.linearMPC import LinearMPC
+
+
+class ExplicitLinearMPC:
+    """
+    ExplicitLinearMPC class: explicit (offline) version of the LinearMPC class, for small problems. The condensed QP
+
+            minimize 0.5*u^T*H*u + (F*x_0 + f)^T*u    s.t.    G*u <= w + E*x_0
+
+    is a multi-parametric QP in the initial state x_0, whose solution is a piecewise-affine law u = K_i*x_0 + k_i over
+    polyhedral critical regions {x_0: H_i*x_0 <= h_i}, one for each optimal active set of constraints. The regions
+    are discovered offline by sampling the initial states in a box and solving the QP with OSQP: the active set of
+    each new solution gives a new region, with its affine law from the KKT conditions.
+
+    At runtime, the first input u(0) is evaluated by point location: the region of the previous call is checked
+    first, then all the regions at once. Initial states outside the discovered regions are solved online with OSQP.
+    The law is computed for the references of the setup variables.
+    """
+    def __init__(self, debug=False):
+        self.mpc = LinearMPC()
+        self.parameters = {}
+        self.regions = {}
+        self.n_fallbacks = 0
+        self.debug = debug
+
+        if debug:
+            self.logger = Helpers.init_logger()
+
+    def __str__(self):
+        return f" ExplicitLinearMPC class object \n" \
+               f" Number of regions: {len(self.regions.get('active_sets', []))} \n" \
+               f" Number of fallbacks to OSQP: {self.n_fallbacks}"
+
+    def setup(self, variables, x_box=None, n_samples=2000, seed=0, tolerance=1e-6):
+        """
+        Compute the explicit control law.
+        :param variables: the variables of the MPC problem (see LinearMPC.setup).
+        :param x_box: the box of initial states (x_box_min, x_box_max) where the regions are discovered. If None,
+        the limits on the states are used, which must be finite.
+        :param n_samples: the number of initial states sampled in the box.
+        :param seed: the seed of the random samples.
+        :param tolerance: the tolerance of the region inequalities and of the active constraints.
+        """
+        # the regions and the counters of a previous setup belong to a different problem
+        self.parameters = {}
+        self.regions = {}
+        self.n_fallbacks = 0
+
+        self.mpc.setup(variables, formulation='condensed', warm_start='none')
+        self.mpc.solver.update_settings(verbose=False, eps_abs=1e-9, eps_rel=1e-9, max_iter=100000)
+        self.parameters.update({'tolerance': tolerance})
+        self.__setup_mpqp()
+
+        n_x = self.parameters['n_x']
+        x_box = (self.mpc.parameters['x_min'], self.mpc.parameters['x_max']) if x_box is None else x_box
+        x_box = (np.broadcast_to(np.asarray(x_box[0], dtype=float), n_x),
+                 np.broadcast_to(np.asarray(x_box[1], dtype=float), n_x))
+        if not np.all(np.isfinite(x_box[0]) & np.isfinite(x_box[1])):
+            raise ValueError('[setup]: the box of initial states must be finite, provide x_box.')
+
+        # each sample is solved with OSQP, and its active set (if new) gives a region
+        samples = np.random.default_rng(seed).uniform(x_box[0], x_box[1], (n_samples, n_x))
+        regions = {}
+        for x_0 in samples:
+            if self.__locate(x_0, regions) is not None:
+                regions['hits'][regions['last']] += 1
+                continue
+            active_set = self.__active_set(x_0)
+            if active_set is None or active_set.tobytes() in regions.get('keys', {}):
+                continue
+            region = self.__region(active_set)
+            if region is not None:
+                self.__add_region(regions, active_set, *region)
+
+        # the regions visited more often are checked first
+        if regions:
+            order = np.argsort(regions['hits'])[::-1]
+            self.regions = {}
+            for index in order:
+                self.__add_region(self.regions, regions['active_sets'][index], regions['K'][index],
+                                  regions['k'][index], regions['inequalities'][index], regions['bounds'][index])
+                self.regions['hits'][-1] = regions['hits'][index]
+
+        if self.debug:
+            self.logger.debug(f'[setup]: {len(self.regions.get("active_sets", []))} regions from {n_samples} '
+                              f'samples.')
+
+    def evaluate(self, x_0):
+        """
+        Evaluate the explicit control law.
+        :param x_0: the initial state.
+        :return: the first input u(0), of shape (n_u,).
+        """
+        region = self.__locate(x_0, self.regions)
+        if region is not None:
+            return self.regions['K'][region].dot(x_0) + self.regions['k'][region]
+
+        # initial state outside the discovered regions: solve the QP online
+        self.n_fallbacks += 1
+        self.mpc.update(x_0=x_0)
+        return self.mpc.solve().u_0.copy()
+
+    def validate(self, x_0=None, n_samples=200, seed=1):
+        """
+        Compare the explicit control law with the OSQP solution of the QP.
+        :param x_0: the initial states, of shape (n_samples, n_x). If None, states are sampled in the box of the
+        limits on the states.
+        :param n_samples: the number of sampled initial states.
+        :param seed: the seed of the random samples.
+        :return: a dict with the maximum and mean errors of u(0) and the fraction of states inside the regions.
+        """
+        if x_0 is None:
+            x_0 = np.random.default_rng(seed).uniform(self.mpc.parameters['x_min'], self.mpc.parameters['x_max'],
+                                                      (n_samples, self.parameters['n_x']))
+
+        errors = []
+        n_located = 0
+        for x in np.atleast_2d(x_0):
+            if self.__locate(x, self.regions) is None:
+                continue
+            n_located += 1
+            self.mpc.update(x_0=x)
+            try:
+                u_0 = self.mpc.solve().u_0
+            except ValueError:
+                continue
+            errors.append(np.max(np.abs(self.evaluate(x) - u_0)))
+
+        errors = np.array(errors) if errors else np.array([np.nan])
+        validation = {'max_error': np.max(errors), 'mean_error': np.mean(errors),
+                      'coverage': n_located / len(np.atleast_2d(x_0))}
+
+        if self.debug:
+            self.logger.debug(f'[validate]: {validation}')
+
+        return validation
+
+    def __setup_mpqp(self):
+
+        # matrices of the multi-parametric QP, from the condensed formulation of LinearMPC. The two-sided limits
+        # l <= A_total*u <= u are split into G*u <= w + E*x_0, without the infinite limits
+        parameters = self.mpc.parameters
+        N = parameters['N']
+        n_x = parameters['n_x']
+        n_u = parameters['n_u']
+        state_rows = parameters['state_rows']
+
+        H = parameters['S_u'].T.dot(parameters['W']) + np.kron(np.eye(N), parameters['R'])
+        F = parameters['W'].T.dot(parameters['S_x'])
+        f = -np.kron(np.eye(N), parameters['R']).dot(parameters['u_r'].ravel()) - \
+            parameters['W'].T.dot(parameters['x_r'].ravel())
+
+        A_total = np.vstack([parameters['S_u'][state_rows], np.eye(N*n_u)])
+        S_x = np.vstack([parameters['S_x'][state_rows], np.zeros((N*n_u, n_x))])
+        upper = np.hstack([np.tile(parameters['x_max'], N+1)[state_rows], np.tile(parameters['u_max'], N)])
+        lower = np.hstack([np.tile(parameters['x_min'], N+1)[state_rows], np.tile(parameters['u_min'], N)])
+        rows = np.hstack([np.isfinite(upper), np.isfinite(lower)])
+
+        self.parameters.update({'N': N, 'n_x': n_x, 'n_u': n_u, 'H_inv': np.linalg.inv(H), 'F': F, 'f': f,
+                                'G': np.vstack([A_total, -A_total])[rows], 'w': np.hstack([upper, -lower])[rows],
+                                'E': np.vstack([-S_x, S_x])[rows], 'rows': rows})
+
+    def __active_set(self, x_0):
+
+        # active constraints of the OSQP solution, as a boolean mask of the rows of G. The dual variables of the
+        # two-sided limits are positive for the upper limits and negative for the lower limits
+        self.mpc.update(x_0=x_0)
+        res = self.mpc.solver.solve()
+        if res.info.status != 'solved':
+            return None
+        y = res.y
+        active = np.hstack([y > self.parameters['tolerance'], y < -self.parameters['tolerance']])
+        return active[self.parameters['rows']]
+
+    def __region(self, active_set):
+
+        # affine law u = K*x_0 + k and multipliers lambda = L*x_0 + l of an active set, from the KKT conditions.
+        # The region is {x_0: lambda >= 0, G_inactive*u <= w_inactive + E_inactive*x_0}
+        H_inv = self.parameters['H_inv']
+        G_active = self.parameters['G'][active_set]
+        M = G_active.dot(H_inv).dot(G_active.T)
+        if len(M) > 0 and np.linalg.matrix_rank(M) < len(M):
+            # degenerate active set (linearly dependent constraints)
+            return None
+
+        M_inv = np.linalg.inv(M)
+        L = -M_inv.dot(self.parameters['E'][active_set] + G_active.dot(H_inv).dot(self.parameters['F']))
+        l = -M_inv.dot(self.parameters['w'][active_set] + G_active.dot(H_inv).dot(self.parameters['f']))
+        K = -H_inv.dot(self.parameters['F'] + G_active.T.dot(L))
+        k = -H_inv.dot(self.parameters['f'] + G_active.T.dot(l))
+
+        G_inactive = self.parameters['G'][~active_set]
+        inequalities = np.vstack([-L, G_inactive.dot(K) - self.parameters['E'][~active_set]])
+        bounds = np.hstack([l, self.parameters['w'][~active_set] - G_inactive.dot(k)])
+
+        # rows which do not depend on x_0 are always satisfied, or the region is empty
+        constant = np.linalg.norm(inequalities, axis=1) < 1e-12
+        if np.any(bounds[constant] < -self.parameters['tolerance']):
+            return None
+
+        n_u = self.parameters['n_u']
+        return K[:n_u], k[:n_u], inequalities, bounds
+
+    def __add_region(self, regions, active_set, K, k, inequalities, bounds):
+
+        # regions are stored stacked, to be checked with one matrix product
+        if not regions:
+            regions.update({'active_sets': [], 'keys': {}, 'K': [], 'k': [], 'inequalities': [], 'bounds': [],
+                            'hits': [], 'last': 0})
+        regions['keys'].update({active_set.tobytes(): len(regions['active_sets'])})
+        for name, value in zip(['active_sets', 'K', 'k', 'inequalities', 'bounds'],
+                               [active_set, K, k, inequalities, bounds]):
+            regions[name].append(value)
+        regions['hits'].append(1)
+        regions.update({'all_inequalities': np.vstack(regions['inequalities']),
+                        'all_bounds': np.hstack(regions['bounds']) + self.parameters['tolerance'],
+                        'starts': np.cumsum([0] + [len(bound) for bound in regions['bounds'][:-1]])})
+
+    def __locate(self, x_0, regions):
+
+        # index of the region which contains x_0, or None
+        if not regions:
+            return None
+
+        last = regions['last']
+        if np.all(regions['inequalities'][last].dot(x_0) <= regions['bounds'][last] + self.parameters['tolerance']):
+            return last
+
+        inside = np.logical_and.reduceat(regions['all_inequalities'].dot(x_0) <= regions['all_bounds'],
+                                         regions['starts'])
+        region = int(np.argmax(inside))
+        if not inside[region]:
+            return None
+
+        regions['last'] = region
+        return region
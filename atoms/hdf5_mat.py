@@ -0,0 +1,226 @@
+import copy
+import h5py
+import numpy
+from atoms import atoms_helpers
+
+
+class Hdf5MatFile:
+    """
+    Hdf5MatFile class: reader for MATLAB v7.3 .mat files, which are stored in HDF5 format. Variables are not loaded in
+    memory: each numeric variable is returned as an Hdf5MatArray object, which reads from disk only the requested rows.
+
+    The file stays open until close is called (or the with block ends). Hdf5MatArray objects of a closed file can only
+    be read if they are memory-mapped. Without an explicit close, the file is released when this object and all the
+    Hdf5MatArray objects read through h5py (chunked or compressed data) are deleted.
+    """
+    matlab_numeric_classes = ['double', 'single', 'logical', 'int8', 'uint8', 'int16', 'uint16', 'int32', 'uint32',
+                              'int64', 'uint64']
+
+    def __init__(self, data_path_and_name, debug=False):
+        self.debug = debug
+        self.data_path_and_name = data_path_and_name
+        self.file = h5py.File(data_path_and_name, 'r')
+        self.helpers = atoms_helpers.Helpers()
+
+        if debug:
+            self.logger = atoms_helpers.Helpers.init_logger()
+
+    def __str__(self):
+        return f" Hdf5MatFile class object \n" \
+               f" File: {self.data_path_and_name} \n" \
+               f" Variables: {self.variables()}"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """
+        Close the file.
+        """
+        self.file.close()
+
+        if self.debug:
+            self.logger.debug(f'[close]: file {self.data_path_and_name} closed.')
+
+    @staticmethod
+    def is_hdf5(data_path_and_name):
+        """
+        Check if a .mat file is stored in HDF5 format (MATLAB v7.3).
+        """
+        return h5py.is_hdf5(data_path_and_name)
+
+    def variables(self):
+        """
+        List the variables stored in the file. HDF5 groups used internally by MATLAB (e.g. '#refs#') are excluded.
+        """
+        return [var_name for var_name in self.file.keys() if not var_name.startswith('#')]
+
+    def read(self, variables_list):
+        """
+        Read the selected variables.
+        :param variables_list: the list of variables to read.
+        :return: a dict with an Hdf5MatArray object for each variable.
+        """
+        mat_data = {}
+
+        for var_name in variables_list:
+            if var_name not in self.file or var_name.startswith('#'):
+                raise ValueError(f'[read]: data {var_name} not found in {self.data_path_and_name}.')
+
+            h5_data = self.file[var_name]
+            matlab_class = h5_data.attrs.get('MATLAB_class', b'double')
+            if isinstance(matlab_class, bytes):
+                matlab_class = matlab_class.decode()
+
+            if not isinstance(h5_data, h5py.Dataset) or matlab_class not in self.matlab_numeric_classes:
+                raise ValueError(f'[read]: data {var_name} of MATLAB class {matlab_class} is not supported. Only '
+                                 f'numeric arrays can be read from v7.3 files.')
+
+            if h5_data.attrs.get('MATLAB_empty', 0):
+                # empty arrays store their size instead of their content
+                mat_data.update({var_name: numpy.empty((0, 0))})
+            else:
+                mat_data.update({var_name: Hdf5MatArray(h5_data, self.data_path_and_name)})
+
+            if self.debug:
+                self.logger.debug(f'[read]: data {var_name} mapped from {self.data_path_and_name}.')
+
+        return mat_data
+
+
+class Hdf5MatArray:
+    """
+    Hdf5MatArray class: lazily read numeric variable of a MATLAB v7.3 file. MATLAB stores arrays in column-major order,
+    so the HDF5 dataset is transposed with respect to the MATLAB variable: the Hdf5MatArray object has the same shape of
+    the MATLAB variable.
+
+    Contiguous, uncompressed datasets are memory-mapped. Chunked or compressed datasets are read chunk by chunk through
+    h5py. Slicing the rows with a slice of step 1 returns another Hdf5MatArray, without reading data. Any other
+    indexing, and the conversion with numpy.asarray, read data from disk.
+
+    The object can also store an affine transformation (data - offset) / scale, which is applied when data are read.
+
+    Memory-mapped objects do not keep the HDF5 file open. The others keep the HDF5 dataset (and its file) open until
+    they, and the row views created from them, are deleted.
+    """
+    def __init__(self, h5_data, data_path_and_name, rows=None, offset=0.0, scale=1.0):
+        self.data_path_and_name = data_path_and_name
+        self.name = h5_data.name
+        self.file_dtype = h5_data.dtype
+        self.offset = offset
+        self.scale = scale
+        self.memmap = self.__get_memmap(h5_data, data_path_and_name)
+        self.h5_data = h5_data if self.memmap is None else None
+
+        n_rows = h5_data.shape[-1]
+        self.rows = slice(0, n_rows) if rows is None else rows
+        self.shape = (self.rows.stop - self.rows.start,) + tuple(reversed(h5_data.shape[:-1]))
+
+    def __str__(self):
+        return f" Hdf5MatArray class object \n" \
+               f" File: {self.data_path_and_name} \n" \
+               f" Data: {self.name}, shape {self.shape}, memory-mapped: {self.memmap is not None}"
+
+    def __len__(self):
+        return self.shape[0]
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    @property
+    def size(self):
+        return int(numpy.prod(self.shape))
+
+    @property
+    def dtype(self):
+        if self.offset == 0.0 and self.scale == 1.0:
+            return self.file_dtype
+        return numpy.result_type(self.file_dtype, numpy.float64)
+
+    def __getitem__(self, key):
+
+        row_key = key[0] if isinstance(key, tuple) else key
+        col_key = key[1:] if isinstance(key, tuple) else ()
+
+        if isinstance(row_key, slice) and row_key.step in (None, 1) and len(col_key) == 0:
+            # rows slicing returns a lazy view on the same data
+            start, stop, _ = row_key.indices(len(self))
+            stop = max(start, stop)
+            return self.__view(slice(self.rows.start + start, self.rows.start + stop), self.offset, self.scale)
+
+        if isinstance(row_key, slice):
+            start, stop, step = row_key.indices(len(self))
+            if step > 0:
+                # strided reads are done directly on the file
+                block = self.read(slice(start, stop), step)
+                return block[(slice(None),) + col_key] if len(col_key) > 0 else block
+
+        if isinstance(row_key, (int, numpy.integer)):
+            row_index = row_key + len(self) if row_key < 0 else row_key
+            if not 0 <= row_index < len(self):
+                raise IndexError(f'[getitem]: index {row_key} out of bounds for data of size {len(self)}.')
+            block = self.read(slice(row_index, row_index + 1))[0]
+            return block[col_key] if len(col_key) > 0 else block
+
+        return numpy.asarray(self)[key]
+
+    def __array__(self, dtype=None, copy=None):
+        data = self.read(slice(0, len(self)))
+        return data if dtype is None else data.astype(dtype, copy=False)
+
+    def __sub__(self, value):
+        return self.__view(self.rows, self.offset + value * self.scale, self.scale)
+
+    def __truediv__(self, value):
+        return self.__view(self.rows, self.offset, self.scale * value)
+
+    def read(self, rows, step=1):
+        """
+        Read the selected rows from disk.
+        :param rows: a slice (of step 1) with the rows to read, relative to the rows of this object.
+        :param step: the step between the rows to read.
+        :return: a numpy array with the selected rows.
+        """
+        file_rows = slice(self.rows.start + rows.start, self.rows.start + rows.stop, step)
+
+        if self.memmap is not None:
+            # the transposed memory map is a view, no data are copied until they are accessed
+            data = self.memmap[..., file_rows].T
+        else:
+            data = self.h5_data[..., file_rows].T
+
+        if self.offset == 0.0 and self.scale == 1.0:
+            return numpy.array(data)
+        else:
+            return (data - self.offset) / self.scale
+
+    def iter_blocks(self, n_rows=2**20):
+        """
+        Iterate over the data in blocks of n_rows rows.
+        """
+        for start in range(0, len(self), n_rows):
+            yield self.read(slice(start, min(start + n_rows, len(self))))
+
+    def __view(self, rows, offset, scale):
+
+        # object on the same data, which shares the memory map or the HDF5 dataset
+        view = copy.copy(self)
+        view.rows = rows
+        view.offset = offset
+        view.scale = scale
+        view.shape = (rows.stop - rows.start,) + self.shape[1:]
+        return view
+
+    @staticmethod
+    def __get_memmap(h5_data, data_path_and_name):
+
+        # only contiguous datasets without filters have a fixed offset in the file
+        file_offset = h5_data.id.get_offset()
+        if h5_data.chunks is not None or h5_data.compression is not None or file_offset is None:
+            return None
+        return numpy.memmap(data_path_and_name, mode='r', dtype=h5_data.dtype, offset=file_offset,
+                            shape=h5_data.shape)
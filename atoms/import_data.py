@@ -1,17 +1,40 @@
+import os
+import json
 import numpy
-from scipy import io
+from scipy import signal
 from atoms import atoms_helpers
+from atoms.mat_cache import MatCache
+from atoms.dataset import Dataset
+from atoms.hdf5_mat import Hdf5MatArray
 from matplotlib import pyplot as plt
 
 
 class ImportData:
     """
     ImportData class: import, modify and plot data from MATLAB .mat files.
+
+    Loaded variables can be stored in a MatCache object (load with use_cache=True), which by default is shared by all
+    ImportData objects. Loading again the same file does not read it from disk, unless the file has been modified.
+    Cached data are read-only, since they are shared.
+
+    Variables of MATLAB v7.3 files are loaded as Hdf5MatArray objects, that are read from disk only when needed. They
+    can be split, normalized and plotted without loading the whole recording in memory.
     """
-    def __init__(self, debug=False):
+    mat_cache = MatCache()
+
+    # number of rows of the blocks in which large data are processed
+    block_size = 2**20
+
+    # identifier of the data saved with save_bulk
+    bulk_format = 'atoms_bulk_v1'
+
+    def __init__(self, debug=False, mat_cache=None):
         self.debug = debug
+        if mat_cache is not None:
+            self.mat_cache = mat_cache
         self.data = {}
         self.datasets = {}
+        self.scale_factors = {}
         self.counter = 0
         self.variables_list = []
         self.helpers = atoms_helpers.Helpers()
@@ -24,21 +47,31 @@ class ImportData:
                f" Loaded data: {self.variables_list} \n" \
                f" Generated datasets: {self.datasets.keys()}"
 
-    def load(self, data_path_and_name, variables_list):
+    def load(self, data_path_and_name, variables_list, use_cache=False):
         """
-        Load data from .mat file.
+        Load data from .mat file. Only the variables in variables_list are read from the file.
         :param data_path_and_name: a string with the path of the folder where data are stored, joined with the name of
         the data to load.
         :param variables_list: the list of variables contained in the loaded file that the user would like to import.
+        :param use_cache: if True, data are taken from (and stored in) self.mat_cache. Cached data are read-only, and
+        they must be copied before being modified. Default is False.
         """
         self.helpers.check_if_list_or_string(data_path_and_name)
         var_type = self.helpers.check_if_list_or_string(variables_list)
-        mat_data = io.loadmat(data_path_and_name)
 
-        # generate the dict containing all data in the file
+        # generate the dict containing the selected data in the file
         if len(variables_list) == 0:
             raise ValueError('[load]: variables_list cannot be empty!')
         else:
+            if use_cache:
+                mat_data = self.mat_cache.get(data_path_and_name, variables_list)
+            else:
+                mat_data = MatCache.read(data_path_and_name, [variables_list] if var_type == 'str' else variables_list)
+
+            # reloaded data are not normalized anymore
+            for var_name in mat_data.keys():
+                self.scale_factors.pop(var_name, None)
+
             if var_type == 'str':
                 self.data.update({variables_list: mat_data[variables_list]})
                 if self.debug:
@@ -51,12 +84,17 @@ class ImportData:
 
         self.variables_list = variables_list
 
-    def plot(self, x_y_axis_pairs, dataset_name=''):
+    def plot(self, x_y_axis_pairs, dataset_name='', decimate=False, redecimate_on_zoom=True):
         """
         Plot the loaded data.
         :param x_y_axis_pairs: a nested list containing the pair of x and y axes for each plot.
         :param dataset_name: the name of the dataset from which to plot the data. If empty, the variable 'self.data' is
         used by default.
+        :param decimate: if True, data are decimated to the width in pixels of the plot before drawing. The samples are
+        divided in one bucket per pixel, and the min and max value of each bucket are plotted (min/max envelope), so
+        that spikes are preserved. Lazily loaded data are always decimated.
+        :param redecimate_on_zoom: if True, decimated data are decimated again on the visible range when the x limits
+        of the plot change (e.g. when zooming). Available only if the x axis data are monotonic.
         """
         self.helpers.check_if_list_or_string(x_y_axis_pairs)
         n_subplots = len(x_y_axis_pairs)
@@ -83,8 +121,9 @@ class ImportData:
                     if i > 5:
                         plt.figure()
                         i = 1
-                    plt.subplot(min(n_subplots, 5), 1, i)
-                    plt.plot(data_to_plot[x_y_pair[0]], data_to_plot[x_y_pair[1]])
+                    axes = plt.subplot(min(n_subplots, 5), 1, i)
+                    self.__plot_pair(axes, data_to_plot[x_y_pair[0]], data_to_plot[x_y_pair[1]], decimate,
+                                     redecimate_on_zoom)
                     plt.xlabel(x_y_pair[0])
                     plt.ylabel(x_y_pair[1])
                     plt.grid(True)
@@ -94,8 +133,9 @@ class ImportData:
         elif len(x_y_axis_pairs) == 2:
             # the user may have provided a single pair of variables as a list (not nested). This is also ok
             if x_y_axis_pairs[0] in self.variables_list and x_y_axis_pairs[1] in self.variables_list:
-                plt.subplot(1, 1, i)
-                plt.plot(data_to_plot[x_y_axis_pairs[0]], data_to_plot[x_y_axis_pairs[1]])
+                axes = plt.subplot(1, 1, i)
+                self.__plot_pair(axes, data_to_plot[x_y_axis_pairs[0]], data_to_plot[x_y_axis_pairs[1]], decimate,
+                                 redecimate_on_zoom)
                 plt.xlabel(x_y_axis_pairs[0])
                 plt.ylabel(x_y_axis_pairs[1])
                 plt.grid(True)
@@ -106,36 +146,70 @@ class ImportData:
 
         return plt
 
-    def normalize(self, data_list):
+    def normalize(self, data_list, mode='max_abs', in_place=False):
         """
-        Normalize the data specified in data_list. Normalization is done by dividing all data for the max abs value.
+        Normalize the data specified in data_list, as (data - offset) / scale. The offset and scale of each data are
+        stored in self.scale_factors, and they can be used to denormalize data with the denormalize method.
         :param data_list: the list of data to normalize.
+        :param mode: the normalization mode. Available modes:
+            - max_abs = divide all data for the max abs value (default);
+            - min_max = map data to the [0, 1] interval;
+            - z_score = subtract the mean value and divide for the standard deviation.
+        :param in_place: if True, data are normalized without allocating new arrays. The datasets generated by split
+        store their own copy of the data, so they are not modified. Data that cannot be modified (e.g. read-only data
+        shared with self.mat_cache, or integer data) are copied once.
         """
+        available_modes = ['max_abs', 'min_max', 'z_score']
         data_type = self.helpers.check_if_list_or_string(data_list)
 
+        if not self.helpers.check_if_data_in_list(available_modes, mode):
+            raise ValueError(f'[normalize]: mode {mode} is not among available modes.')
         if data_type == 'str':
-            if self.helpers.check_if_data_in_list(self.variables_list, data_list):
-                max_value = abs(max(self.data[data_list], key=abs))
-                if max_value > 0:
-                    self.data[data_list] = self.data[data_list] / max_value
-                    if self.debug:
-                        self.logger.debug(f'[normalize]: data {data_list} normalized.')
-                else:
-                    raise ValueError('[normalize]: max abs value of selected data is 0.')
-            else:
+            data_list = [data_list]
+
+        for data_name in data_list:
+            if not self.helpers.check_if_data_in_list(self.variables_list, data_name):
                 raise ValueError('[normalize]: data not found in the variable list.')
-        elif data_type == 'list':
-            for data_name in data_list:
-                if self.helpers.check_if_data_in_list(self.variables_list, data_name):
-                    max_value = abs(max(self.data[data_name], key=abs))
-                    if max_value > 0:
-                        self.data[data_name] = self.data[data_name] / max_value
-                        if self.debug:
-                            self.logger.debug(f'[normalize]: data {data_name} normalized.')
-                    else:
-                        raise ValueError('[normalize]: max abs value of selected data is 0.')
+
+        for data_name in data_list:
+            data = self.data[data_name]
+            offset, scale = self.__get_scale_factors(data, mode)
+            if not scale > 0:
+                if mode == 'max_abs':
+                    raise ValueError('[normalize]: max abs value of selected data is 0.')
                 else:
-                    raise ValueError('[normalize]: data not found in the variable list.')
+                    raise ValueError(f'[normalize]: data {data_name} are constant and cannot be normalized.')
+
+            if isinstance(data, Hdf5MatArray):
+                # lazily loaded data are normalized when they are read
+                self.data[data_name] = (data - offset) / scale
+            else:
+                if not (in_place and data.flags.writeable and numpy.issubdtype(data.dtype, numpy.floating)):
+                    data = numpy.subtract(data, offset, dtype=numpy.result_type(data.dtype, numpy.float64))
+                elif offset != 0:
+                    numpy.subtract(data, offset, out=data)
+                self.data[data_name] = numpy.divide(data, scale, out=data)
+
+            # normalizing twice the same data is equivalent to normalizing the original data once, with the composed
+            # offset and scale
+            prev_offset, prev_scale = self.scale_factors.get(data_name, (0.0, 1.0))
+            self.scale_factors.update({data_name: (prev_offset + offset * prev_scale, prev_scale * scale)})
+
+            if self.debug:
+                self.logger.debug(f'[normalize]: data {data_name} normalized.')
+
+    def denormalize(self, data_name, values):
+        """
+        Map normalized values back to the units of the original data, as values * scale + offset.
+        :param data_name: the name of the normalized data, whose scale factors are applied.
+        :param values: the normalized values (e.g. a prediction or a control output in normalized units).
+        :return: the denormalized values.
+        """
+        if not self.helpers.check_if_data_in_list(self.scale_factors.keys(), data_name):
+            raise ValueError(f'[denormalize]: data {data_name} has not been normalized.')
+
+        offset, scale = self.scale_factors[data_name]
+        return numpy.asarray(values) * scale + offset
 
     def save(self, data_list, dataset_name=''):
         """
@@ -175,9 +249,240 @@ class ImportData:
         else:
             raise ValueError('[save]: data_list is not a valid list.')
 
+    def save_bulk(self, export_path, dataset_name='', compress=False):
+        """
+        Save all data in self.data, or a whole dataset, so that they can be loaded again with load_bulk.
+        :param export_path: the path of the export. If it ends with '.npz', data are saved in a single .npz file.
+        Otherwise, a folder is created with one .npy file per data (one .npy file with the 2-D array of values for a
+        dataset) and a manifest.json file. Folders can be memory-mapped by load_bulk.
+        :param dataset_name: the name of the dataset to save. If empty, 'self.data' is selected.
+        :param compress: if True, the .npz file is compressed. Available only for .npz files.
+        """
+        self.helpers.check_if_list_or_string(export_path)
+        is_npz = export_path.endswith('.npz')
+
+        if compress and not is_npz:
+            raise ValueError('[save_bulk]: compression is available only for .npz files.')
+
+        if len(dataset_name) == 0:
+            data_to_save = self.data
+            manifest = {'format': self.bulk_format, 'type': 'data', 'scale_factors': self.scale_factors}
+        elif self.helpers.check_if_data_in_list(self.datasets.keys(), dataset_name):
+            data_to_save = {'values': self.datasets[dataset_name]}
+            manifest = {'format': self.bulk_format, 'type': 'dataset', 'name': dataset_name,
+                        'columns': self.datasets[dataset_name].names}
+        else:
+            raise ValueError(f'[save_bulk]: dataset name {dataset_name} not found in self.datasets keys.')
+
+        manifest.update({'data': {data_name: {'shape': list(data.shape), 'dtype': numpy.dtype(data.dtype).str}
+                                  for data_name, data in data_to_save.items()}})
+
+        if is_npz:
+            # lazily loaded data are read in memory, as numpy.savez does not write data incrementally
+            npz_data = {data_name: numpy.asarray(data) for data_name, data in data_to_save.items()}
+            npz_data.update({'__manifest__': numpy.array(json.dumps(manifest))})
+            if compress:
+                numpy.savez_compressed(export_path, **npz_data)
+            else:
+                numpy.savez(export_path, **npz_data)
+        else:
+            os.makedirs(export_path, exist_ok=True)
+            for data_name, data in data_to_save.items():
+                self.__write_npy(os.path.join(export_path, f'{data_name}.npy'), data)
+            with open(os.path.join(export_path, 'manifest.json'), 'w') as manifest_file:
+                json.dump(manifest, manifest_file, indent=2)
+
+        if self.debug:
+            self.logger.debug(f'[save_bulk]: data {list(manifest["data"].keys())} saved in {export_path}.')
+
+    def load_bulk(self, export_path, dataset_name='', mmap_mode='r'):
+        """
+        Load data saved with save_bulk. Data are added to self.data, or a dataset is added to self.datasets.
+        :param export_path: the path of the .npz file or of the folder created by save_bulk.
+        :param dataset_name: the name of the loaded dataset. If empty, the name of the saved dataset is used.
+        :param mmap_mode: the memory-map mode of the .npy files (see numpy.load). The default 'r' opens data read-only,
+        without reading them from disk. Use None to load data in memory. Ignored for .npz files.
+        """
+        self.helpers.check_if_list_or_string(export_path)
+
+        if os.path.isdir(export_path):
+            with open(os.path.join(export_path, 'manifest.json'), 'r') as manifest_file:
+                manifest = json.load(manifest_file)
+            loaded_data = {data_name: numpy.load(os.path.join(export_path, f'{data_name}.npy'), mmap_mode=mmap_mode)
+                           for data_name in manifest['data'].keys()}
+        else:
+            with numpy.load(export_path) as npz_data:
+                manifest = json.loads(str(npz_data['__manifest__']))
+                loaded_data = {data_name: npz_data[data_name] for data_name in manifest['data'].keys()}
+
+        if manifest.get('format') != self.bulk_format:
+            raise ValueError(f'[load_bulk]: {export_path} was not saved with save_bulk.')
+
+        if manifest['type'] == 'dataset':
+            if len(dataset_name) == 0:
+                dataset_name = manifest['name']
+            self.datasets.update({dataset_name: Dataset(manifest['columns'], loaded_data['values'])})
+            if self.debug:
+                self.logger.debug(f'[load_bulk]: dataset {dataset_name} added to self.datasets.')
+        else:
+            self.data.update(loaded_data)
+            for data_name in loaded_data.keys():
+                self.scale_factors.pop(data_name, None)
+            self.scale_factors.update({data_name: tuple(factors)
+                                       for data_name, factors in manifest['scale_factors'].items()})
+            self.variables_list = list(loaded_data.keys())
+            if self.debug:
+                self.logger.debug(f'[load_bulk]: data {self.variables_list} added to self.data.')
+
+    def iter_chunks(self, data_list, chunk_size=None, window=None, overlap=0, ref_data_name='time', dataset_name=''):
+        """
+        Iterate over the selected data in chunks of fixed size, or in time windows. Only one chunk at a time is stored
+        in memory (for lazily loaded data, only one chunk at a time is read from disk).
+        :param data_list: the list of data to iterate over.
+        :param chunk_size: the number of rows of each chunk.
+        :param window: the width of each window, in the units of the reference data. Either chunk_size or window must
+        be provided. Window boundaries are found as in the split method: a window that ends at value v ends before the
+        index of the value closest to v, and the following window starts after that index. So, without overlap, the
+        windows are the same datasets generated by split at the values [v_0 + window, v_0 + 2*window, ...].
+        :param overlap: the overlap between consecutive chunks, in rows (chunk_size) or in reference units (window).
+        :param ref_data_name: the name of the monotonic reference data used for windows (e.g. 'time').
+        :param dataset_name: the name of the dataset from which to take the data. If empty, 'self.data' is selected.
+        :return: a generator of Dataset objects, one per chunk.
+        """
+        data_type = self.helpers.check_if_list_or_string(data_list)
+        if data_type == 'str':
+            data_list = [data_list]
+
+        if len(dataset_name) == 0:
+            data_source = self.data
+        elif self.helpers.check_if_data_in_list(self.datasets.keys(), dataset_name):
+            data_source = self.datasets[dataset_name]
+        else:
+            raise ValueError(f'[iter_chunks]: dataset name {dataset_name} not found in self.datasets keys.')
+
+        for data_name in data_list + ([ref_data_name] if window is not None else []):
+            if data_name not in data_source:
+                raise ValueError(f'[iter_chunks]: data {data_name} not found.')
+
+        if (chunk_size is None) == (window is None):
+            raise ValueError('[iter_chunks]: either chunk_size or window must be provided.')
+        elif chunk_size is not None and (chunk_size <= 0 or not 0 <= overlap < chunk_size):
+            raise ValueError('[iter_chunks]: chunk_size must be positive and bigger than overlap.')
+        elif window is not None and (window <= 0 or not 0 <= overlap < window):
+            raise ValueError('[iter_chunks]: window must be positive and bigger than overlap.')
+
+        # empty data have no chunks
+        n_rows = len(data_source[data_list[0]])
+        if n_rows == 0:
+            return
+
+        if chunk_size is not None:
+            starts = numpy.arange(0, max(n_rows - overlap, 1), chunk_size - overlap)
+            stops = numpy.minimum(starts + chunk_size, n_rows)
+        else:
+            ref_data = numpy.asarray(data_source[ref_data_name]).ravel()
+            if not self.__is_monotonic(ref_data):
+                raise ValueError(f'[iter_chunks]: {ref_data_name} must be monotonic to iterate over windows.')
+
+            # the window k covers the values [v_0 + k*(window - overlap), v_0 + k*(window - overlap) + window]
+            start_values = numpy.arange(ref_data[0], ref_data[-1], window - overlap)
+            stops = self.__search_closest(ref_data, start_values + window)[0]
+            starts = self.__search_closest(ref_data, start_values)[0] + 1
+            starts[0] = 0
+
+            # windows after the first one that reaches the end of the data are dropped. As the final dataset generated
+            # by split, the last window ends one row before the end of the data
+            n_windows = numpy.searchsorted(stops, ref_data.size - 1) + 1
+            starts, stops = starts[:n_windows], stops[:n_windows]
+
+        # chunks are views when possible. Otherwise, only the chunk is copied in a 2-D array
+        is_view = isinstance(data_source, Dataset) and data_source.columns is None and data_list == data_source.names
+        for start, stop in zip(starts, stops):
+            if is_view:
+                yield Dataset(data_list, data_source.values[start:stop])
+            else:
+                yield Dataset(data_list, [data_source[data_name][start:stop] for data_name in data_list])
+
+    def resample(self, data_list, time_step=None, method='linear', time_data_name='time', time_data_map=None):
+        """
+        Resample data on a common, uniform time base. The resampled data replace the original data in self.data, and
+        the common time base is stored in self.data[time_data_name]. Note that the data with the same time data that
+        are not in data_list are not aligned with the new time data anymore. Lazily loaded data are read in memory.
+        :param data_list: the list of data to resample.
+        :param time_step: the step of the common time base. If None, the biggest (median) time step of the data is
+        used. The common time base covers the time interval in which all data are defined.
+        :param method: the resampling method. Available methods:
+            - zoh = zero-order hold, each sample is held until the next one;
+            - linear = linear interpolation (default);
+            - decimate = low-pass filter the data at the Nyquist frequency of the common time base (anti-aliasing),
+              then linear interpolation. Suited for downsampling.
+        :param time_data_name: the name of the time data of the data in data_list.
+        :param time_data_map: a dict that maps the name of the data logged with a different time data to the name of
+        its time data (e.g. {'egt_temperature': 'time_egt'}).
+        :return: the common time base.
+        """
+        available_methods = ['zoh', 'linear', 'decimate']
+        data_type = self.helpers.check_if_list_or_string(data_list)
+        time_data_map = {} if time_data_map is None else time_data_map
+
+        if not self.helpers.check_if_data_in_list(available_methods, method):
+            raise ValueError(f'[resample]: method {method} is not among available methods.')
+        if data_type == 'str':
+            data_list = [data_list]
+
+        time_data = {}
+        for data_name in data_list:
+            data_time_name = time_data_map.get(data_name, time_data_name)
+            if data_name not in self.data or data_time_name not in self.data:
+                raise ValueError(f'[resample]: data {data_name} or its time data {data_time_name} not found.')
+            if data_time_name not in time_data:
+                time_data.update({data_time_name: numpy.asarray(self.data[data_time_name], dtype=float).ravel()})
+                if not self.__is_monotonic(time_data[data_time_name]):
+                    raise ValueError(f'[resample]: time data {data_time_name} must be monotonic.')
+
+        # the common time base covers the interval in which all data are defined
+        time_steps = {name: float(numpy.median(numpy.diff(time))) for name, time in time_data.items()}
+        time_step = max(time_steps.values()) if time_step is None else time_step
+        time_start = max(time[0] for time in time_data.values())
+        time_end = min(time[-1] for time in time_data.values())
+        if not time_step > 0 or time_end < time_start:
+            raise ValueError('[resample]: the data do not have a common time interval.')
+        n_samples = int(numpy.floor((time_end - time_start) / time_step + 1e-6)) + 1
+        new_time = time_start + numpy.arange(n_samples) * time_step
+
+        resampled_data = {}
+        for data_name in data_list:
+            data_time_name = time_data_map.get(data_name, time_data_name)
+            time = time_data[data_time_name]
+            data = numpy.asarray(self.data[data_name]).ravel()
+            if data.size != time.size:
+                raise ValueError(f'[resample]: data {data_name} and time data {data_time_name} have different sizes.')
+
+            if method == 'zoh':
+                # a small tolerance avoids holding the previous sample because of rounding errors in the time data
+                indexes = numpy.searchsorted(time, new_time + 1e-6 * time_step, side='right') - 1
+                new_data = data[indexes.clip(0, data.size - 1)]
+            else:
+                if method == 'decimate':
+                    data = self.__low_pass(data, time_step / time_steps[data_time_name])
+                new_data = numpy.interp(new_time, time, data)
+
+            # resampled data are stored as columns, as the data loaded from .mat files
+            resampled_data.update({data_name: new_data.reshape(-1, 1)})
+            if self.debug:
+                self.logger.debug(f'[resample]: data {data_name} resampled from {data.size} to {new_data.size} '
+                                  f'samples.')
+
+        self.data.update(resampled_data)
+        self.data.update({time_data_name: new_time.reshape(-1, 1)})
+
+        return new_time
+
     def split(self, data_list, splitting_values, ref_data_name):
         """
-        Split data into multiple sub-dataset, divided accordingly to the different throttle profiles.
+        Split data into multiple sub-dataset, divided accordingly to the different throttle profiles. The data in
+        data_list are copied once in a single 2-D array, and each dataset is a Dataset object that stores a view on
+        its rows. Datasets of lazily loaded data are not read from disk.
         :param data_list: the list of data to split.
         :param splitting_values: the list of values at which to cut the dataset.
         :param ref_data_name: the name of the data which contains the splitting_values (must be stored in the class
@@ -191,88 +496,272 @@ class ImportData:
         if ref_data_type == 'list':
             raise ValueError(f'[split]: {ref_data_name} must be a string.')
 
-        if isinstance(splitting_values, list):
-
-            # size_check is used to avoid problems when creating the final dataset, in case the last splitting value is
-            # repeated in the splitting_values list
-            size_check = 0
-
+        if isinstance(splitting_values, (int, float)):
+            splitting_values = [splitting_values]
+        elif isinstance(splitting_values, list):
             for spl_value in splitting_values:
-                if isinstance(spl_value, (int, float)):
-                    closest_value = min(self.data[ref_data_name], key=lambda x: abs(x - spl_value))
-                    value_index = self.__search_index(ref_data_name, closest_value, value_index_prev)
-
-                    # for the moment we assume that all data have the same size. So, the index of the ref_data_name can
-                    # be used to split all data and create the dataset
-                    dataset = self.__create_dataset(self.data, data_list, value_index_prev, value_index)
-                    if self.debug:
-                        self.logger.debug(f'[split]: created dataset dataset_{self.counter}.')
-                    self.datasets.update({f"dataset_{self.counter}": dataset})
-                    self.counter = self.counter + 1
-                    value_index_prev = value_index + 1
-                    size_check = size_check + 1
-
-                    # we need to create also the final dataset, from value_index_prev to end of the array
-                    if spl_value == splitting_values[-1] and size_check == len(splitting_values):
-                        value_index_end = self.data[ref_data_name].size - 1
-                        dataset = self.__create_dataset(self.data, data_list, value_index_prev, value_index_end)
-                        if self.debug:
-                            self.logger.debug(f'[split]: created dataset dataset_{self.counter}.')
-                        self.datasets.update({f"dataset_{self.counter}": dataset})
-                        self.counter = self.counter + 1
-                else:
+                if not isinstance(spl_value, (int, float)):
                     raise ValueError(f'[split]: splitting value {spl_value} not valid!')
+        else:
+            raise ValueError(f'[split]: splitting value {splitting_values} not valid!')
 
-        elif isinstance(splitting_values, (int, float)):
-            closest_value = min(self.data[ref_data_name], key=lambda x: abs(x - splitting_values))
-            value_index = self.__search_index(ref_data_name, closest_value, value_index_prev)
+        if len(splitting_values) == 0:
+            return
 
-            # for the moment we assume that all data have the same size. So, the index of the ref_data_name can
-            # be used to split all data and create the dataset
-            dataset = self.__create_dataset(self.data, data_list, value_index_prev, value_index)
-            if self.debug:
-                self.logger.debug(f'[split]: created dataset dataset_{self.counter}.')
-            self.datasets.update({f"dataset_{self.counter}": dataset})
-            self.counter = self.counter + 1
+        # the reference data are read in memory. Lazily loaded data are split without being read
+        ref_data = numpy.asarray(self.data[ref_data_name]).ravel()
+        value_indexes = self.__search_indexes(ref_data, splitting_values)
 
-            # we need to create also the final dataset, from value_index+1 to end of the array
-            value_index_end = self.data[ref_data_name].size - 1
-            dataset = self.__create_dataset(self.data, data_list, value_index + 1, value_index_end)
+        # for the moment we assume that all data have the same size. So, the indexes of the ref_data_name can be used to
+        # split all data and create the datasets. The final dataset goes from the last index to the end of the array
+        value_indexes = numpy.append(value_indexes, ref_data.size - 1)
+        data_columns = self.__get_data_columns(data_list)
+
+        for value_index in value_indexes:
+            dataset = self.__create_dataset(data_columns, value_index_prev, value_index)
             if self.debug:
                 self.logger.debug(f'[split]: created dataset dataset_{self.counter}.')
             self.datasets.update({f"dataset_{self.counter}": dataset})
             self.counter = self.counter + 1
+            value_index_prev = value_index + 1
+
+    @staticmethod
+    def __write_npy(path_and_name, data):
+
+        if isinstance(data, Dataset) and data.columns is None:
+            data = data.values
+        if isinstance(data, numpy.ndarray):
+            numpy.save(path_and_name, data)
+            return
+
+        # lazily loaded data (or datasets) are written block by block, without reading them in memory
+        npy_data = numpy.lib.format.open_memmap(path_and_name, mode='w+', dtype=data.dtype, shape=data.shape)
+        block_size = ImportData.block_size
+        if isinstance(data, Dataset):
+            for index, column in enumerate(data.columns):
+                blocks = ImportData.__iter_blocks(column, block_size)
+                for start, block in zip(range(0, len(column), block_size), blocks):
+                    npy_data[start:start + len(block), index] = numpy.reshape(block, len(block))
         else:
-            raise ValueError(f'[split]: splitting value {splitting_values} not valid!')
+            for start, block in zip(range(0, len(data), block_size), ImportData.__iter_blocks(data, block_size)):
+                npy_data[start:start + len(block)] = block
+        npy_data.flush()
 
-    def __create_dataset(self, data, data_list, value_index_prev, value_index):
+    @staticmethod
+    def __iter_blocks(data, n_rows):
 
-        data_type = self.helpers.check_if_list_or_string(data_list)
-        dataset = {}
+        if isinstance(data, Hdf5MatArray):
+            return data.iter_blocks(n_rows)
+        else:
+            return (numpy.asarray(data[start:start + n_rows]) for start in range(0, len(data), n_rows))
+
+    def __get_data_columns(self, data_list):
 
+        data_type = self.helpers.check_if_list_or_string(data_list)
         if data_type == 'str':
             # dataset composed by only one data
-            dataset.update({data_list: self.data[data_list][value_index_prev:value_index]})
-        elif data_type == 'list':
-            for data_name in data_list:
-                # dataset composed by multiple data
-                dataset.update({data_name: self.data[data_name][value_index_prev:value_index]})
-
-        return dataset
+            data_list = [data_list]
 
-    def __search_index(self, ref_data_name, closest_value, value_index_prev):
+        for data_name in data_list:
+            if data_name not in self.data:
+                raise ValueError(f'[split]: data {data_name} not found in self.data.')
 
-        # locate all indexes in the array corresponding to the closest_value
-        value_indexes = numpy.where(self.data[ref_data_name] == closest_value)
-        value_index = 0
+        columns = [self.data[data_name] for data_name in data_list]
+        if all(isinstance(column, numpy.ndarray) for column in columns):
+            # data are copied once in a single 2-D array, and all datasets are views on it
+            return Dataset(data_list, Dataset.stack(columns))
+        else:
+            return Dataset(data_list, columns)
 
-        for index in value_indexes[0]:
-            if index > value_index_prev:
-                value_index = index
-                break
+    @staticmethod
+    def __create_dataset(data_columns, value_index_prev, value_index):
 
-        if value_index == 0:
-            raise ValueError(f"[search_index]: did not find a final index bigger than the initial "
-                             f"index {value_index_prev}.")
+        if data_columns.columns is not None:
+            columns = [column[value_index_prev:value_index] for column in data_columns.columns]
+            return Dataset(data_columns.names, columns)
         else:
-            return value_index
+            return Dataset(data_columns.names, data_columns.values[value_index_prev:value_index])
+
+    @staticmethod
+    def __low_pass(data, downsampling_factor):
+
+        # zero-phase FIR filter with cutoff at the Nyquist frequency of the downsampled data. Data are padded with their
+        # edge values, to avoid transients at the boundaries
+        if downsampling_factor <= 1:
+            return data.astype(float)
+        n_taps = 8 * int(numpy.ceil(downsampling_factor)) + 1
+        taps = signal.firwin(n_taps, 1.0 / downsampling_factor)
+        padded_data = numpy.pad(data.astype(float), n_taps // 2, mode='edge')
+        return signal.oaconvolve(padded_data, taps, mode='valid')
+
+    @staticmethod
+    def __is_monotonic(ref_data):
+        return ref_data.size > 1 and bool(numpy.all(ref_data[1:] >= ref_data[:-1]))
+
+    @staticmethod
+    def __search_closest(ref_data, values):
+
+        # binary search of the values closest to the input values, in monotonic reference data. Returns the indexes of
+        # the first and of the last occurrence of each closest value
+        index_right = numpy.searchsorted(ref_data, values, side='left').clip(1, ref_data.size - 1)
+        index_left = index_right - 1
+        is_left_closest = values - ref_data[index_left] <= numpy.abs(ref_data[index_right] - values)
+        closest_values = ref_data[numpy.where(is_left_closest, index_left, index_right)]
+        index_first = numpy.searchsorted(ref_data, closest_values, side='left')
+        index_last = numpy.searchsorted(ref_data, closest_values, side='right') - 1
+
+        return index_first, index_last
+
+    @staticmethod
+    def __search_indexes(ref_data, splitting_values):
+
+        # the splitting value k is matched to the closest value in ref_data, and the cut index is the first index of the
+        # closest value bigger than the index of the previous cut plus one (or bigger than 0, for the first cut)
+        spl_values = numpy.asarray(splitting_values, dtype=float)
+        n_values = spl_values.size
+
+        if ImportData.__is_monotonic(ref_data):
+            # monotonic reference data (e.g. time): all cut indexes are found with a binary search
+            index_first, index_last = ImportData.__search_closest(ref_data, spl_values)
+
+            # each cut index must be at least the previous cut index + 2. With h(k) = index(k) - 2*k, the condition
+            # becomes h(k) = max(index_first(k) - 2*k, h(k-1)), that is a cumulative max
+            steps = 2 * numpy.arange(n_values)
+            value_indexes = numpy.maximum.accumulate(numpy.maximum(index_first - steps, 1)) + steps
+            is_not_found = value_indexes > index_last
+        else:
+            # non-monotonic reference data: vectorized search of the closest value, one splitting value at a time
+            value_indexes = numpy.zeros(n_values, dtype=int)
+            is_not_found = numpy.zeros(n_values, dtype=bool)
+            value_index_prev = 0
+
+            for k in range(n_values):
+                closest_value = ref_data[numpy.argmin(numpy.abs(ref_data - spl_values[k]))]
+                is_closest_value = ref_data[value_index_prev + 1:] == closest_value
+                if not numpy.any(is_closest_value):
+                    is_not_found[k:] = True
+                    break
+                value_indexes[k] = value_index_prev + 1 + numpy.argmax(is_closest_value)
+                value_index_prev = value_indexes[k] + 1
+
+        if numpy.any(is_not_found):
+            k = numpy.argmax(is_not_found)
+            value_index_prev = 0 if k == 0 else value_indexes[k - 1] + 1
+            raise ValueError(f"[split]: did not find a final index bigger than the initial index {value_index_prev}.")
+
+        return value_indexes
+
+    @staticmethod
+    def __get_scale_factors(data, mode):
+
+        if isinstance(data, Hdf5MatArray):
+            # lazily loaded data are read block by block
+            blocks = data.iter_blocks()
+        else:
+            blocks = [data]
+
+        n_data = 0
+        min_value, max_value, mean_value, sum_squared_diff = numpy.inf, -numpy.inf, 0.0, 0.0
+        for block in blocks:
+            if block.size == 0:
+                continue
+            if mode == 'z_score':
+                # mean and variance of the blocks are merged with the parallel algorithm of Chan et al.
+                block_mean = numpy.mean(block, dtype=numpy.float64)
+                block_sum_squared_diff = numpy.sum((block - block_mean)**2)
+                delta = block_mean - mean_value
+                n_total = n_data + block.size
+                mean_value = mean_value + delta * block.size / n_total
+                sum_squared_diff = sum_squared_diff + block_sum_squared_diff + delta**2 * n_data * block.size / n_total
+                n_data = n_total
+            else:
+                min_value = min(min_value, float(numpy.min(block)))
+                max_value = max(max_value, float(numpy.max(block)))
+                n_data = n_data + block.size
+
+        if n_data == 0:
+            return 0.0, 0.0
+        elif mode == 'max_abs':
+            return 0.0, max(abs(min_value), abs(max_value))
+        elif mode == 'min_max':
+            return min_value, max_value - min_value
+        else:
+            return float(mean_value), float(numpy.sqrt(sum_squared_diff / n_data))
+
+    def __plot_pair(self, axes, x_data, y_data, decimate, redecimate_on_zoom):
+
+        is_lazy = isinstance(x_data, Hdf5MatArray) or isinstance(y_data, Hdf5MatArray)
+        if not (decimate or is_lazy):
+            axes.plot(x_data, y_data)
+            return
+
+        # one bucket per pixel of the plot width
+        n_buckets = max(int(axes.get_window_extent().width), 100)
+        x_plot, y_plot = self.__minmax_envelope(x_data, y_data, n_buckets, 0, len(y_data))
+        line, = axes.plot(x_plot, y_plot)
+
+        # lazily loaded x data are assumed to be monotonic, as they cannot be checked without reading them
+        if redecimate_on_zoom and (isinstance(x_data, Hdf5MatArray) or self.__is_monotonic(numpy.ravel(x_data))):
+
+            def on_xlim_changed(changed_axes):
+                x_min, x_max = changed_axes.get_xlim()
+                start = max(self.__search_sorted(x_data, x_min) - 1, 0)
+                stop = min(self.__search_sorted(x_data, x_max) + 1, len(x_data))
+                line.set_data(*self.__minmax_envelope(x_data, y_data, n_buckets, start, stop))
+
+            axes.callbacks.connect('xlim_changed', on_xlim_changed)
+
+    def __minmax_envelope(self, x_data, y_data, n_buckets, start, stop):
+
+        # the rows [start, stop) are divided in n_buckets buckets, and the min and max of each bucket are selected in
+        # their original order. Data are processed in blocks made of whole buckets, so that lazily loaded data are read
+        # from disk one block at a time
+        n_rows = stop - start
+        bucket_size = max(-(-n_rows // n_buckets), 1)
+        block_size = bucket_size * max(self.block_size // bucket_size, 1)
+        x_envelope, y_envelope = [], []
+
+        for block_start in range(start, stop, block_size):
+            block_stop = min(block_start + block_size, stop)
+            x_block = numpy.ravel(numpy.asarray(x_data[block_start:block_stop]))
+            y_block = numpy.ravel(numpy.asarray(y_data[block_start:block_stop]))
+            if bucket_size <= 2:
+                x_envelope.append(x_block)
+                y_envelope.append(y_block)
+                continue
+
+            n_full = (y_block.size // bucket_size) * bucket_size
+            buckets = y_block[:n_full].reshape(-1, bucket_size)
+            index_min, index_max = numpy.argmin(buckets, axis=1), numpy.argmax(buckets, axis=1)
+            offsets = numpy.arange(buckets.shape[0]) * bucket_size
+            indexes = [numpy.stack([numpy.minimum(index_min, index_max) + offsets,
+                                    numpy.maximum(index_min, index_max) + offsets], axis=1).ravel()]
+
+            if n_full < y_block.size:
+                # last, partial bucket
+                tail = y_block[n_full:]
+                indexes.append(n_full + numpy.sort([numpy.argmin(tail), numpy.argmax(tail)]))
+
+            indexes = numpy.concatenate(indexes)
+            x_envelope.append(x_block[indexes])
+            y_envelope.append(y_block[indexes])
+
+        if len(y_envelope) == 0:
+            return numpy.empty(0), numpy.empty(0)
+        return numpy.concatenate(x_envelope), numpy.concatenate(y_envelope)
+
+    @staticmethod
+    def __search_sorted(x_data, value):
+
+        if isinstance(x_data, numpy.ndarray):
+            return int(numpy.searchsorted(numpy.ravel(x_data), value))
+
+        # binary search on lazily loaded data, which reads only log2(n) values from disk
+        low, high = 0, len(x_data)
+        while low < high:
+            middle = (low + high) // 2
+            if numpy.ravel(x_data[middle])[0] < value:
+                low = middle + 1
+            else:
+                high = middle
+        return low
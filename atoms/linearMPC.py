@@ -1,7 +1,10 @@
+import time
 import osqp
 import numpy as np
 from scipy import sparse as sp
 from atoms.atoms_helpers import Helpers
+from atoms.mpc_solution import MPCSolution
+from atoms.solver_stats import SolverStats
 
 
 class LinearMPC:
@@ -10,19 +13,35 @@ class LinearMPC:
 
         The class solves the following optimal control problem:
 
-            minimize (x(N)-x_r)^T*Q_N*(x(N)-x_r) + sum_{k=1}^{N-1}[(x(k)-x_r)^T*Q*(x(k)-x_r) + u(k)^T*R*u(k)]
+            minimize (x(N)-x_r(N))^T*Q_N*(x(N)-x_r(N)) + sum_{k=0}^{N-1}[(x(k)-x_r(k))^T*Q*(x(k)-x_r(k)) +
+                                                                         (u(k)-u_r(k))^T*R*(u(k)-u_r(k))]
                   s.t.
                       x(k+1) = A*x(k) + B*u(k)
                       x_min <= x(k) <= x_max
                       u_min <= u(k) <= u_max
 
+        The limits on the states can be soft, with slack variables eps(k) >= 0 and an exact (linear) penalty:
+
+                      x_min - eps(k) <= x(k) <= x_max + eps(k),  with cost sum_{k=0}^{N} w_soft^T*eps(k)
+
+        The rate of change of the inputs du(k) = u(k) - u(k-1), with u(-1) the previous applied input u_prev, can be
+        penalized and limited:
+
+                      cost sum_{k=0}^{N-1} du(k)^T*R_du*du(k),  du_min <= du(k) <= du_max
+
+    The wall times of the setup, update and solve calls, and the iterations and residuals of OSQP, are recorded in
+    self.stats (see the SolverStats class).
+
     Author: Gabriele Nava, gabriele.nava@iit.it
     Last updated on 01/04/2023
     """
-    def __init__(self, debug=False):
+    def __init__(self, debug=False, stats_size=1000):
         self.variables = {}
+        self.parameters = {}
+        self.budget = {'time_limit': None, 'max_iter': None, 'fallback': 'raise'}
         self.debug = debug
         self.solver = osqp.OSQP()
+        self.stats = SolverStats(stats_size)
 
         if debug:
             self.logger = Helpers.init_logger()
@@ -31,7 +50,7 @@ class LinearMPC:
         return f" LinearMPC class object \n" \
                f" Stored variables: {self.variables}"
 
-    def setup(self, variables):
+    def setup(self, variables, formulation='sparse', warm_start='shift'):
         """
         Cast the MPC problem to a QP.
         :param variables: list of variables to be passed to the QP solver. It must include:
@@ -41,48 +60,152 @@ class LinearMPC:
             - x_max = upper limits on x
             - u_min = lower limits on u
             - u_max = upper limits on u
-            - x_r = reference state
+            - x_r = reference state, or reference trajectory of shape (N+1, n_x)
             - x_0 = initial state
             - N = number of prediction steps
             - Q = weight on state error
             - Q_N = weight on final state error
             - R = weight on input
+        It can also include:
+            - u_r = reference input, or reference input trajectory of shape (N, n_u). Default is zero
+            - x_soft = penalties on the violation of the limits on x, of shape (n_x,). The limits on the states with a
+              positive penalty are soft, the others are hard. Default is zero (hard limits). The penalty is exact,
+              i.e. the limits are satisfied whenever possible, if it is larger than the Lagrange multipliers of the
+              hard limits. Soft limits require the sparse formulation
+            - R_du = weight on the rate of change of the inputs. Default is zero
+            - du_min = lower limits on the rate of change of the inputs. Default is -inf
+            - du_max = upper limits on the rate of change of the inputs. Default is inf
+            - u_prev = previous applied input, for the rate of change of u(0). Default is zero
+              The rate of change penalties and limits require the sparse formulation
+        :param formulation: 'sparse' (default) or 'condensed'. The sparse formulation optimizes over states and inputs,
+        with the dynamics as equality constraints. The condensed formulation eliminates the states through the
+        prediction x = S_x*x_0 + S_u*u, and optimizes over the inputs only: the QP is smaller but dense, which is
+        usually faster for systems with few states and inputs. In both cases, solve returns states and inputs.
+        :param warm_start: the initial guess of OSQP at each solve. With 'shift' (default), when x_0 is updated after a
+        solve, the previous primal and dual solutions are shifted by one step of the horizon, with the last step
+        repeated, as in a receding horizon. With 'previous', OSQP starts from the previous solution, not shifted.
+        With 'none', OSQP starts from zero.
         """
+        if formulation not in ['sparse', 'condensed']:
+            raise ValueError(f'[setup]: unknown formulation {formulation}, use sparse or condensed.')
+        if warm_start not in ['shift', 'previous', 'none']:
+            raise ValueError(f'[setup]: unknown warm start {warm_start}, use shift, previous or none.')
+
+        time_init = time.perf_counter()
+
         # demux variables
         N = variables['N']
-        Q = variables['Q']
-        R = variables['R']
-        Q_N = variables['Q_N']
+        Q = self.__as_matrix(variables['Q'])
+        R = self.__as_matrix(variables['R'])
+        Q_N = self.__as_matrix(variables['Q_N'])
         x_r = variables['x_r']
         x_0 = variables['x_0']
-        x_min = variables['x_min']
-        x_max = variables['x_max']
-        u_min = variables['u_min']
-        u_max = variables['u_max']
-        A = variables['A']
-        B = variables['B']
+        A = self.__as_matrix(variables['A'])
+        B = self.__as_matrix(variables['B'])
         [n_x, n_u] = B.shape
+        R_du = self.__as_matrix(variables.get('R_du', np.zeros((n_u, n_u))))
 
         # save useful variables
         self.variables.update({'N': N, 'Q': Q, 'Q_N': Q_N, 'n_x': n_x, 'x_0': x_0, 'x_r': x_r})
 
-        # create the Hessian matrix. Format:
+        # the nonzeros of the QP matrices are linear functions of the parameters vector theta, which stores the
+        # nonzeros of the model and weight matrices. The sparsity patterns are fixed at setup, and update_model
+        # changes the values of the matrices in place. Format:
+        #
+        # theta = [1; Q; Q_N; R; A; B; R_du]
+        #
+        self.parameters.update({'N': N, 'n_x': n_x, 'n_u': n_u, 'R': R, 'A': A, 'B': B, 'R_du': R_du,
+                                'formulation': formulation, 'warm_start': warm_start,
+                                'x_0': np.array(x_0, dtype=float), 'x_r': np.zeros((N+1, n_x)),
+                                'u_r': np.zeros((N, n_u)), 'masks': {}, 'segments': {}})
+        self.parameters['x_r'][:] = x_r
+        self.parameters['u_r'][:] = variables.get('u_r', 0.0)
+        self.parameters.update({'constant_reference': np.ndim(x_r) == 1})
+        theta = [np.ones(1)]
+        for name, value in [('Q', Q), ('Q_N', Q_N), ('R', R), ('A', A), ('B', B), ('R_du', R_du)]:
+            mask = value != 0
+            offset = sum(len(segment) for segment in theta)
+            # only the upper triangular part of the weights is stored in P
+            nonzeros = value[np.triu(mask)] if name in ['Q', 'Q_N', 'R', 'R_du'] else value[mask]
+            theta.append(nonzeros)
+            self.parameters['masks'].update({name: mask})
+            self.parameters['segments'].update({name: slice(offset, offset + len(nonzeros))})
+        self.parameters.update({'theta': np.hstack(theta)})
+
+        for bound in ['x_min', 'x_max', 'u_min', 'u_max']:
+            self.parameters.update({bound: np.array(variables[bound], dtype=float)})
+
+        # variables with at least one finite limit. With the sparse formulation, the others have no constraint rows
+        x_bounded = np.isfinite(self.parameters['x_min']) | np.isfinite(self.parameters['x_max'])
+        u_bounded = np.isfinite(self.parameters['u_min']) | np.isfinite(self.parameters['u_max'])
+        if formulation == 'condensed':
+            u_bounded = np.ones(n_u, dtype=bool)
+        self.parameters.update({'x_bounded': x_bounded, 'u_bounded': u_bounded})
+
+        # soft limits on the states, with one slack variable per soft state and step
+        x_soft = np.zeros(n_x)
+        x_soft[:] = variables.get('x_soft', 0.0)
+        soft = (x_soft > 0) & x_bounded
+        if np.any(soft) and formulation == 'condensed':
+            raise ValueError('[setup]: soft limits on the states require the sparse formulation.')
+        self.parameters.update({'x_soft': x_soft, 'soft': soft, 'n_s': np.count_nonzero(soft)})
+
+        # rate of change of the inputs, with one constraint row per input with limits and step
+        for bound, default in [('du_min', -np.inf), ('du_max', np.inf), ('u_prev', 0.0)]:
+            self.parameters.update({bound: np.full(n_u, default)})
+            self.parameters[bound][:] = variables.get(bound, default)
+        du_bounded = np.isfinite(self.parameters['du_min']) | np.isfinite(self.parameters['du_max'])
+        rate = np.any(R_du != 0) or np.any(du_bounded)
+        if rate and formulation == 'condensed':
+            raise ValueError('[setup]: the rate of change penalties and limits require the sparse formulation.')
+        self.parameters.update({'du_bounded': du_bounded, 'n_du': np.count_nonzero(du_bounded), 'rate': rate})
+
+        if formulation == 'condensed':
+            self.__setup_condensed()
+            self.__setup_solver(time_init)
+            if self.debug:
+                self.logger.debug('QP problem setup completed (condensed formulation).')
+            return
+
+        # create the Hessian matrix (upper triangular part). Format:
         #
         # P = [ Q   0 ...  R  ... 0;
         #       0   Q ...  0  ... 0;
         #      ...  0  0  ...  0  R];
         #
-        P = sp.block_diag([sp.kron(sp.eye(N), Q), Q_N, sp.kron(sp.eye(N), R)], format='csc')
+        # the slack variables of the soft limits eps = [eps(0); ...; eps(N)] follow the inputs, and have a linear cost
+        #
+        # the rate of change penalties add a block tridiagonal term to the inputs block, whose upper triangular part is
+        #
+        #     [2*R_du  -R_du  ...     0;
+        #        0     2*R_du ...     0;
+        #       ...     ...   ...  -R_du;
+        #        0      0     ...   R_du]
+        #
+        ids = {name: self.__parameters_ids(name) for name in ['Q', 'Q_N', 'R', 'A', 'B', 'R_du']}
+        n_z = (N+1)*n_x + N*n_u
+        n_eps = (N+1)*self.parameters['n_s']
+        n_eq = (N+1)*n_x
+        patterns = [self.__pattern(ids['Q'], N), self.__pattern(ids['Q_N'], 1, (N*n_x, N*n_x)),
+                    self.__pattern(ids['R'], N, (n_eq, n_eq))]
+        if np.any(ids['R_du']):
+            # R_du is symmetric: the off-diagonal blocks use its full pattern, from the upper triangular part
+            ids_full = ids['R_du'] + np.triu(ids['R_du'], k=1).T
+            patterns += [self.__pattern(ids['R_du'], N-1, (n_eq, n_eq), 2),
+                         self.__pattern(ids['R_du'], 1, (n_eq + (N-1)*n_u, n_eq + (N-1)*n_u)),
+                         self.__pattern(ids_full, N-1, (n_eq, n_eq + n_u), -1)]
+        P, P_map = self.__assemble(patterns, (n_z + n_eps, n_z + n_eps))
         self.variables.update({'P': P})
 
         # create the gradient. Format:
         #
-        # q = [-Q * x_r; ...; -Q_N * x_r; ...; 0]
+        # q = [-Q * x_r(0); ...; -Q * x_r(N-1); -Q_N * x_r(N); -R * u_r(0) - R_du * u_prev; ...; -R * u_r(N-1);
+        #      w_soft; ...; w_soft]
         #
-        # note: the term x_r^T*Q*x_r does not affect the QP solution, and it is ignored.
+        # note: the terms x_r^T*Q*x_r and u_r^T*R*u_r do not affect the QP solution, and they are ignored.
         #
-        q = np.hstack([np.kron(np.ones(N), -Q.dot(x_r)), -Q_N.dot(x_r), np.zeros(N*n_u)])
-        self.variables.update({'q': q})
+        self.variables.update({'q': np.zeros(n_z + n_eps)})
+        self.__update_gradient()
 
         # constraints: linear dynamics and initial conditions
         #
@@ -99,79 +222,638 @@ class LinearMPC:
         #
         # leq = ueq = [-x0; 0; 0]
         #
-        A_dyn = sp.kron(sp.eye(N+1), -sp.eye(n_x)) + sp.kron(sp.eye(N+1, k=-1), A)
-        B_dyn = sp.kron(sp.vstack([sp.csc_matrix((1, N)), sp.eye(N)]), B)
-        A_eq = sp.hstack([A_dyn, B_dyn])
-        l_eq = np.hstack([-x_0, np.zeros(N*n_x)])
-        u_eq = l_eq
-
-        # constraints: lower and upper bounds
-        A_ineq = sp.eye((N+1)*n_x + N*n_u)
-        l_ineq = np.hstack([np.kron(np.ones(N+1), x_min), np.kron(np.ones(N), u_min)])
-        u_ineq = np.hstack([np.kron(np.ones(N+1), x_max), np.kron(np.ones(N), u_max)])
-
+        # constraints: lower and upper bounds, only for the variables with at least one finite limit
+        #
+        # A_ineq = I (rows of the bounded variables)
+        #
+        # constraints: soft limits, with S selecting the soft states. The rows of the soft states in A_ineq become
+        # x(k) + eps(k) >= x_min, and the rows x(k) - eps(k) <= x_max and eps(k) >= 0 are added
+        #
+        # A_soft = [S  0  I;
+        #           S' 0 -I;
+        #           0  0  I]
+        #
+        # constraints: limits on the rate of change, only for the inputs with at least one finite limit (selected by
+        # D), with du_min + u_prev <= u(0) <= du_max + u_prev
+        #
+        # A_du = [0  D  0 ... 0  0;
+        #         0 -D  D ... 0  0;
+        #         0  0  0 ... -D D]
+        #
         # compose OSQP constraints
-        A_total = sp.vstack([A_eq, A_ineq], format='csc')
-        l_total = np.hstack([l_eq, l_ineq])
-        u_total = np.hstack([u_eq, u_ineq])
-        self.variables.update({'A': A_total, 'l': l_total, 'u': u_total})
+        #
+        # A_total = [A_dyn B_dyn 0;
+        #            A_ineq      ;
+        #            A_soft      ;
+        #            A_du        ]
+        #
+        # the nonzeros are placed directly, from the index patterns of the blocks
+        #
+        steps = np.arange(N+1)[:, np.newaxis]
+        bounded_index = np.hstack([np.flatnonzero(np.tile(x_bounded, N+1)),
+                                   n_eq + np.flatnonzero(np.tile(u_bounded, N))])
+        soft_rows = (steps*np.count_nonzero(x_bounded) + np.flatnonzero(soft[x_bounded])).ravel()
+        self.parameters.update({'bounded_index': bounded_index, 'soft_rows': soft_rows})
+        n_b = len(bounded_index)
+        eps_index = n_z + np.arange(n_eps)
+
+        patterns = [(np.arange(n_eq), np.arange(n_eq), np.ones(n_eq, dtype=int), -1),
+                    self.__pattern(ids['A'], N, (n_x, 0)), self.__pattern(ids['B'], N, (n_x, n_eq)),
+                    (n_eq + np.arange(n_b), bounded_index, np.ones(n_b, dtype=int), 1)]
+        if n_eps > 0:
+            soft_index = (steps*n_x + np.flatnonzero(soft)).ravel()
+            patterns += [(n_eq + soft_rows, eps_index, np.ones(n_eps, dtype=int), 1),
+                         (n_eq + n_b + np.arange(n_eps), soft_index, np.ones(n_eps, dtype=int), 1),
+                         (n_eq + n_b + np.arange(n_eps), eps_index, np.ones(n_eps, dtype=int), -1),
+                         (n_eq + n_b + n_eps + np.arange(n_eps), eps_index, np.ones(n_eps, dtype=int), 1)]
+        n_du = self.parameters['n_du']
+        if n_du > 0:
+            du_rows = n_eq + n_b + 2*n_eps + np.arange(N*n_du)
+            du_index = (n_eq + np.arange(N)[:, np.newaxis]*n_u + np.flatnonzero(du_bounded)).ravel()
+            patterns += [(du_rows, du_index, np.ones(N*n_du, dtype=int), 1),
+                         (du_rows[n_du:], du_index[:-n_du], np.ones((N-1)*n_du, dtype=int), -1)]
+        n_rows = n_eq + n_b + 2*n_eps + N*n_du
+        A_total, A_map = self.__assemble(patterns, (n_rows, n_z + n_eps))
+        self.variables.update({'A': A_total, 'l': np.zeros(n_rows), 'u': np.zeros(n_rows)})
+        self.parameters.update({'P_map': P_map, 'A_map': A_map})
+        self.__update_bounds()
 
         # set up the OSQP problem
-        self.solver.setup(P, q, A_total, l_total, u_total, warm_start=True)
+        self.__setup_solver(time_init)
 
         if self.debug:
             self.logger.debug('QP problem setup completed.')
 
     def update(self, **kwargs):
         """
-        Update the MPC problem. Can update both the initial conditions and/or the reference state.
+        Update the MPC problem. Can update both the initial conditions and/or the references. Only the values which
+        changed are written in place in the QP vectors, and only the changed vectors are sent to OSQP: a new initial
+        state changes l and u (and q, with the condensed formulation), and new references change q.
         Input can include:
             - x_0 = initial state
-            - x_r = reference state
+            - x_r = reference state, or reference trajectory of shape (N+1, n_x)
+            - u_r = reference input, or reference input trajectory of shape (N, n_u)
+            - u_prev = previous applied input, which changes q and the limits on the rate of change of u(0) only
         """
-        # demux variables
-        N = self.variables['N']
-        Q = self.variables['Q']
-        Q_N = self.variables['Q_N']
-        n_x = self.variables['n_x']
-        x_0 = self.variables['x_0']
-        x_r = self.variables['x_r']
-
-        # update x_0 and x_r accordingly to the user input
-        for k, v in kwargs.items():
-            if k == 'x_0':
-                x_0 = v
-            if k == 'x_r':
-                x_r = v
+        time_init = time.perf_counter()
+        parameters = self.parameters
+        new_state = False
+        new_reference = False
+        new_input = False
 
-        # update initial state
-        l_total = self.variables['l']
-        u_total = self.variables['u']
-        l_total[:n_x] = -x_0
-        u_total[:n_x] = -x_0
-        self.variables.update({'u': u_total, 'l': l_total})
+        # update x_0, x_r and u_r accordingly to the user input, if they changed
+        x_0 = kwargs.get('x_0')
+        if x_0 is not None:
+            # a new initial state starts a new step of the receding horizon
+            parameters['shift_warm_start'] = True
+            if not np.array_equal(x_0, parameters['x_0']):
+                parameters['x_0'][:] = x_0
+                new_state = True
+        for name in ['x_r', 'u_r']:
+            value = kwargs.get(name)
+            if value is not None and not np.all(parameters[name] == value):
+                parameters[name][:] = value
+                new_reference = True
+                if name == 'x_r':
+                    parameters['constant_reference'] = np.ndim(value) == 1
+        u_prev = kwargs.get('u_prev')
+        if u_prev is not None and not np.array_equal(u_prev, parameters['u_prev']):
+            parameters['u_prev'][:] = u_prev
+            new_input = parameters['rate']
 
-        # update reference state
-        q = self.variables['q']
-        q[:n_x*N] = np.kron(np.ones(N), -Q.dot(x_r))
-        q[n_x*N:n_x*(N+1)] = -Q_N.dot(x_r)
-        self.variables.update({'q': q})
+        # update the gradient (which depends on x_0 only with the condensed formulation) and the bounds
+        data = {}
+        if new_reference or (new_state and parameters['formulation'] == 'condensed'):
+            self.__update_gradient(reference=new_reference)
+            data['q'] = self.variables['q']
+        if new_state:
+            self.__update_initial_state()
+        if new_input:
+            self.__update_previous_input()
+            data['q'] = self.variables['q']
+        if new_state or new_input:
+            data['l'] = self.variables['l']
+            data['u'] = self.variables['u']
 
-        self.solver.update(q=q, l=l_total, u=u_total)
+        if data:
+            self.solver.update(**data)
+        self.stats.record('update', time.perf_counter() - time_init)
 
         if self.debug:
             self.logger.debug('QP problem updated correctly.')
 
+    def shift_reference(self, x_r=None, u_r=None):
+        """
+        Shift the reference trajectories by one step of the horizon, as for a receding horizon. The references of
+        the first step are dropped, and the new references are appended at the end of the horizon.
+        :param x_r: the reference state at the end of the new horizon. If None, the last reference state is repeated.
+        :param u_r: the reference input at the end of the new horizon. If None, the last reference input is repeated.
+        """
+        time_init = time.perf_counter()
+
+        for name, value in [('x_r', x_r), ('u_r', u_r)]:
+            reference = self.parameters[name]
+            reference[:-1] = reference[1:]
+            if value is not None:
+                reference[-1] = value
+                if name == 'x_r':
+                    self.parameters['constant_reference'] = False
+
+        self.__update_gradient()
+        self.solver.update(q=self.variables['q'])
+        self.stats.record('update', time.perf_counter() - time_init)
+
+        if self.debug:
+            self.logger.debug('[shift_reference]: reference trajectories shifted.')
+
+    def update_model(self, **kwargs):
+        """
+        Update the model, the weights and/or the bounds of the MPC problem, without setting up the problem again. The
+        sparsity patterns of the QP matrices are fixed at setup, and only the changed nonzeros are sent to OSQP, which
+        updates the factorization of the KKT matrix without repeating its symbolic analysis. This is intended for
+        linear time-varying or gain-scheduled systems, re-linearized at each control step.
+        Input can include:
+            - A, B = discrete system matrices
+            - Q, Q_N, R, R_du = weights on state error, final state error, input and rate of change of the input
+            - x_min, x_max, u_min, u_max, du_min, du_max = limits on x, u and on the rate of change of u
+            - x_soft = penalties on the violation of the soft limits on x
+        Matrices must have the same shape of the matrices passed to setup, and their nonzeros must be a subset of the
+        nonzeros at setup (entries can be set to zero, but new nonzeros require a new setup).
+        """
+        time_init = time.perf_counter()
+        theta = self.parameters['theta'].copy()
+        update_gradient = False
+        update_bounds = False
+
+        for k, v in kwargs.items():
+            if k in self.parameters['masks']:
+                mask = self.parameters['masks'][k]
+                v = self.__as_matrix(v)
+                if v.shape != mask.shape:
+                    raise ValueError(f'[update_model]: {k} must have shape {mask.shape}, {v.shape} given.')
+                if np.any(v[~mask] != 0):
+                    raise ValueError(f'[update_model]: the sparsity pattern of {k} cannot change, call setup instead.')
+                theta[self.parameters['segments'][k]] = v[np.triu(mask)] if k in ['Q', 'Q_N', 'R', 'R_du'] else \
+                    v[mask]
+                if k in ['Q', 'Q_N']:
+                    self.variables.update({k: v})
+                else:
+                    self.parameters.update({k: v})
+                update_gradient = update_gradient or k in ['Q', 'Q_N', 'R', 'R_du']
+            elif k in ['x_min', 'x_max', 'u_min', 'u_max', 'du_min', 'du_max']:
+                if np.any(np.isfinite(v) & ~self.parameters[f'{k[:-4]}_bounded']):
+                    raise ValueError(f'[update_model]: {k} cannot limit variables without limits at setup, call setup '
+                                     f'instead.')
+                self.parameters[k][:] = v
+                update_bounds = True
+            elif k == 'x_soft':
+                if np.any(((np.asarray(v) > 0) & self.parameters['x_bounded']) != self.parameters['soft']):
+                    raise ValueError('[update_model]: the soft limits cannot change, call setup instead.')
+                self.parameters['x_soft'][:] = v
+                update_gradient = True
+            else:
+                raise ValueError(f'[update_model]: {k} is not a model, weight or bound variable.')
+
+        self.parameters.update({'theta': theta})
+        data = {}
+
+        update_matrices = any(k in self.parameters['masks'] for k in kwargs.keys())
+        new_values = {}
+        if update_matrices and self.parameters['formulation'] == 'condensed':
+            # the condensed matrices, the gradient and the bounds depend on the model, and are computed again
+            P_dense, A_dense = self.__condense()
+            new_values.update({'P': P_dense.T[self.parameters['P_mask'].T],
+                               'A': A_dense.T[self.parameters['A_mask'].T]})
+            update_gradient = True
+            update_bounds = True
+        elif update_matrices:
+            new_values.update({name: self.parameters[f'{name}_map'] @ theta for name in ['P', 'A']})
+
+        # send to OSQP only the changed nonzeros of P and A
+        for name, values in new_values.items():
+            changed = np.flatnonzero(values != self.variables[name].data)
+            if len(changed) > 0:
+                self.variables[name].data[changed] = values[changed]
+                data.update({f'{name}x': values[changed], f'{name}x_idx': changed})
+
+        if update_gradient:
+            self.__update_gradient()
+            data.update({'q': self.variables['q']})
+        if update_bounds:
+            self.__update_bounds()
+            data.update({'l': self.variables['l'], 'u': self.variables['u']})
+
+        if len(data) > 0:
+            self.solver.update(**data)
+        self.stats.record('update', time.perf_counter() - time_init)
+
+        if self.debug:
+            self.logger.debug(f'[update_model]: updated {list(kwargs.keys())}, changed values: {list(data.keys())}.')
+
+    def reset_warm_start(self):
+        """
+        Start the next solve from zero, instead of the previous solution, and with the initial step size rho of OSQP
+        (which is adapted during the iterations). This is useful when the next problem is not related to the previous
+        one, e.g. for a new scenario, and makes the solution independent of the previous ones.
+        """
+        self.parameters.update({'iterate': None, 'shift_warm_start': False})
+        self.solver.warm_start(x=np.zeros(self.variables['P'].shape[0]), y=np.zeros(self.variables['A'].shape[0]))
+        self.solver.update_settings(rho=self.solver.settings.rho)
+
+        if self.debug:
+            self.logger.debug('[reset_warm_start]: warm start reset.')
+
+    def set_budget(self, time_limit=None, max_iter=None, fallback=None):
+        """
+        Set the time and iterations budget of solve, and what to do when the problem is not solved within the budget.
+        :param time_limit: the maximum run time of OSQP [s]. If None, the current setting is kept.
+        :param max_iter: the maximum number of OSQP iterations. If None, the current setting is kept.
+        :param fallback: 'raise' to raise an error when the problem is not solved, or 'shift' to return the previous
+        solution shifted by one step, with the last state and input repeated. If no previous solution is available,
+        an error is raised anyway. If None, the current setting is kept.
+        """
+        if fallback is not None and fallback not in ['raise', 'shift']:
+            raise ValueError(f'[set_budget]: unknown fallback {fallback}, use raise or shift.')
+
+        for k, v in [('time_limit', time_limit), ('max_iter', max_iter), ('fallback', fallback)]:
+            if v is not None:
+                self.budget.update({k: v})
+
+        # the budget is applied to the solver if it is already set up, otherwise at setup
+        settings = {k: v for k, v in [('time_limit', time_limit), ('max_iter', max_iter)] if v is not None}
+        if 'P' in self.variables and len(settings) > 0:
+            self.solver.update_settings(**settings)
+
+        if self.debug:
+            self.logger.debug(f'[set_budget]: budget set to {self.budget}.')
+
     def solve(self):
         """
         Solve the MPC problem.
+        :return: the solution, an MPCSolution object. It is the solution vector z = [x(0); ...; x(N); u(0); ...;
+        u(N-1)], with accessors to the states, inputs, first input, cost and solver statistics.
         """
+        time_init = time.perf_counter()
+
+        # warm start from the previous primal and dual solutions, shifted by one step
+        if self.parameters['shift_warm_start'] and self.parameters['iterate'] is not None:
+            x_index, y_index = self.parameters['warm_start_index']
+            self.solver.warm_start(x=self.parameters['iterate'][0][x_index], y=self.parameters['iterate'][1][y_index])
+        self.parameters.update({'shift_warm_start': False})
+
         res = self.solver.solve()
+        fallback = False
+        cost = res.info.obj_val
 
         # check solver status and return the solution
         if res.info.status != 'solved':
-            raise ValueError('OSQP did not solve the problem!')
-        else:
+            if self.budget['fallback'] != 'shift' or self.parameters['solution'] is None:
+                self.stats.record('solve', time.perf_counter() - time_init, res.info.iter, *self.__residuals(res.info),
+                                  res.info.status)
+                raise ValueError('OSQP did not solve the problem!')
+            # use the previous solution, shifted by one step
+            fallback = True
+            cost = np.nan
+            values = self.parameters['solution'][self.parameters['shift_index']]
             if self.debug:
-                self.logger.debug('QP problem solved correctly.')
-            return res.x
+                self.logger.debug(f'QP problem not solved ({res.info.status}), previous solution shifted.')
+        elif self.parameters['formulation'] == 'condensed':
+            # the predicted states are appended to the inputs, with the same layout of the sparse formulation. The
+            # cost is completed with the terms of the free response f = S_x*x_0, to match the sparse formulation
+            free_response = self.parameters['S_x'].dot(self.parameters['x_0'])
+            weighted_response = np.matmul(self.parameters['weights'], free_response.reshape(-1, self.parameters['n_x'],
+                                                                                            1)).ravel()
+            cost += (0.5*free_response - self.parameters['x_r'].ravel()).dot(weighted_response)
+            values = np.hstack([free_response + self.parameters['S_u'].dot(res.x), res.x])
+        else:
+            values = res.x
+
+        if not fallback and self.parameters['warm_start'] == 'shift':
+            self.parameters.update({'iterate': (res.x, res.y)})
+
+        primal_residual, dual_residual = self.__residuals(res.info)
+        wall_time = time.perf_counter() - time_init
+        info = {'status': res.info.status, 'iterations': res.info.iter, 'primal_residual': primal_residual,
+                'dual_residual': dual_residual, 'solve_time': wall_time, 'fallback': fallback}
+        solution = MPCSolution(values, self.parameters['N'], self.parameters['n_x'], self.parameters['n_u'], cost,
+                               info)
+        self.parameters.update({'solution': solution})
+        self.stats.record('solve', wall_time, res.info.iter, primal_residual, dual_residual, res.info.status,
+                          fallback)
+
+        if self.debug and not fallback:
+            self.logger.debug('QP problem solved correctly.')
+
+        return solution
+
+    def __setup_condensed(self):
+
+        # condensed formulation. The decision variables are the inputs u = [u(0); ...; u(N-1)], and the states are
+        # predicted as x = S_x*x_0 + S_u*u. Format:
+        #
+        # P = S_u^T*Q_bar*S_u + R_bar,  with Q_bar = diag(Q, ..., Q, Q_N) and R_bar = diag(R, ..., R)
+        #
+        # q = S_u^T*Q_bar*(S_x*x_0 - x_r) - R_bar*u_r
+        #
+        # A_total = [S_u; I],  l = [x_min - S_x*x_0; u_min],  u = [x_max - S_x*x_0; u_max]
+        #
+        # P is dense, and A_total has the block lower triangular pattern of S_u. Their patterns include the entries
+        # which are zero for the current model, so that update_model can change their values in place. The rows of
+        # S_u of the states without limits (x_min = -inf and x_max = inf) are dense, and they are not included.
+        N = self.parameters['N']
+        n_x = self.parameters['n_x']
+        n_u = self.parameters['n_u']
+        state_rows = np.tile(np.isfinite(self.parameters['x_min']) | np.isfinite(self.parameters['x_max']), N+1)
+        P_mask = np.triu(np.ones((N*n_u, N*n_u), dtype=bool))
+        A_mask = np.kron(np.tril(np.ones((N+1, N), dtype=bool), k=-1), np.ones((n_x, n_u), dtype=bool))
+        A_mask = np.vstack([A_mask[state_rows], np.eye(N*n_u, dtype=bool)])
+        self.parameters.update({'P_mask': P_mask, 'A_mask': A_mask, 'state_rows': state_rows})
+
+        P_dense, A_dense = self.__condense()
+        P = self.__dense_to_csc(P_dense, P_mask)
+        A_total = self.__dense_to_csc(A_dense, A_mask)
+        self.variables.update({'P': P, 'q': np.zeros(N*n_u), 'A': A_total, 'l': np.zeros(A_total.shape[0]),
+                               'u': np.zeros(A_total.shape[0])})
+        self.parameters.update({'q_r': np.zeros(N*n_u), 'free_response': np.zeros(np.count_nonzero(state_rows))})
+        self.__update_gradient()
+        self.__update_bounds()
+
+    def __setup_solver(self, time_init):
+
+        # set up the OSQP problem with the time and iterations budget, and record the setup time
+        settings = {k: v for k, v in self.budget.items() if k in ['time_limit', 'max_iter'] and v is not None}
+        self.solver.setup(self.variables['P'], self.variables['q'], self.variables['A'], self.variables['l'],
+                          self.variables['u'], warm_start=self.parameters['warm_start'] != 'none', **settings)
+        self.parameters.update({'shift_index': self.__shift_index(), 'warm_start_index': self.__warm_start_index(),
+                                'solution': None, 'iterate': None, 'shift_warm_start': False})
+        self.stats.record('setup', time.perf_counter() - time_init)
+
+    def __shift_index(self):
+
+        # indexes of the solution shifted by one step, z_shifted = z[shift_index], with the layout
+        # z = [x(0); ...; x(N); u(0); ...; u(N-1); eps(0); ...; eps(N)]. The last state, input and slack are repeated
+        N = self.parameters['N']
+        n_x = self.parameters['n_x']
+        n_u = self.parameters['n_u']
+
+        return np.hstack([self.__shift_blocks(N+1, n_x, 0), self.__shift_blocks(N, n_u, (N+1)*n_x),
+                          self.__shift_blocks(N+1, self.parameters['n_s'], (N+1)*n_x + N*n_u)])
+
+    def __warm_start_index(self):
+
+        # indexes of the OSQP primal and dual solutions shifted by one step. Dual variables follow the constraints:
+        # initial conditions and dynamics, bounds on the bounded x and u, bounds on x - eps, eps >= 0 and bounds on
+        # the rate of change of u (sparse formulation), or bounds on the predicted states with limits and on u
+        # (condensed formulation)
+        N = self.parameters['N']
+        n_x = self.parameters['n_x']
+        n_u = self.parameters['n_u']
+
+        if self.parameters['formulation'] == 'condensed':
+            n_bounded = np.count_nonzero(self.parameters['state_rows']) // (N+1)
+            x_index = self.__shift_blocks(N, n_u, 0)
+            y_index = np.hstack([self.__shift_blocks(N+1, n_bounded, 0), self.__shift_blocks(N, n_u, (N+1)*n_bounded)])
+        else:
+            n_eq = (N+1)*n_x
+            n_s = self.parameters['n_s']
+            n_bx = np.count_nonzero(self.parameters['x_bounded'])
+            n_b = len(self.parameters['bounded_index'])
+            x_index = self.__shift_index()
+            y_index = np.hstack([self.__shift_blocks(N+1, n_x, 0), self.__shift_blocks(N+1, n_bx, n_eq),
+                                 self.__shift_blocks(N, np.count_nonzero(self.parameters['u_bounded']),
+                                                     n_eq + (N+1)*n_bx),
+                                 self.__shift_blocks(N+1, n_s, n_eq + n_b),
+                                 self.__shift_blocks(N+1, n_s, n_eq + n_b + (N+1)*n_s),
+                                 self.__shift_blocks(N, self.parameters['n_du'], n_eq + n_b + 2*(N+1)*n_s)])
+
+        return x_index, y_index
+
+    def __update_gradient(self, reference=True):
+
+        # q = [-Q * x_r(0); ...; -Q_N * x_r(N); -R * u_r(0); ...], computed in place as [x_r * Q^T; u_r * R^T]. With
+        # reference=False, only the terms which depend on x_0 are updated
+        N = self.parameters['N']
+        n_x = self.parameters['n_x']
+        n_u = self.parameters['n_u']
+        x_r = self.parameters['x_r']
+        q = self.variables['q']
+
+        if self.parameters['formulation'] == 'condensed':
+            # q = F*x_0 + q_r, with F = S_u^T*Q_bar*S_x and q_r = -S_u^T*Q_bar*x_r - R_bar*u_r
+            q_r = self.parameters['q_r']
+            if reference:
+                np.matmul(self.parameters['u_r'], self.parameters['R'].T, out=q_r.reshape(N, n_u))
+                np.negative(q_r, out=q_r)
+                # q is used as a buffer. With the same reference state at each step, S_u^T*Q_bar*x_r = W_r*x_r(0),
+                # where W_r sums the blocks of W^T
+                if self.parameters['constant_reference']:
+                    np.dot(self.parameters['W_r'], x_r[0], out=q)
+                else:
+                    np.dot(self.parameters['W'].T, x_r.ravel(), out=q)
+                q_r -= q
+            np.dot(self.parameters['F'], self.parameters['x_0'], out=q)
+            q += q_r
+            return
+
+        if not reference:
+            return
+
+        n_z = (N+1)*n_x + N*n_u
+        q_x = q[:(N+1)*n_x].reshape(N+1, n_x)
+        if self.parameters['constant_reference']:
+            # the same reference state at each step: Q * x_r is computed once
+            np.dot(x_r[0], self.variables['Q'].T, out=q_x[0])
+            q_x[1:N] = q_x[0]
+        else:
+            np.matmul(x_r[:N], self.variables['Q'].T, out=q_x[:N])
+        np.matmul(x_r[N], self.variables['Q_N'].T, out=q_x[N])
+        np.matmul(self.parameters['u_r'], self.parameters['R'].T, out=q[(N+1)*n_x:n_z].reshape(N, n_u))
+        np.negative(q[:n_z], out=q[:n_z])
+        q[n_z:].reshape(N+1, -1)[:] = self.parameters['x_soft'][self.parameters['soft']]
+        if self.parameters['rate']:
+            q[(N+1)*n_x:(N+1)*n_x + n_u] -= self.parameters['R_du'].dot(self.parameters['u_prev'])
+
+    def __update_initial_state(self):
+
+        # terms of the bounds which depend on x_0, computed in place: l = u = -x_0 for the initial conditions (sparse
+        # formulation), or l = x_min - S_x*x_0 and u = x_max - S_x*x_0 for the states with limits (condensed)
+        x_0 = self.parameters['x_0']
+        l_total = self.variables['l']
+        u_total = self.variables['u']
+
+        if self.parameters['formulation'] == 'condensed':
+            free_response = self.parameters['free_response']
+            n_rows = len(free_response)
+            np.dot(self.parameters['S_x_rows'], x_0, out=free_response)
+            np.subtract(self.parameters['x_min_rows'], free_response, out=l_total[:n_rows])
+            np.subtract(self.parameters['x_max_rows'], free_response, out=u_total[:n_rows])
+            return
+
+        n_x = self.parameters['n_x']
+        np.negative(x_0, out=l_total[:n_x])
+        u_total[:n_x] = l_total[:n_x]
+
+    def __update_previous_input(self):
+
+        # terms which depend on u_prev, computed in place: the gradient of u(0), -R * u_r(0) - R_du * u_prev, and the
+        # limits on the rate of change of u(0), du_min + u_prev <= u(0) <= du_max + u_prev (sparse formulation)
+        N = self.parameters['N']
+        n_x = self.parameters['n_x']
+        n_u = self.parameters['n_u']
+        u_prev = self.parameters['u_prev']
+        q_0 = self.variables['q'][(N+1)*n_x:(N+1)*n_x + n_u]
+        np.dot(self.parameters['R'], self.parameters['u_r'][0], out=q_0)
+        q_0 += self.parameters['R_du'].dot(u_prev)
+        np.negative(q_0, out=q_0)
+
+        n_du = self.parameters['n_du']
+        if n_du > 0:
+            du_bounded = self.parameters['du_bounded']
+            rows = slice(len(self.variables['l']) - N*n_du, len(self.variables['l']) - (N-1)*n_du)
+            np.add(self.parameters['du_min'][du_bounded], u_prev[du_bounded], out=self.variables['l'][rows])
+            np.add(self.parameters['du_max'][du_bounded], u_prev[du_bounded], out=self.variables['u'][rows])
+
+    def __update_bounds(self):
+
+        # l = [-x_0; 0; ...; 0; x_min; ...; u_min; ...] and u = [-x_0; 0; ...; 0; x_max; ...; u_max; ...], without
+        # the rows of the variables without limits
+        N = self.parameters['N']
+        n_x = self.parameters['n_x']
+        n_eq = (N+1)*n_x
+        l_total = self.variables['l']
+        u_total = self.variables['u']
+
+        if self.parameters['formulation'] == 'condensed':
+            # l = [x_min - S_x*x_0; u_min] and u = [x_max - S_x*x_0; u_max], for the states with limits
+            state_rows = self.parameters['state_rows']
+            n_rows = np.count_nonzero(state_rows)
+            self.parameters.update({'x_min_rows': np.tile(self.parameters['x_min'], N+1)[state_rows],
+                                    'x_max_rows': np.tile(self.parameters['x_max'], N+1)[state_rows]})
+            l_total[n_rows:] = np.tile(self.parameters['u_min'], N)
+            u_total[n_rows:] = np.tile(self.parameters['u_max'], N)
+            self.__update_initial_state()
+            return
+
+        # bounds of the variables with at least one finite limit
+        bounded_index = self.parameters['bounded_index']
+        n_b = len(bounded_index)
+        l_total[n_eq:n_eq + n_b] = np.hstack([np.tile(self.parameters['x_min'], N+1),
+                                              np.tile(self.parameters['u_min'], N)])[bounded_index]
+        u_total[n_eq:n_eq + n_b] = np.hstack([np.tile(self.parameters['x_max'], N+1),
+                                              np.tile(self.parameters['u_max'], N)])[bounded_index]
+        self.__update_initial_state()
+
+        # soft limits: x + eps >= x_min, x - eps <= x_max and eps >= 0
+        n_eps = (N+1)*self.parameters['n_s']
+        if n_eps > 0:
+            soft = self.parameters['soft']
+            u_total[n_eq + self.parameters['soft_rows']] = np.inf
+            l_total[n_eq + n_b:n_eq + n_b + 2*n_eps] = np.hstack([-np.inf * np.ones(n_eps), np.zeros(n_eps)])
+            u_total[n_eq + n_b:n_eq + n_b + 2*n_eps] = np.hstack([np.tile(self.parameters['x_max'][soft], N+1),
+                                                                  np.inf * np.ones(n_eps)])
+
+        # limits on the rate of change of u(1), ..., u(N-1), and of u(0) with u_prev
+        n_du = self.parameters['n_du']
+        if n_du > 0:
+            du_bounded = self.parameters['du_bounded']
+            l_total[n_eq + n_b + 2*n_eps + n_du:] = np.tile(self.parameters['du_min'][du_bounded], N-1)
+            u_total[n_eq + n_b + 2*n_eps + n_du:] = np.tile(self.parameters['du_max'][du_bounded], N-1)
+            self.__update_previous_input()
+
+    def __parameters_ids(self, name):
+
+        # matrix with the (1-based) indexes in theta of the nonzeros of a model or weight matrix
+        mask = self.parameters['masks'][name]
+        if name in ['Q', 'Q_N', 'R', 'R_du']:
+            mask = np.triu(mask)
+        ids = np.zeros(mask.shape, dtype=int)
+        ids[mask] = np.arange(self.parameters['segments'][name].start, self.parameters['segments'][name].stop) + 1
+        return ids
+
+    def __assemble(self, patterns, shape):
+
+        # assemble a CSC matrix from index patterns (rows, columns, theta indexes, coefficient), whose nonzeros are
+        # the (1-based) theta indexes scaled by the coefficient. Nonzeros of overlapping patterns are summed. Returns
+        # the matrix and the linear map from theta to the nonzeros of the matrix
+        rows = np.hstack([pattern[0] for pattern in patterns])
+        columns = np.hstack([pattern[1] for pattern in patterns])
+        ids = np.hstack([pattern[2] for pattern in patterns]) - 1
+        values = np.hstack([np.full(len(pattern[0]), pattern[3], dtype=float) for pattern in patterns])
+
+        keys, entries = np.unique(columns * shape[0] + rows, return_inverse=True)
+        indptr = np.hstack([0, np.cumsum(np.bincount(keys // shape[0], minlength=shape[1]))])
+        mapping = sp.csr_matrix((values, (entries, ids)), shape=(len(keys), len(self.parameters['theta'])))
+        matrix = sp.csc_matrix((mapping @ self.parameters['theta'], keys % shape[0], indptr), shape=shape)
+
+        return matrix, mapping
+
+    @staticmethod
+    def __pattern(ids, n_blocks=1, offset=(0, 0), coefficient=1):
+
+        # index pattern of n_blocks copies of a block of (1-based) theta indexes, scaled by the coefficient and placed
+        # along a diagonal starting at the (row, column) offset
+        rows, columns = np.nonzero(ids)
+        shift = np.arange(n_blocks)[:, np.newaxis]
+        return (rows + offset[0] + shift*ids.shape[0]).ravel(), (columns + offset[1] + shift*ids.shape[1]).ravel(), \
+            np.tile(ids[rows, columns], n_blocks), coefficient
+
+    def __condense(self):
+
+        # prediction matrices x = S_x*x_0 + S_u*u, with S_x = [I; A; ...; A^N] and S_u(i, j) = A^(i-1-j)*B for j < i.
+        # Returns the dense P and A_total of the condensed formulation
+        N = self.parameters['N']
+        n_x = self.parameters['n_x']
+        n_u = self.parameters['n_u']
+        A = self.parameters['A']
+        B = self.parameters['B']
+
+        S_x = np.zeros(((N+1)*n_x, n_x))
+        S_x[:n_x] = np.eye(n_x)
+        for k in range(N):
+            S_x[(k+1)*n_x:(k+2)*n_x] = A.dot(S_x[k*n_x:(k+1)*n_x])
+
+        S_u = np.zeros(((N+1)*n_x, N*n_u))
+        for k in range(N):
+            S_u[(k+1)*n_x:, k*n_u:(k+1)*n_u] = S_x[:(N-k)*n_x].dot(B)
+
+        # W = Q_bar*S_u, computed block by block
+        weights = np.stack([self.variables['Q']] * N + [self.variables['Q_N']])
+        W = np.matmul(weights, S_u.reshape(N+1, n_x, N*n_u)).reshape((N+1)*n_x, N*n_u)
+        self.parameters.update({'S_x': S_x, 'S_u': S_u, 'W': W, 'weights': weights, 'F': W.T.dot(S_x),
+                                'W_r': W.T.reshape(N*n_u, N+1, n_x).sum(axis=1),
+                                'S_x_rows': S_x[self.parameters['state_rows']]})
+
+        P_dense = S_u.T.dot(W) + np.kron(np.eye(N), self.parameters['R'])
+        A_dense = np.vstack([S_u[self.parameters['state_rows']], np.eye(N*n_u)])
+
+        return P_dense, A_dense
+
+    @staticmethod
+    def __shift_blocks(n_blocks, block_size, offset):
+
+        # indexes of a sequence of n_blocks blocks of block_size elements starting at offset, shifted by one block
+        # with the last block repeated
+        index = offset + np.arange(n_blocks*block_size).reshape(n_blocks, block_size)
+        return index[np.r_[1:n_blocks, n_blocks-1]].ravel()
+
+    @staticmethod
+    def __residuals(info):
+
+        # primal and dual residuals of the solution (renamed from pri_res/dua_res in OSQP 1.0)
+        return getattr(info, 'prim_res', getattr(info, 'pri_res', np.nan)), \
+            getattr(info, 'dual_res', getattr(info, 'dua_res', np.nan))
+
+    @staticmethod
+    def __dense_to_csc(matrix, mask):
+
+        # CSC matrix with the entries of a dense matrix in the mask, including the zeros
+        indices = np.nonzero(mask.T)[1]
+        indptr = np.hstack([0, np.cumsum(np.count_nonzero(mask, axis=0))])
+        return sp.csc_matrix((matrix.T[mask.T], indices, indptr), shape=matrix.shape)
+
+    @staticmethod
+    def __as_matrix(value):
+
+        # model and weight matrices are stored as dense 2-D float arrays
+        value = value.toarray() if sp.issparse(value) else value
+        return np.atleast_2d(np.array(value, dtype=float))
@@ -0,0 +1,161 @@
+import os
+import numpy
+from scipy import io
+from collections import OrderedDict
+from atoms import atoms_helpers
+from atoms.hdf5_mat import Hdf5MatFile
+
+
+class MatCache:
+    """
+    MatCache class: cache of variables loaded from MATLAB .mat files. Only the requested variables are read from disk,
+    and they are stored per file, keyed on the file path and modification time. When the total size of the cached data
+    exceeds max_bytes, the least recently used files are evicted.
+
+    Cached arrays are read-only, so that they can be shared by multiple ImportData objects without being modified.
+    Variables of MATLAB v7.3 files are cached as Hdf5MatArray objects, which are read lazily from disk and do not count
+    towards the memory cap: they are not evicted to respect the cap, since evicting them would not free memory. The
+    v7.3 files are not kept open by the cache (see MatCache.read).
+    """
+    def __init__(self, max_bytes=2**30, debug=False):
+        self.debug = debug
+        self.max_bytes = max_bytes
+        self.n_bytes = 0
+        self.entries = OrderedDict()
+        self.helpers = atoms_helpers.Helpers()
+
+        if debug:
+            self.logger = atoms_helpers.Helpers.init_logger()
+
+    def __str__(self):
+        return f" MatCache class object \n" \
+               f" Cached files: {[key[0] for key in self.entries.keys()]} \n" \
+               f" Memory usage: {self.n_bytes} / {self.max_bytes} bytes"
+
+    def get(self, data_path_and_name, variables_list):
+        """
+        Get the selected variables of a .mat file. Variables which are not in the cache are read from disk.
+        :param data_path_and_name: a string with the path of the .mat file.
+        :param variables_list: the list (or the name) of the variables to get.
+        :return: a dict with the selected variables.
+        """
+        var_type = self.helpers.check_if_list_or_string(variables_list)
+        if var_type == 'str':
+            variables_list = [variables_list]
+
+        key = self.__get_key(data_path_and_name)
+        # the cached entry is copied, so that __store can remove its size before adding the new variables
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            entry = dict(self.entries[key])
+        else:
+            entry = {}
+
+        # read from disk only the variables that are not cached yet
+        missing_variables = [var_name for var_name in variables_list if var_name not in entry]
+        if len(missing_variables) > 0:
+            new_data = self.read(data_path_and_name, missing_variables)
+            for var_name, value in new_data.items():
+                if hasattr(value, 'flags'):
+                    value.flags.writeable = False
+                entry.update({var_name: value})
+            self.__store(key, entry)
+            if self.debug:
+                self.logger.debug(f'[get]: data {missing_variables} read from {data_path_and_name}.')
+        elif self.debug:
+            self.logger.debug(f'[get]: data {variables_list} found in cache.')
+
+        return {var_name: entry[var_name] for var_name in variables_list}
+
+    def clear(self):
+        """
+        Remove all files from the cache.
+        """
+        self.entries.clear()
+        self.n_bytes = 0
+
+    @staticmethod
+    def read(data_path_and_name, variables_list):
+        """
+        Read the selected variables from a .mat file, without loading the other variables stored in the file. MATLAB
+        v7.3 files are not loaded in memory: their variables are returned as Hdf5MatArray objects. The v7.3 file is
+        closed if all the variables are memory-mapped. Otherwise, it stays open until the Hdf5MatArray objects of the
+        chunked or compressed variables are deleted.
+        :param data_path_and_name: a string with the path of the .mat file.
+        :param variables_list: the list of variables to read.
+        :return: a dict with the selected variables.
+        """
+        data_path_and_name = MatCache.resolve_path(data_path_and_name)
+
+        if Hdf5MatFile.is_hdf5(data_path_and_name):
+            h5_mat = Hdf5MatFile(data_path_and_name)
+            try:
+                mat_data = h5_mat.read(variables_list)
+            except ValueError:
+                h5_mat.close()
+                raise
+            if all(getattr(value, 'h5_data', None) is None for value in mat_data.values()):
+                h5_mat.close()
+            return mat_data
+
+        mat_data = io.loadmat(data_path_and_name, variable_names=variables_list)
+
+        for var_name in variables_list:
+            if var_name not in mat_data:
+                raise ValueError(f'[read]: data {var_name} not found in {data_path_and_name}.')
+
+        return {var_name: mat_data[var_name] for var_name in variables_list}
+
+    def __store(self, key, entry):
+
+        # files are identified by their path, so older versions of the same file can be dropped
+        for old_key in [old_key for old_key in self.entries.keys() if old_key[0] == key[0] and old_key != key]:
+            self.__evict(old_key)
+
+        if key in self.entries:
+            self.n_bytes = self.n_bytes - self.__entry_size(self.entries[key])
+        self.entries.update({key: entry})
+        self.entries.move_to_end(key)
+        self.n_bytes = self.n_bytes + self.__entry_size(entry)
+
+        # evict the least recently used files until the memory cap is respected. A file which alone exceeds the cap
+        # is returned to the user, but it is not kept in the cache. Files without data in memory are skipped
+        while self.n_bytes > self.max_bytes:
+            old_key = next((old_key for old_key, old_entry in self.entries.items() if self.__entry_size(old_entry) > 0),
+                           None)
+            if old_key is None:
+                break
+            self.__evict(old_key)
+
+    def __evict(self, key):
+
+        entry = self.entries.pop(key)
+        self.n_bytes = self.n_bytes - self.__entry_size(entry)
+
+        if self.debug:
+            self.logger.debug(f'[evict]: file {key[0]} removed from cache.')
+
+    @staticmethod
+    def resolve_path(data_path_and_name):
+        """
+        Get the path of a .mat file. As in io.loadmat, the .mat extension can be omitted.
+        """
+        if not os.path.isfile(data_path_and_name) and os.path.isfile(data_path_and_name + '.mat'):
+            return data_path_and_name + '.mat'
+        return data_path_and_name
+
+    @staticmethod
+    def __entry_size(entry):
+
+        # memory-mapped and lazily read data are not stored in memory
+        return sum(value.nbytes for value in entry.values()
+                   if isinstance(value, numpy.ndarray) and not isinstance(value, numpy.memmap))
+
+    @staticmethod
+    def __get_key(data_path_and_name):
+
+        # the modification time and the size of the file are part of the key, so that a file modified on disk is read
+        # again instead of being served from the cache
+        data_path_and_name = MatCache.resolve_path(data_path_and_name)
+        file_stat = os.stat(data_path_and_name)
+        return os.path.abspath(data_path_and_name), file_stat.st_mtime_ns, file_stat.st_size
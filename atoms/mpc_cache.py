@@ -0,0 +1,142 @@
+import hashlib
+import numpy as np
+from scipy import sparse as sp
+from collections import OrderedDict
+from atoms.atoms_helpers import Helpers
+from atoms.linearMPC import LinearMPC
+
+
+class MPCCache:
+    """
+    MPCCache class: cache of LinearMPC problems which are set up, with the KKT matrix factorized by OSQP, keyed on a
+    hash of the problem structure: the model and weight matrices, the horizon, the formulation, the warm start, the
+    soft limits and which variables have limits. Getting a problem already in the cache costs a lookup and an update
+    of the QP vectors (initial state, references, previous input and limits), instead of a new setup.
+
+    When the estimated memory of the cached problems exceeds max_bytes, the least recently used problems are evicted.
+    The memory of a problem is the size of its matrices and vectors, plus the factorization of OSQP, estimated as
+    twice the size of the KKT matrix.
+    """
+    def __init__(self, max_bytes=2**28, debug=False):
+        self.debug = debug
+        self.max_bytes = max_bytes
+        self.n_bytes = 0
+        self.n_hits = 0
+        self.n_misses = 0
+        self.entries = OrderedDict()
+        self.sizes = {}
+
+        if debug:
+            self.logger = Helpers.init_logger()
+
+    def __str__(self):
+        return f" MPCCache class object \n" \
+               f" Cached problems: {len(self.entries)} \n" \
+               f" Hits: {self.n_hits}, misses: {self.n_misses} \n" \
+               f" Memory usage: {self.n_bytes} / {self.max_bytes} bytes"
+
+    def get(self, variables, formulation='sparse', warm_start='shift', settings=None):
+        """
+        Get a LinearMPC problem set up with the given variables. Problems which are not in the cache are set up.
+        :param variables: the variables of the MPC problem (see LinearMPC.setup).
+        :param formulation: the formulation of the QP (see LinearMPC.setup).
+        :param warm_start: the warm start of OSQP (see LinearMPC.setup).
+        :param settings: a dict of OSQP settings, applied when the problem is set up.
+        :return: the LinearMPC object. Cached objects are shared: their x_0, x_r, u_r, u_prev and limits are updated to
+        the given variables, while their OSQP settings and their last solution are kept.
+        """
+        key = self.__get_key(variables, formulation, warm_start)
+
+        if key in self.entries:
+            self.n_hits += 1
+            self.entries.move_to_end(key)
+            mpc = self.entries[key]
+            limits = dict({'du_min': -np.inf, 'du_max': np.inf}, **variables)
+            limits = {bound: limits[bound] for bound in ['x_min', 'x_max', 'u_min', 'u_max', 'du_min', 'du_max']
+                      if not np.all(limits[bound] == mpc.parameters[bound])}
+            if limits:
+                mpc.update_model(**limits)
+            mpc.update(x_0=variables['x_0'], x_r=variables['x_r'], u_r=variables.get('u_r', 0.0),
+                       u_prev=variables.get('u_prev', 0.0))
+            if self.debug:
+                self.logger.debug(f'[get]: problem {key[:8]} found in cache.')
+            return mpc
+
+        self.n_misses += 1
+        mpc = LinearMPC()
+        mpc.setup(variables, formulation=formulation, warm_start=warm_start)
+        if settings is not None:
+            mpc.solver.update_settings(**settings)
+        self.__store(key, mpc)
+
+        if self.debug:
+            self.logger.debug(f'[get]: problem {key[:8]} set up.')
+
+        return mpc
+
+    def clear(self):
+        """
+        Remove all problems from the cache.
+        """
+        self.entries.clear()
+        self.sizes.clear()
+        self.n_bytes = 0
+
+    def __store(self, key, mpc):
+
+        # the size is estimated once, since the problem does not grow after the setup
+        self.entries.update({key: mpc})
+        self.sizes.update({key: self.__entry_size(mpc)})
+        self.n_bytes = self.n_bytes + self.sizes[key]
+
+        # evict the least recently used problems until the memory cap is respected. A problem which alone exceeds the
+        # cap is returned to the user, but it is not kept in the cache
+        while self.n_bytes > self.max_bytes and len(self.entries) > 0:
+            self.__evict(next(iter(self.entries)))
+
+    def __evict(self, key):
+
+        self.entries.pop(key)
+        self.n_bytes = self.n_bytes - self.sizes.pop(key)
+
+        if self.debug:
+            self.logger.debug(f'[evict]: problem {key[:8]} removed from cache.')
+
+    @staticmethod
+    def __entry_size(mpc):
+
+        # arrays and sparse matrices of the problem, and the estimated factorization of the KKT matrix
+        values = list(mpc.variables.values()) + list(mpc.parameters.values())
+        n_bytes = 0
+        while values:
+            value = values.pop()
+            if isinstance(value, np.ndarray):
+                n_bytes += value.nbytes
+            elif sp.issparse(value):
+                n_bytes += value.data.nbytes + value.indices.nbytes + value.indptr.nbytes
+            elif isinstance(value, (dict, tuple, list)):
+                values.extend(value.values() if isinstance(value, dict) else value)
+
+        P = mpc.variables['P']
+        A = mpc.variables['A']
+        kkt_nnz = P.nnz + A.nnz + P.shape[0] + A.shape[0]
+        return n_bytes + 2 * kkt_nnz * (P.data.itemsize + P.indices.itemsize)
+
+    @staticmethod
+    def __get_key(variables, formulation, warm_start):
+
+        # hash of the data which define the QP matrices and the factorization. The initial state, the references and
+        # the values of the limits only change the QP vectors
+        digest = hashlib.sha1(f'{variables["N"]}/{formulation}/{warm_start}'.encode())
+        n_x, n_u = np.shape(variables['B'])
+        for name in ['A', 'B', 'Q', 'Q_N', 'R', 'R_du']:
+            value = variables.get(name, np.zeros((n_u, n_u)))
+            value = np.ascontiguousarray(value.toarray() if sp.issparse(value) else value, dtype=float)
+            digest.update(f'{name}{value.shape}'.encode())
+            digest.update(value.tobytes())
+        for name in ['x', 'u', 'du']:
+            bounded = np.isfinite(variables.get(f'{name}_min', -np.inf)) | np.isfinite(variables.get(f'{name}_max',
+                                                                                                      np.inf))
+            digest.update(np.ascontiguousarray(np.broadcast_to(bounded, n_x if name == 'x' else n_u)).tobytes())
+        digest.update(np.ascontiguousarray(np.broadcast_to(variables.get('x_soft', 0.0), n_x), dtype=float).tobytes())
+        return digest.hexdigest()
@@ -0,0 +1,148 @@
+import os
+import sys
+import glob
+import time
+import subprocess
+import importlib.util
+from importlib.machinery import EXTENSION_SUFFIXES
+from types import SimpleNamespace
+from atoms.linearMPC import LinearMPC
+
+
+class CodegenLinearMPC(LinearMPC):
+    """
+    CodegenLinearMPC class: LinearMPC problem solved by an OSQP solver generated in C. At setup, the QP built by
+    LinearMPC is exported through the code generation of OSQP, compiled into a Python extension and loaded. The
+    update, shift_reference, update_model and solve methods of LinearMPC then send the QP data to the generated
+    solver, in place of the Python interface of OSQP. The generated C code (in folder) can also be deployed on
+    embedded targets.
+
+        The settings of the generated solver are fixed at code generation, and its iterates cannot be set: the warm
+        start can only be 'previous' (the solver starts from its last solution) or 'none'. The Python bindings
+        generated by OSQP are extended to return the status, residuals and cost of the solution.
+
+    Compiling requires CMake, a C/C++ compiler and pybind11 (the Python package, or downloaded by CMake). Each
+    problem needs its own extension_name, since an extension is loaded only once per process.
+    """
+    def setup(self, variables, formulation='sparse', warm_start='previous', folder='emosqp_mpc',
+              extension_name='emosqp_mpc', settings=None):
+        """
+        Cast the MPC problem to a QP, and generate, compile and load its solver.
+        :param variables: the variables of the MPC problem (see LinearMPC.setup).
+        :param formulation: the formulation of the QP (see LinearMPC.setup).
+        :param warm_start: 'previous' (default) or 'none' (see LinearMPC.setup).
+        :param folder: the folder of the generated code. A relative path is relative to the current working directory.
+        :param extension_name: the name of the Python extension.
+        :param settings: a dict of OSQP settings of the generated solver.
+        """
+        if warm_start not in ['previous', 'none']:
+            raise ValueError(f'[setup]: warm start {warm_start} is not supported by the generated solver, use '
+                             f'previous or none.')
+
+        super().setup(variables, formulation=formulation, warm_start=warm_start)
+        self.solver.update_settings(verbose=False, **({} if settings is None else settings))
+
+        # the matrices are parameters of the generated solver, so that update_model works
+        folder = os.path.abspath(folder)
+        self.solver.codegen(folder, parameters='matrices', extension_name=extension_name, force_rewrite=True)
+        self.__extend_bindings(folder)
+        try:
+            self.__compile(folder)
+        except OSError as error:
+            raise ValueError(f'[setup]: the generated solver could not be compiled in {folder}: {error}')
+        except subprocess.CalledProcessError as error:
+            # the last lines of the CMake output usually explain the failure
+            output = error.stderr.strip() or error.stdout.strip()
+            raise ValueError(f'[setup]: the generated solver could not be compiled in {folder}: {error}\n'
+                             + '\n'.join(output.splitlines()[-20:]))
+
+        self.solver = GeneratedSolver(self.__load(folder, extension_name))
+
+        if self.debug:
+            self.logger.debug(f'[setup]: solver {extension_name} generated and compiled in {folder}.')
+
+    @staticmethod
+    def __extend_bindings(folder):
+
+        # the solve function of the generated bindings returns the exit flag of osqp_solve, which is zero when the
+        # solver runs, even if the problem is not solved. Return the information of the solver instead
+        bindings_path = os.path.join(folder, 'bindings.cpp')
+        with open(bindings_path) as bindings_file:
+            bindings = bindings_file.read()
+        results = 'py::make_tuple(x, y, status, (&solver)->info->iter, (&solver)->info->run_time)'
+        if results not in bindings:
+            raise ValueError('[setup]: the bindings generated by this version of OSQP are not supported.')
+        bindings = bindings.replace(results, 'py::make_tuple(x, y, std::string((&solver)->info->status), '
+                                             '(&solver)->info->iter, (&solver)->info->obj_val, '
+                                             '(&solver)->info->prim_res, (&solver)->info->dual_res)')
+        with open(bindings_path, 'w') as bindings_file:
+            bindings_file.write(bindings)
+
+    @staticmethod
+    def __compile(folder):
+
+        # build the extension with CMake, as the setup.py generated by OSQP does. If the pybind11 package is
+        # installed, CMake uses it instead of downloading pybind11
+        build_folder = os.path.join(folder, 'build')
+        os.makedirs(build_folder, exist_ok=True)
+        cmake_args = [f'-DCMAKE_LIBRARY_OUTPUT_DIRECTORY={folder}', f'-DPython_EXECUTABLE={sys.executable}',
+                      '-DPYBIND11_FINDPYTHON=NEW', '-DCMAKE_BUILD_TYPE=Release', '-DOSQP_EMBEDDED_MODE=2']
+        try:
+            import pybind11
+            cmake_args += ['-DFETCHCONTENT_TRY_FIND_PACKAGE_MODE=ALWAYS', f'-Dpybind11_DIR={pybind11.get_cmake_dir()}']
+        except ImportError:
+            pass
+
+        subprocess.run(['cmake', folder] + cmake_args, cwd=build_folder, check=True, capture_output=True, text=True)
+        subprocess.run(['cmake', '--build', '.', '--config', 'Release'], cwd=build_folder, check=True,
+                       capture_output=True, text=True)
+
+    @staticmethod
+    def __load(folder, extension_name):
+
+        paths = [path for suffix in EXTENSION_SUFFIXES for path in glob.glob(os.path.join(folder, extension_name +
+                                                                                           suffix))]
+        if len(paths) == 0:
+            raise ValueError(f'[setup]: the extension {extension_name} was not found in {folder}.')
+        spec = importlib.util.spec_from_file_location(extension_name, paths[0])
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module
+
+
+class GeneratedSolver:
+    """
+    GeneratedSolver class: wraps a compiled OSQP solver with the methods of the Python interface of OSQP which are
+    used by LinearMPC (update, solve, warm_start and update_settings).
+    """
+    def __init__(self, module):
+        """
+        :param module: the compiled extension.
+        """
+        self.module = module
+
+    def update(self, q=None, l=None, u=None, Px=None, Px_idx=None, Ax=None, Ax_idx=None):
+        """
+        Update the vectors and/or the nonzeros of the matrices of the QP, as osqp.OSQP.update.
+        """
+        if q is not None or l is not None or u is not None:
+            self.module.update_data_vec(q=q, l=l, u=u)
+        if Px is not None or Ax is not None:
+            self.module.update_data_mat(P_x=Px, P_i=Px_idx, A_x=Ax, A_i=Ax_idx)
+
+    def warm_start(self, x=None, y=None):
+        raise ValueError('[warm_start]: the iterates of the generated solver cannot be set.')
+
+    def update_settings(self, **settings):
+        raise ValueError('[update_settings]: the settings of the generated solver are fixed at code generation.')
+
+    def solve(self):
+        """
+        Solve the QP.
+        :return: the results, with the fields of the results of osqp.OSQP.solve used by LinearMPC.
+        """
+        time_init = time.perf_counter()
+        x, y, status, iterations, cost, primal_residual, dual_residual = self.module.solve()
+        info = SimpleNamespace(status=status, iter=iterations, obj_val=cost, prim_res=primal_residual,
+                               dual_res=dual_residual, solve_time=time.perf_counter() - time_init)
+        return SimpleNamespace(x=x, y=y, info=info)
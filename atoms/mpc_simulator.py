@@ -0,0 +1,134 @@
+import numpy as np
+from atoms.atoms_helpers import Helpers
+
+
+class ClosedLoopSimulator:
+    """
+    ClosedLoopSimulator class: simulate a LinearMPC controller in closed loop. At each step, the MPC problem is solved,
+    the first input is applied to the plant, and the initial state (and the reference) of the MPC problem is updated.
+
+        The plant is, by default, the linear model x(k+1) = A*x(k) + B*u(k) + w(k), where A and B can differ from the
+        model of the MPC problem (model mismatch) and w(k) is an optional disturbance. Any other plant can be simulated
+        by passing a function x(k+1) = plant(k, x(k), u(k)).
+
+    The state, input and reference trajectories are written in buffers which are allocated once, and reused by the
+    following simulations with the same number of steps: the returned arrays are overwritten by the next simulation.
+    """
+    def __init__(self, mpc, A=None, B=None, debug=False):
+        """
+        :param mpc: a LinearMPC object, already set up.
+        :param A: the state matrix of the plant. If None, the state matrix of the MPC model is used.
+        :param B: the input matrix of the plant. If None, the input matrix of the MPC model is used.
+        """
+        if 'N' not in mpc.parameters:
+            raise ValueError('[ClosedLoopSimulator]: the MPC problem must be set up before the simulation.')
+
+        self.mpc = mpc
+        self.A = mpc.parameters['A'] if A is None else np.asarray(A, dtype=float)
+        self.B = mpc.parameters['B'] if B is None else np.asarray(B, dtype=float)
+        self.states = None
+        self.inputs = None
+        self.references = None
+        self.debug = debug
+
+        # previous input of the first step of each simulation, for the rate of change of the inputs
+        self.u_prev = mpc.parameters['u_prev'].copy()
+
+        n_x = mpc.parameters['n_x']
+        n_u = mpc.parameters['n_u']
+        if self.A.shape != (n_x, n_x) or self.B.shape != (n_x, n_u):
+            raise ValueError(f'[ClosedLoopSimulator]: the plant matrices must have shapes {(n_x, n_x)} and '
+                             f'{(n_x, n_u)}.')
+
+        # buffer for the input contribution to the next state
+        self.__input_effect = np.zeros(n_x)
+
+        if debug:
+            self.logger = Helpers.init_logger()
+
+    def __str__(self):
+        return f" ClosedLoopSimulator class object \n" \
+               f" Simulated steps: {0 if self.inputs is None else len(self.inputs)}"
+
+    def simulate(self, x_0, n_steps, x_r=None, disturbance=None, plant=None, u_prev=None):
+        """
+        Simulate the closed loop.
+        :param x_0: the initial state of the plant.
+        :param n_steps: the number of steps.
+        :param x_r: the reference. If None, the reference of the MPC problem is not changed. It can be a reference
+        state, of shape (n_x,), a reference state per step, of shape (n_steps, n_x), used for the whole horizon, or a
+        reference trajectory with preview, of shape (n_steps+N, n_x), of which the MPC problem sees N+1 steps ahead.
+        :param disturbance: the disturbance w(k) added to the next state of the plant. It can be an array of shape
+        (n_steps, n_x), or a function w(k) = disturbance(k, x(k), u(k)). If None, there is no disturbance.
+        :param plant: a function x(k+1) = plant(k, x(k), u(k)) which replaces the linear plant. If None, the linear
+        plant is used.
+        :param u_prev: the input applied before the first step, for the rate of change of the inputs. If None, the
+        u_prev of the MPC problem when the simulator was created is used, so that simulations do not depend on the
+        previous ones.
+        :return: the states, of shape (n_steps+1, n_x), the inputs, of shape (n_steps, n_u), and the references of
+        the first step of the horizon, of shape (n_steps, n_x).
+        """
+        N = self.mpc.parameters['N']
+        n_x = self.mpc.parameters['n_x']
+        n_u = self.mpc.parameters['n_u']
+        self.__allocate(n_steps, n_x, n_u)
+
+        # the reference is updated at each step (reference per step), or shifted by one step (preview)
+        preview = False
+        if x_r is not None:
+            x_r = np.asarray(x_r, dtype=float)
+            if x_r.ndim == 1:
+                self.mpc.update(x_r=x_r)
+                x_r = None
+            elif len(x_r) == n_steps + N and N > 0:
+                preview = True
+                self.mpc.update(x_r=x_r[:N+1])
+            elif len(x_r) != n_steps:
+                raise ValueError(f'[simulate]: the reference must have {n_steps} or {n_steps + N} rows.')
+        if isinstance(disturbance, np.ndarray) and disturbance.shape != (n_steps, n_x):
+            raise ValueError(f'[simulate]: the disturbance must have shape {(n_steps, n_x)}.')
+
+        self.states[0] = x_0
+        self.mpc.update(x_0=self.states[0], u_prev=self.u_prev if u_prev is None else u_prev)
+
+        for k in range(n_steps):
+
+            if x_r is not None and not preview:
+                self.mpc.update(x_r=x_r[k])
+            self.references[k] = self.mpc.parameters['x_r'][0]
+
+            # solve the MPC problem and apply the first input
+            self.inputs[k] = self.mpc.solve().u_0
+
+            if plant is None:
+                np.dot(self.A, self.states[k], out=self.states[k+1])
+                np.dot(self.B, self.inputs[k], out=self.__input_effect)
+                self.states[k+1] += self.__input_effect
+            else:
+                self.states[k+1] = plant(k, self.states[k], self.inputs[k])
+
+            if disturbance is not None:
+                self.states[k+1] += disturbance[k] if isinstance(disturbance, np.ndarray) else \
+                    disturbance(k, self.states[k], self.inputs[k])
+
+            # move the horizon forward
+            if preview and k < n_steps - 1:
+                self.mpc.shift_reference(x_r=x_r[k+N+1])
+            self.mpc.update(x_0=self.states[k+1], u_prev=self.inputs[k])
+
+        if self.debug:
+            self.logger.debug(f'[simulate]: {n_steps} steps simulated.')
+
+        return self.states, self.inputs, self.references
+
+    def __allocate(self, n_steps, n_x, n_u):
+
+        # the buffers are allocated only when the number of steps changes. Steps not simulated (e.g. when the MPC
+        # problem is not solved) are NaN
+        if self.inputs is None or len(self.inputs) != n_steps:
+            self.states = np.empty((n_steps + 1, n_x))
+            self.inputs = np.empty((n_steps, n_u))
+            self.references = np.empty((n_steps, n_x))
+
+        for buffer in [self.states, self.inputs, self.references]:
+            buffer.fill(np.nan)
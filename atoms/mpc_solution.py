@@ -0,0 +1,71 @@
+import numpy as np
+
+
+class MPCSolution(np.ndarray):
+    """
+    MPCSolution class: solution of the LinearMPC problem. It is the solution vector z = [x(0); ...; x(N); u(0); ...;
+    u(N-1); eps(0); ...; eps(N)] returned by OSQP, where eps are the slack variables of the soft limits (if any), so
+    that it can be used (and sliced) as before, with accessors which return reshaped views of the vector, without
+    copies:
+
+        - states = predicted states, of shape (N+1, n_x)
+        - inputs = optimal inputs, of shape (N, n_u)
+        - u_0 = first input to be applied, of shape (n_u,)
+        - slacks = slack variables of the soft limits on the states, of shape (N+1, number of soft states)
+        - cost = optimal cost of the QP (without the constant terms, which do not depend on the solution)
+        - info = solver statistics (status, iterations, residuals, solve time, and if the solution is a fallback)
+
+    Slices and results of operations on the solution are plain numpy arrays.
+    """
+    def __new__(cls, values, N, n_x, n_u, cost=np.nan, info=None):
+        solution = np.asarray(values).view(cls)
+        solution.N = N
+        solution.n_x = n_x
+        solution.n_u = n_u
+        solution.cost = cost
+        solution.info = {} if info is None else info
+        return solution
+
+    def __array_finalize__(self, obj):
+        self.N = getattr(obj, 'N', None)
+        self.n_x = getattr(obj, 'n_x', None)
+        self.n_u = getattr(obj, 'n_u', None)
+        self.cost = getattr(obj, 'cost', np.nan)
+        self.info = getattr(obj, 'info', {})
+
+    def __array_wrap__(self, array, context=None, return_scalar=False):
+        array = array.view(np.ndarray)
+        return array[()] if return_scalar else array
+
+    def __getitem__(self, key):
+        return self.view(np.ndarray)[key]
+
+    def __str__(self):
+        return f" MPCSolution class object \n" \
+               f" Solution: {self.view(np.ndarray)} \n" \
+               f" Horizon: {self.N}, states: {self.n_x}, inputs: {self.n_u} \n" \
+               f" Cost: {self.cost} \n" \
+               f" Info: {self.info}"
+
+    def __reduce__(self):
+        # solutions are pickled (e.g. sent to other processes) as plain numpy arrays
+        return self.view(np.ndarray).__reduce__()
+
+    @property
+    def states(self):
+        return self.view(np.ndarray)[:(self.N+1)*self.n_x].reshape(self.N+1, self.n_x)
+
+    @property
+    def inputs(self):
+        start = (self.N+1)*self.n_x
+        return self.view(np.ndarray)[start:start + self.N*self.n_u].reshape(self.N, self.n_u)
+
+    @property
+    def u_0(self):
+        start = (self.N+1)*self.n_x
+        return self.view(np.ndarray)[start:start + self.n_u]
+
+    @property
+    def slacks(self):
+        start = (self.N+1)*self.n_x + self.N*self.n_u
+        return self.view(np.ndarray)[start:].reshape(self.N+1, -1)
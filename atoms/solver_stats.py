@@ -0,0 +1,99 @@
+import numpy as np
+from atoms.atoms_helpers import Helpers
+
+
+class SolverStats:
+    """
+    SolverStats class: fixed-size ring buffer with the wall times and the solver statistics of the calls to an
+    optimization problem (e.g. the setup, update and solve calls of the LinearMPC class). Records are written in place
+    in a preallocated structured array, so that recording does not allocate memory in a control loop, and the oldest
+    records are overwritten when the buffer is full.
+    """
+    record_type = np.dtype([('event', 'U8'), ('wall_time', float), ('iterations', int), ('primal_residual', float),
+                            ('dual_residual', float), ('status', 'U32'), ('fallback', bool)])
+
+    def __init__(self, size=1000, debug=False):
+        """
+        :param size: the number of records stored in the buffer.
+        """
+        if size < 1:
+            raise ValueError('[SolverStats]: the buffer size must be positive.')
+
+        self.size = size
+        self.buffer = np.zeros(size, dtype=self.record_type)
+        self.n_records = 0
+        self.debug = debug
+
+        if debug:
+            self.logger = Helpers.init_logger()
+
+    def __str__(self):
+        return f" SolverStats class object \n" \
+               f" Buffer size: {self.size} \n" \
+               f" Number of records: {self.n_records}"
+
+    def record(self, event, wall_time, iterations=0, primal_residual=np.nan, dual_residual=np.nan, status='',
+               fallback=False):
+        """
+        Store a record in the buffer.
+        :param event: the name of the event (e.g. 'setup', 'update', 'solve').
+        :param wall_time: the wall time of the event [s].
+        :param iterations: the number of iterations of the solver.
+        :param primal_residual: the primal residual of the solution.
+        :param dual_residual: the dual residual of the solution.
+        :param status: the status of the solver.
+        :param fallback: True if the solution has been replaced by a fallback solution.
+        """
+        self.buffer[self.n_records % self.size] = (event, wall_time, iterations, primal_residual, dual_residual,
+                                                   status, fallback)
+        self.n_records += 1
+
+    def records(self, event=None):
+        """
+        Get the stored records, from the oldest to the newest.
+        :param event: if not None, only the records of this event are returned.
+        :return: a structured array with the records.
+        """
+        if self.n_records <= self.size:
+            records = self.buffer[:self.n_records]
+        else:
+            records = np.roll(self.buffer, -(self.n_records % self.size))
+
+        return records if event is None else records[records['event'] == event]
+
+    def summary(self, percentiles=(50, 90, 99, 100)):
+        """
+        Summarize the stored records of each event.
+        :param percentiles: the percentiles of the wall times and of the iterations.
+        :return: a dict with, for each event, the number of records, the mean and the percentiles of the wall times
+        [s], and the percentiles of the iterations, the number of fallback solutions and the worst residuals of the
+        solve events.
+        """
+        records = self.records()
+        summary = {}
+
+        for event in np.unique(records['event']):
+            event_records = records[records['event'] == event]
+            event_summary = {'count': len(event_records), 'mean': np.mean(event_records['wall_time'])}
+            for percentile, value in zip(percentiles, np.percentile(event_records['wall_time'], percentiles)):
+                event_summary.update({f'p{percentile}': value})
+
+            if event == 'solve':
+                for percentile, value in zip(percentiles, np.percentile(event_records['iterations'], percentiles)):
+                    event_summary.update({f'iterations_p{percentile}': value})
+                event_summary.update({'fallbacks': int(np.count_nonzero(event_records['fallback'])),
+                                      'max_primal_residual': np.nanmax(event_records['primal_residual']),
+                                      'max_dual_residual': np.nanmax(event_records['dual_residual'])})
+
+            summary.update({str(event): event_summary})
+
+        if self.debug:
+            self.logger.debug(f'[summary]: {summary}')
+
+        return summary
+
+    def clear(self):
+        """
+        Remove all records.
+        """
+        self.n_records = 0
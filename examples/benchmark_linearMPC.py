@@ -0,0 +1,163 @@
+import time
+import tempfile
+import numpy as np
+from scipy.linalg import block_diag
+from atoms.linearMPC import LinearMPC
+from atoms.explicit_mpc import ExplicitLinearMPC
+from atoms.mpc_codegen import CodegenLinearMPC
+from atoms.atoms_helpers import Helpers
+
+"""
+Benchmark of the LinearMPC class.
+
+Compare the sparse and condensed formulations of the MPC problem on chains of discrete-time double integrators:
+
+  y_i(k+1) = [1 dt; 0 1]*y_i(k) + [0; dt]*u_i(k),  i = 1, ..., n_x/2
+
+For each number of states and prediction horizon, with and without limits on the states, the setup time and the
+average time of an update/solve step in closed loop are reported. The condensed formulation has N*n_u variables but
+dense matrices, while the sparse one has (N+1)*n_x + N*n_u variables with sparse matrices. The condensed formulation
+wins when only the inputs are limited and the horizon is short to medium; the sparse one wins for long horizons and
+when the states are limited, because each limited state adds a dense row to the condensed constraints.
+
+Then, compare the warm start strategies of LinearMPC ('none', 'previous' and 'shift') by the number of OSQP iterations
+in closed loop. OSQP checks the termination criteria at each iteration, to count the iterations exactly.
+
+Finally, compare the explicit MPC (see the ExplicitLinearMPC class) with OSQP on small problems, by the time to
+evaluate the first input and by the error of the explicit law, and the OSQP solver generated in C (see the
+CodegenLinearMPC class) with the Python interface of OSQP, by the time per solve.
+"""
+logger = Helpers.init_logger()
+logger.info('Benchmark of the LinearMPC class.')
+
+dt = 0.025
+n_sim = 250
+
+
+def get_variables(n_x, N, state_limits):
+
+    # chain of n_x/2 double integrators, each one with its own input
+    n_u = n_x // 2
+    A = block_diag(*[np.array([[1, dt], [0, 1]])] * n_u)
+    B = block_diag(*[np.array([[0], [dt]])] * n_u)
+
+    var = {}
+    var.update({'N': N})
+    var.update({'A': A})
+    var.update({'B': B})
+    var.update({'Q_N': 200 * np.eye(n_x)})
+    var.update({'Q': 2 * np.eye(n_x)})
+    var.update({'R': 0.1 * np.eye(n_u)})
+    var.update({'x_r': np.tile([1.0, 0.0], n_u)})
+    var.update({'x_0': np.tile([0.0, 0.5], n_u)})
+    var.update({'x_min': np.tile([-2, -10], n_u) if state_limits else -np.inf * np.ones(n_x)})
+    var.update({'x_max': np.tile([2, 10], n_u) if state_limits else np.inf * np.ones(n_x)})
+    var.update({'u_min': -5 * np.ones(n_u)})
+    var.update({'u_max': 5 * np.ones(n_u)})
+
+    return var
+
+
+def run_closed_loop(var, formulation, warm_start='shift', exact_iterations=False):
+
+    # setup and simulate the problem in closed loop, returning the setup time and the average step time
+    time_init = time.perf_counter()
+    opti = LinearMPC()
+    opti.setup(var, formulation=formulation, warm_start=warm_start)
+    opti.solver.update_settings(verbose=False)
+    if exact_iterations:
+        opti.solver.update_settings(check_termination=1, eps_abs=1e-5, eps_rel=1e-5)
+    setup_time = time.perf_counter() - time_init
+
+    x_0 = var['x_0']
+
+    time_init = time.perf_counter()
+    for i in range(n_sim):
+        u = opti.solve().u_0
+        x_0 = var['A'].dot(x_0) + var['B'].dot(u)
+        opti.update(x_0=x_0)
+
+    return setup_time, (time.perf_counter() - time_init) / n_sim, opti.stats
+
+
+for state_limits in [True, False]:
+    logger.info('Limits on states and inputs:' if state_limits else 'Limits on inputs only:')
+    for n_x in [2, 4, 8]:
+        for N in [10, 50, 200]:
+            var = get_variables(n_x, N, state_limits)
+            sparse_times = run_closed_loop(var, 'sparse')
+            condensed_times = run_closed_loop(var, 'condensed')
+            winner = 'sparse' if sparse_times[1] < condensed_times[1] else 'condensed'
+            logger.info(f'n_x = {n_x}, N = {N}: setup {sparse_times[0]*1e3:.2f} ms (sparse), '
+                        f'{condensed_times[0]*1e3:.2f} ms (condensed); step {sparse_times[1]*1e3:.3f} ms (sparse), '
+                        f'{condensed_times[1]*1e3:.3f} ms (condensed) -> {winner}')
+
+logger.info('Warm start strategies:')
+for formulation in ['sparse', 'condensed']:
+    for N in [20, 100]:
+        var = get_variables(2, N, True)
+        for warm_start in ['none', 'previous', 'shift']:
+            stats = run_closed_loop(var, formulation, warm_start, exact_iterations=True)[2]
+            summary = stats.summary()['solve']
+            logger.info(f'{formulation}, N = {N}, warm start {warm_start}: '
+                        f'{np.sum(stats.records("solve")["iterations"])} iterations in total, '
+                        f'median {summary["iterations_p50"]:.0f}, p99 {summary["iterations_p99"]:.0f}')
+
+logger.info('Explicit MPC:')
+for N in [5, 10]:
+    var = get_variables(2, N, True)
+    time_init = time.perf_counter()
+    explicit_mpc = ExplicitLinearMPC()
+    explicit_mpc.setup(var, n_samples=2000)
+    setup_time = time.perf_counter() - time_init
+    validation = explicit_mpc.validate(n_samples=500)
+
+    opti = LinearMPC()
+    opti.setup(var)
+    opti.solver.update_settings(verbose=False)
+    x_0 = var['x_0']
+    explicit_time = 0
+    osqp_time = 0
+    for i in range(n_sim):
+        time_init = time.perf_counter()
+        u = explicit_mpc.evaluate(x_0)
+        explicit_time += time.perf_counter() - time_init
+        time_init = time.perf_counter()
+        opti.update(x_0=x_0)
+        opti.solve()
+        osqp_time += time.perf_counter() - time_init
+        x_0 = var['A'].dot(x_0) + var['B'].dot(u)
+
+    logger.info(f'N = {N}: {len(explicit_mpc.regions["K"])} regions in {setup_time:.2f} s, coverage '
+                f'{validation["coverage"]:.2f}, max error {validation["max_error"]:.1e}; step '
+                f'{explicit_time/n_sim*1e6:.1f} us (explicit), {osqp_time/n_sim*1e6:.1f} us (OSQP), '
+                f'{explicit_mpc.n_fallbacks} fallbacks to OSQP')
+
+logger.info('Generated solver:')
+for N in [10, 50, 200]:
+    var = get_variables(2, N, True)
+    step_times = {}
+    with tempfile.TemporaryDirectory() as folder:
+        opti_codegen = CodegenLinearMPC()
+        try:
+            opti_codegen.setup(var, folder=folder, extension_name=f'emosqp_benchmark_{N}')
+        except ValueError as error:
+            logger.info(f'N = {N}: {error}')
+            break
+        for name, opti in [('codegen', opti_codegen), ('python', None)]:
+            if opti is None:
+                opti = LinearMPC()
+                opti.setup(var, warm_start='previous')
+                opti.solver.update_settings(verbose=False)
+            x_0 = var['x_0']
+            for i in range(n_sim):
+                u = opti.solve().u_0
+                x_0 = var['A'].dot(x_0) + var['B'].dot(u)
+                opti.update(x_0=x_0)
+            step_times.update({name: opti.stats.summary()['solve']})
+
+    logger.info(f'N = {N}: solve p50 {step_times["codegen"]["p50"]*1e6:.1f} us, p99 '
+                f'{step_times["codegen"]["p99"]*1e6:.1f} us (generated); p50 {step_times["python"]["p50"]*1e6:.1f} '
+                f'us, p99 {step_times["python"]["p99"]*1e6:.1f} us (Python)')
+
+logger.info('Done!')
@@ -1,5 +1,6 @@
 import numpy as np
 from atoms.linearMPC import LinearMPC
+from atoms.mpc_simulator import ClosedLoopSimulator
 from atoms.atoms_helpers import Helpers
 from matplotlib import pyplot as plt
 
@@ -50,28 +51,10 @@ opti = LinearMPC(debug=True)
 opti.setup(var)
 
 # Simulate the problem in closed loop
-time = 0
 n_sim = 250
-y = np.zeros((n_sim, n_x))
-y_r = np.zeros((n_sim, n_x))
 logger.info('Running simulation ...')
-
-for i in range(n_sim):
-    # Solve the problem
-    u_star = opti.solve()
-
-    # Apply first control input and update initial conditions
-    y[i, :] = var['x_0']
-    u = u_star[n_x * (var['N']+1):n_x * (var['N']+1) + n_u]
-    x_0 = A.dot(var['x_0']) + B.dot(u)
-    var.update({'x_0': x_0})
-
-    # Update the reference trajectory
-    time = time + dt
-    x_r = np.array([1.0, 0.0])
-    y_r[i, :] = x_r
-    var.update({'x_r': x_r})
-    opti.update(x_r=x_r, x_0=x_0)
+sim = ClosedLoopSimulator(opti)
+y, u, y_r = sim.simulate(var['x_0'], n_sim, x_r=var['x_r'])
 
 # Plot the results
 logger.info('Plotting results ...')
@@ -79,7 +62,7 @@ fig, axs = plt.subplots(2, 1)
 cont = 0
 
 for i in range(n_x):
-    axs[i].plot(range(n_sim), y[:, i], range(n_sim), y_r[:, i])
+    axs[i].plot(range(n_sim), y[:n_sim, i], range(n_sim), y_r[:, i])
     axs[i].set_xlabel('Iterations')
     axs[i].set_ylabel(f'x_{i+1}')
     axs[i].legend(['Measured', 'Reference'], loc='upper left')
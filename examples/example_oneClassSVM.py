@@ -11,7 +11,7 @@ logger = atoms_helpers.Helpers.init_logger()
 
 def load_data(data_file_name, debug=False):
     """
-    Load data from .mat file and return the rpm vectors.
+    Load data from .mat file and return the dataset with the rpm vectors.
     """
     if debug:
         logger.info(f'Loading data from {data_file_name}')
@@ -27,16 +27,14 @@ def load_data(data_file_name, debug=False):
     data_obj.load(data_path_and_name, variables_list)
     data_obj.split(['rpm_measured', 'rpm_simulated'], 95, 'time')
     split_data = data_obj.datasets['dataset_1']
-    measured_rpm = split_data['rpm_measured']
-    simulated_rpm = split_data['rpm_simulated']
 
     if debug:
         logger.info(f'Data loaded from {data_file_name}')
 
-    return measured_rpm, simulated_rpm
+    return split_data
 
 
-def run_svm_algorithm(measured_rpm, simulated_rpm, debug=False):
+def run_svm_algorithm(split_data, debug=False):
     """
     Implement one-class SVM to detect anomalies in the measured RPM.
     """
@@ -53,23 +51,23 @@ def run_svm_algorithm(measured_rpm, simulated_rpm, debug=False):
     svm = one_class_svm.OneClassSupportVectorMachine()
     svm.init(nu, kernel, gamma)
 
-    # combine the data into a single feature matrix and train the algorithm
-    x_train = np.column_stack((measured_rpm, simulated_rpm))
+    # the dataset is already a feature matrix with columns [rpm_measured, rpm_simulated]. Train the algorithm
+    x_train = split_data.values
     svm.train(x_train)
 
     # add artificial anomalies to the measured RPM data, and define the corresponding labels
-    measured_rpm[10000:15000] = measured_rpm[10000:15000] * 0.7
-    y_true = np.ones(len(measured_rpm))
+    x_test = x_train.copy()
+    x_test[10000:15000, 0] = x_test[10000:15000, 0] * 0.7
+    y_true = np.ones(len(x_test))
     y_true[10000:15000] = y_true[10000:15000] - 2
 
     # predict the anomalies in the measured RPM data
-    x_test = np.column_stack((measured_rpm, simulated_rpm))
     y_predicted = svm.predict(x_test)
 
     # evaluate the results according to the user-specified metrics
     score_metric = svm.evaluate(y_true, y_predicted, evaluation_metric)
 
-    return y_true, y_predicted, score_metric
+    return x_test, y_true, y_predicted, score_metric
 
 
 def run_anomaly_detection(debug=False):
@@ -79,8 +77,10 @@ def run_anomaly_detection(debug=False):
     if debug:
         logger.info('Anomaly detection for jet engines with ATOMS library.')
 
-    measured_rpm, simulated_rpm, = load_data('dataset_test_bench_P220-688_exp_18-58.mat', debug)
-    y_true, y_predicted, score_metric = run_svm_algorithm(measured_rpm, simulated_rpm, debug)
+    split_data = load_data('dataset_test_bench_P220-688_exp_18-58.mat', debug)
+    x_test, y_true, y_predicted, score_metric = run_svm_algorithm(split_data, debug)
+    measured_rpm = x_test[:, 0]
+    simulated_rpm = x_test[:, 1]
 
     # Plot the results
     plt.figure()
@@ -10,5 +10,6 @@ setup(
         'matplotlib',
         'scipy',
         'scikit-learn',
+        'h5py',
     ],
 )
@@ -0,0 +1,24 @@
+# Shared variables of the MPC tests of the ATOMS package
+import numpy as np
+
+# sampling time of the discrete-time double integrator
+dt = 0.025
+
+
+def double_integrator(N=20):
+
+    # MPC variables of a discrete-time double integrator, which tracks a position reference
+    var = {}
+    var.update({'N': N})
+    var.update({'A': np.array([[1, dt], [0, 1]])})
+    var.update({'B': np.array([[0], [dt]])})
+    var.update({'Q_N': np.diag([200, 200])})
+    var.update({'Q': np.diag([2, 2])})
+    var.update({'R': 0.1 * np.eye(1)})
+    var.update({'x_r': np.array([1.0, 0.0])})
+    var.update({'x_0': np.array([0.0, 0.5])})
+    var.update({'x_min': np.array([-2, -10])})
+    var.update({'x_max': np.array([2, 10])})
+    var.update({'u_min': np.array([-5])})
+    var.update({'u_max': np.array([5])})
+    return var
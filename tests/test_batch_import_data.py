@@ -0,0 +1,57 @@
+# Testing of the BatchImportData class from the ATOMS package
+import numpy
+import shutil
+import tempfile
+import unittest
+from atoms.import_data import ImportData
+from atoms.batch_import_data import BatchImportData
+from os.path import join, dirname, abspath
+
+
+class TestBatchImportData(unittest.TestCase):
+
+    def test_batch_import_data(self):
+
+        current_folder_path = dirname(abspath(__file__))
+        data_path_and_name = join(current_folder_path, 'test_data/dataset_test_bench_P100-4102.mat')
+        variables_list = ['time', 'rpm_measured', 'thrust']
+
+        with tempfile.TemporaryDirectory() as tmp_folder:
+
+            # a campaign of three copies of the same test
+            files = [join(tmp_folder, f'dataset_test_bench_{k}.mat') for k in range(3)]
+            for file_name in files:
+                shutil.copy(data_path_and_name, file_name)
+
+            b = BatchImportData(n_workers=2, debug=True)
+            datasets = b.ingest(join(tmp_folder, 'dataset_test_bench_*.mat'), variables_list,
+                                data_list=['rpm_measured', 'thrust'], splitting_values=[10, 34],
+                                normalize_list=['thrust'])
+
+            # compare with a single ImportData object
+            i = ImportData()
+            i.load(data_path_and_name, variables_list)
+            i.normalize('thrust')
+            i.split(['rpm_measured', 'thrust'], [10, 34], 'time')
+
+            self.assertEqual(list(datasets.keys()), files)
+            for file_name in files:
+                self.assertEqual(list(datasets[file_name].keys()), ['dataset_0', 'dataset_1', 'dataset_2'])
+                self.assertEqual(b.scale_factors[file_name], i.scale_factors)
+                numpy.testing.assert_array_equal(datasets[file_name]['dataset_1'].values,
+                                                 i.datasets['dataset_1'].values)
+
+            # concatenated datasets, without splitting, processed in the main process
+            b_serial = BatchImportData(n_workers=1)
+            dataset = b_serial.ingest(files[:2], variables_list, concatenate=True)
+            self.assertEqual(dataset.names, variables_list)
+            self.assertEqual(dataset.shape, (2 * i.data['time'].size, 3))
+            numpy.testing.assert_array_equal(dataset['time'][i.data['time'].size:], i.data['time'])
+
+            with self.assertRaises(ValueError):
+                b.ingest(join(tmp_folder, '*.npy'), variables_list)
+
+
+if __name__ == '__main__':
+    suite = unittest.TestSuite()
+    suite.addTest(TestBatchImportData('test_batch_import_data'))
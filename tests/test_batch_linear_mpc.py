@@ -0,0 +1,57 @@
+# Testing of the BatchLinearMPC class from the ATOMS package
+import unittest
+import numpy as np
+from atoms.linearMPC import LinearMPC
+from atoms.batch_linear_mpc import BatchLinearMPC
+from mpc_fixtures import double_integrator
+
+
+class TestBatchLinearMPC(unittest.TestCase):
+
+    def test_batch_linear_mpc(self):
+
+        # discrete-time double integrator
+        var = double_integrator()
+        A = var['A']
+        B = var['B']
+
+        rng = np.random.default_rng(0)
+        x_0 = rng.uniform(-1, 1, size=(12, 2))
+        x_r = np.column_stack([rng.uniform(-1, 1, size=12), np.zeros(12)])
+        x_0[5] = [3, 0]
+
+        # solve all scenarios in parallel, and compare with a single LinearMPC object
+        b = BatchLinearMPC(var, n_workers=2, debug=True)
+        solutions = b.solve(x_0, x_r)
+        self.assertEqual(solutions.shape, (12, 21 * 2 + 20))
+        self.assertEqual(b.failed, [5])
+        self.assertTrue(np.all(np.isnan(solutions[5])))
+
+        opti = LinearMPC()
+        opti.setup(var)
+        opti.update(x_0=x_0[3], x_r=x_r[3])
+        opti.reset_warm_start()
+        self.assertTrue(np.allclose(solutions[3], opti.solve()))
+
+        # closed loop simulation, in the calling process
+        b_serial = BatchLinearMPC(var, n_workers=1)
+        states, inputs = b_serial.simulate(x_0[:3], n_steps=200)
+        self.assertEqual(states.shape, (3, 201, 2))
+        self.assertEqual(inputs.shape, (3, 200, 1))
+        self.assertTrue(np.allclose(states[:, 1:], states[:, :-1].dot(A.T) + inputs.dot(B.T)))
+        self.assertTrue(np.all(np.abs(states[:, -1, 0] - 1) < 0.2))
+
+        # with limits on the rate of change, the results do not depend on the order of the scenarios
+        var_rate = dict(var, R_du=np.eye(1), du_min=np.array([-0.5]), du_max=np.array([0.5]), u_prev=np.array([1.0]))
+        b_rate = BatchLinearMPC(var_rate, n_workers=1)
+        inputs = b_rate.simulate(x_0[:3], n_steps=50)[1]
+        self.assertTrue(np.allclose(b_rate.simulate(x_0[2::-1], n_steps=50)[1], inputs[::-1]))
+        self.assertTrue(np.all(np.abs(inputs[:, 0, 0] - 1) <= 0.5 + 1e-3))
+
+        with self.assertRaises(ValueError):
+            b.solve(x_0, x_r[:3])
+
+
+if __name__ == '__main__':
+    suite = unittest.TestSuite()
+    suite.addTest(TestBatchLinearMPC('test_batch_linear_mpc'))
@@ -0,0 +1,40 @@
+# Testing of the Dataset class from the ATOMS package
+import numpy
+import unittest
+from atoms.dataset import Dataset
+
+
+class TestDataset(unittest.TestCase):
+
+    def test_dataset(self):
+
+        time = numpy.arange(10, dtype=float).reshape(-1, 1)
+        status = numpy.ones(10, dtype=numpy.uint8)
+        thrust = numpy.linspace(0, 1, 10).reshape(-1, 1)
+
+        d = Dataset(['time', 'status', 'thrust'], [time, status, thrust])
+
+        # columns are stacked in a single 2-D array, and accessed by name as (n_rows, 1) views
+        self.assertEqual(d.shape, (10, 3))
+        self.assertEqual(d.values.dtype, numpy.float64)
+        self.assertEqual(d['thrust'].shape, (10, 1))
+        self.assertTrue(numpy.shares_memory(d['thrust'], d.values))
+        self.assertIs(numpy.asarray(d), d.values)
+        self.assertTrue('time' in d)
+        numpy.testing.assert_array_equal(d['time'], time)
+
+        # adjacent columns are selected without copies
+        self.assertTrue(numpy.shares_memory(d.select(['status', 'thrust']), d.values))
+        numpy.testing.assert_array_equal(d.select(['thrust', 'time']), numpy.hstack([thrust, time]))
+
+        with self.assertRaises(KeyError):
+            d.select(['rpm'])
+        with self.assertRaises(ValueError):
+            Dataset(['time'], d.values)
+        with self.assertRaises(ValueError):
+            Dataset(['time', 'thrust'], [time, thrust[:5]])
+
+
+if __name__ == '__main__':
+    suite = unittest.TestSuite()
+    suite.addTest(TestDataset('test_dataset'))
@@ -0,0 +1,55 @@
+# Testing of the ExplicitLinearMPC class from the ATOMS package
+import unittest
+import numpy as np
+from atoms.linearMPC import LinearMPC
+from atoms.explicit_mpc import ExplicitLinearMPC
+from mpc_fixtures import double_integrator
+
+
+class TestExplicitLinearMPC(unittest.TestCase):
+
+    def test_explicit_mpc(self):
+
+        # discrete-time double integrator
+        var = double_integrator(N=10)
+
+        explicit_mpc = ExplicitLinearMPC(debug=True)
+        explicit_mpc.setup(var, n_samples=2000)
+        self.assertGreater(len(explicit_mpc.regions['K']), 1)
+        self.assertIn(f"Number of regions: {len(explicit_mpc.regions['K'])}", str(explicit_mpc))
+
+        # the explicit law matches the OSQP solution inside the regions
+        validation = explicit_mpc.validate(n_samples=100)
+        self.assertLess(validation['max_error'], 1e-5)
+        self.assertGreater(validation['coverage'], 0.5)
+
+        opti = LinearMPC()
+        opti.setup(var)
+        u_0 = explicit_mpc.evaluate(var['x_0'])
+        self.assertEqual(explicit_mpc.n_fallbacks, 0)
+        self.assertTrue(np.allclose(u_0, opti.solve().u_0, atol=1e-3))
+
+        # states outside the regions are solved with OSQP
+        explicit_mpc_box = ExplicitLinearMPC()
+        explicit_mpc_box.setup(var, x_box=([-0.1, -0.1], [0.1, 0.1]), n_samples=100)
+        u_0 = explicit_mpc_box.evaluate(var['x_0'])
+        self.assertEqual(explicit_mpc_box.n_fallbacks, 1)
+        self.assertTrue(np.allclose(u_0, opti.solve().u_0, atol=1e-3))
+
+        # a new setup discards the regions of the previous problem
+        var_gain = dict(var, B=2 * var['B'])
+        explicit_mpc.setup(var_gain, n_samples=0)
+        self.assertEqual(explicit_mpc.regions, {})
+        opti.setup(var_gain)
+        self.assertTrue(np.allclose(explicit_mpc.evaluate(var['x_0']), opti.solve().u_0, atol=1e-3))
+        self.assertEqual(explicit_mpc.n_fallbacks, 1)
+
+        # the box of initial states must be finite
+        var.update({'x_min': -np.inf * np.ones(2)})
+        with self.assertRaises(ValueError):
+            ExplicitLinearMPC().setup(var)
+
+
+if __name__ == '__main__':
+    suite = unittest.TestSuite()
+    suite.addTest(TestExplicitLinearMPC('test_explicit_mpc'))
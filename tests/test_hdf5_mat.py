@@ -0,0 +1,129 @@
+# Testing of the Hdf5MatFile and Hdf5MatArray classes from the ATOMS package
+import gc
+import h5py
+import numpy
+import tempfile
+import unittest
+from scipy import io
+from atoms.import_data import ImportData
+from atoms.mat_cache import MatCache
+from atoms.hdf5_mat import Hdf5MatFile, Hdf5MatArray
+from os.path import join, dirname, abspath
+
+
+def write_mat_v73(data_path_and_name, mat_data, compressed_variables):
+
+    # MATLAB v7.3 files are HDF5 files with a 512 bytes header, and arrays stored in column-major order
+    with h5py.File(data_path_and_name, 'w', userblock_size=512) as h5_file:
+        for var_name, value in mat_data.items():
+            if var_name in compressed_variables:
+                h5_data = h5_file.create_dataset(var_name, data=value.T, chunks=(1, 1000), compression='gzip')
+            else:
+                h5_data = h5_file.create_dataset(var_name, data=value.T)
+            h5_data.attrs['MATLAB_class'] = numpy.bytes_('double' if value.dtype == numpy.float64 else 'char')
+
+    with open(data_path_and_name, 'r+b') as mat_file:
+        mat_file.write(b'MATLAB 7.3 MAT-file, HDF5 schema 1.00 .'.ljust(116) + bytes(8) + b'\x00\x02IM')
+
+
+class TestHdf5Mat(unittest.TestCase):
+
+    def test_hdf5_mat(self):
+
+        current_folder_path = dirname(abspath(__file__))
+        data_path_and_name = join(current_folder_path, 'test_data/dataset_test_bench_P100-4102.mat')
+        mat_data = io.loadmat(data_path_and_name, variable_names=['time', 'thrust', 'rpm_measured'])
+        mat_data = {var_name: mat_data[var_name] for var_name in ['time', 'thrust', 'rpm_measured']}
+        mat_data.update({'name': numpy.array([[ord('a'), ord('b')]], dtype=numpy.uint16)})
+
+        with tempfile.TemporaryDirectory() as tmp_folder:
+
+            v73_path_and_name = join(tmp_folder, 'dataset_v73.mat')
+            write_mat_v73(v73_path_and_name, mat_data, ['thrust'])
+
+            # variables are mapped (contiguous data) or read by chunks (compressed data)
+            h5_mat = Hdf5MatFile(v73_path_and_name, debug=True)
+            self.assertTrue(Hdf5MatFile.is_hdf5(v73_path_and_name))
+            self.assertFalse(Hdf5MatFile.is_hdf5(data_path_and_name))
+            self.assertEqual(h5_mat.variables(), ['name', 'rpm_measured', 'thrust', 'time'])
+
+            h5_data = h5_mat.read(['time', 'thrust'])
+            self.assertIsNotNone(h5_data['time'].memmap)
+            self.assertIsNone(h5_data['thrust'].memmap)
+            for var_name in ['time', 'thrust']:
+                self.assertEqual(h5_data[var_name].shape, mat_data[var_name].shape)
+                numpy.testing.assert_array_equal(numpy.asarray(h5_data[var_name]), mat_data[var_name])
+                numpy.testing.assert_array_equal(h5_data[var_name][100:2000:7], mat_data[var_name][100:2000:7])
+                numpy.testing.assert_array_equal(h5_data[var_name][-1], mat_data[var_name][-1])
+
+            # row slices are lazy views
+            h5_view = h5_data['thrust'][10:5000][20:30]
+            self.assertIsInstance(h5_view, Hdf5MatArray)
+            numpy.testing.assert_array_equal(numpy.asarray(h5_view), mat_data['thrust'][30:40])
+            numpy.testing.assert_allclose(numpy.asarray((h5_view - 1) / 2), (mat_data['thrust'][30:40] - 1) / 2)
+
+            with self.assertRaises(ValueError):
+                h5_mat.read(['name'])
+            with self.assertRaises(ValueError):
+                h5_mat.read(['not_a_variable'])
+
+            # load, split, normalize and plot a v7.3 file with ImportData
+            i = ImportData(debug=True, mat_cache=MatCache())
+            i.load(v73_path_and_name, ['time', 'thrust', 'rpm_measured'])
+            i.normalize(['thrust', 'rpm_measured'])
+            i.split(['time', 'thrust'], 10, 'time')
+
+            self.assertIsInstance(i.data['thrust'], Hdf5MatArray)
+            self.assertIsInstance(i.datasets['dataset_0']['thrust'], Hdf5MatArray)
+            numpy.testing.assert_allclose(numpy.asarray(i.data['thrust']),
+                                          mat_data['thrust'] / numpy.max(numpy.abs(mat_data['thrust'])))
+            self.assertEqual(len(i.datasets['dataset_0']['time']), numpy.argmin(numpy.abs(mat_data['time'] - 10)))
+
+            # lazily loaded data and datasets are exported block by block
+            i.save_bulk(join(tmp_folder, 'data'))
+            i.save_bulk(join(tmp_folder, 'dataset_0'), 'dataset_0')
+            i_bulk = ImportData()
+            i_bulk.load_bulk(join(tmp_folder, 'data'))
+            i_bulk.load_bulk(join(tmp_folder, 'dataset_0'))
+            numpy.testing.assert_allclose(i_bulk.data['thrust'], numpy.asarray(i.data['thrust']))
+            numpy.testing.assert_allclose(i_bulk.datasets['dataset_0'].values, i.datasets['dataset_0'].values)
+            del i_bulk
+
+            # lazily loaded data are always decimated, also when zooming
+            plt = i.plot([['time', 'thrust'], ['time', 'rpm_measured']])
+            axes = plt.gcf().axes[0]
+            self.assertLessEqual(len(axes.lines[0].get_xdata()), 2 * axes.get_window_extent().width + 2)
+            axes.set_xlim(100, 110)
+            self.assertTrue(numpy.all(axes.lines[0].get_xdata() >= 99.99))
+            plt.close('all')
+
+            # files are closed at the end of a with block. Files read through MatCache are closed when all their
+            # variables are memory-mapped, and otherwise when the variables read through h5py are deleted
+            with Hdf5MatFile(v73_path_and_name) as h5_closed:
+                h5_closed.read(['time'])
+            self.assertFalse(h5_closed.file)
+            h5_mat.close()
+            del h5_data, h5_view, i
+            gc.collect()
+            n_objects = h5py.h5f.get_obj_count()
+            MatCache.read(v73_path_and_name, ['time', 'rpm_measured'])
+            self.assertEqual(h5py.h5f.get_obj_count(), n_objects)
+            h5_thrust = MatCache.read(v73_path_and_name, ['thrust'])
+            self.assertGreater(h5py.h5f.get_obj_count(), n_objects)
+            del h5_thrust
+            gc.collect()
+            self.assertEqual(h5py.h5f.get_obj_count(), n_objects)
+
+            # the memory cap does not evict v7.3 files, whose variables are still readable
+            c = MatCache(max_bytes=1)
+            i_cached = ImportData(mat_cache=c)
+            i_cached.load(v73_path_and_name, ['time', 'thrust'], use_cache=True)
+            i_cached.load(data_path_and_name, 'rpm_measured', use_cache=True)
+            self.assertEqual(len(c.entries), 1)
+            numpy.testing.assert_array_equal(numpy.asarray(i_cached.data['thrust']), mat_data['thrust'])
+            del i_cached, c
+            gc.collect()
+
+if __name__ == '__main__':
+    suite = unittest.TestSuite()
+    suite.addTest(TestHdf5Mat('test_hdf5_mat'))
@@ -1,6 +1,9 @@
 # Testing of the ImportData class from the ATOMS package
 import os
+import numpy
+import tempfile
 import unittest
+from atoms.dataset import Dataset
 from atoms.import_data import ImportData
 from os.path import join, dirname, abspath
 
@@ -25,6 +28,12 @@ class TestImportData(unittest.TestCase):
         i.load(data_path_and_name, 't_step')
         i.load(data_path_and_name, variables_list)
 
+        # loaded data can be modified, unless they are shared with the cache
+        self.assertTrue(i.data['rpm_measured'].flags.writeable)
+        i_cached = ImportData()
+        i_cached.load(data_path_and_name, 'rpm_measured', use_cache=True)
+        self.assertFalse(i_cached.data['rpm_measured'].flags.writeable)
+
         # plot the loaded data. Single and multiple plot
         plt = i.plot(['time', 'fuel_consumed'])
         plt.show(block=False)
@@ -37,6 +46,15 @@ class TestImportData(unittest.TestCase):
         plt.pause(1)
         plt.close('all')
 
+        # test decimated plot: the min/max envelope keeps the extreme values of the data
+        plt = i.plot([['time', 'egt_temperature'], ['time', 'rpm_measured']], decimate=True)
+        axes = plt.gcf().axes[1]
+        self.assertLess(len(axes.lines[0].get_ydata()), i.data['rpm_measured'].size / 10)
+        self.assertEqual(numpy.max(axes.lines[0].get_ydata()), numpy.max(i.data['rpm_measured']))
+        axes.set_xlim(100, 200)
+        self.assertTrue(numpy.all(axes.lines[0].get_xdata() >= 99.99))
+        plt.close('all')
+
         # test subtract initial value and normalize
         i.normalize(['egt_temperature', 'fuel_consumed'])
         i.normalize('rpm_measured')
@@ -45,12 +63,40 @@ class TestImportData(unittest.TestCase):
         plt.pause(1)
         plt.close('all')
 
+        # test normalization modes, in-place normalization and denormalization
+        thrust = numpy.array(i.data['thrust'])
+        i.normalize('thrust', mode='z_score')
+        thrust_normalized = i.data['thrust']
+        i.normalize(['thrust'], mode='min_max', in_place=True)
+        self.assertIs(i.data['thrust'], thrust_normalized)
+        self.assertEqual(list(i.scale_factors.keys()), ['egt_temperature', 'fuel_consumed', 'rpm_measured', 'thrust'])
+        numpy.testing.assert_allclose(i.denormalize('thrust', i.data['thrust']), thrust)
+        numpy.testing.assert_allclose([numpy.min(i.data['thrust']), numpy.max(i.data['thrust'])], [0, 1])
+
         # test split dataset
         i.split(['time', 'egt_temperature', 'fuel_consumed'], [0.5, 0.5, 0.33], 'rpm_measured')
         i.split(['time', 'rpm_desired', 'rpm_measured'], 10, 'time')
         i.split('thrust', 10.33, 'time')
         i.split('thrust', [10.01, 34], 'time')
 
+        # test iteration over chunks and windows. Windows without overlap are the same datasets generated by split
+        chunks = list(i.iter_chunks(['time', 'thrust'], chunk_size=30000, overlap=1000))
+        self.assertEqual([len(chunk) for chunk in chunks], [30000, 30000, 25868])
+        numpy.testing.assert_array_equal(chunks[1]['thrust'][:1000], chunks[0]['thrust'][-1000:])
+
+        windows = list(i.iter_chunks('time', window=10))
+        numpy.testing.assert_array_equal(windows[0].values, i.datasets['dataset_4']['time'])
+        numpy.testing.assert_array_equal(windows[1]['time'][:5], i.datasets['dataset_5']['time'][:5])
+
+        windows = list(i.iter_chunks(['time', 'rpm_desired'], window=300, overlap=100, dataset_name='dataset_5'))
+        self.assertEqual(len(windows), 4)
+        numpy.testing.assert_allclose([windows[1]['time'][0, 0], windows[1]['time'][-1, 0]], [210.02, 510.0])
+
+        i.datasets['dataset_empty'] = Dataset(['time', 'thrust'], numpy.empty((0, 2)))
+        self.assertEqual(list(i.iter_chunks(['time', 'thrust'], chunk_size=100, dataset_name='dataset_empty')), [])
+        self.assertEqual(list(i.iter_chunks('thrust', window=10, dataset_name='dataset_empty')), [])
+        del i.datasets['dataset_empty']
+
         # test plot datasets
         plt = i.plot(['time', 'egt_temperature'], 'dataset_2')
         plt.show(block=False)
@@ -66,6 +112,28 @@ class TestImportData(unittest.TestCase):
         i.save(['rpm_desired', 'rpm_measured'])
         i.save('rpm_desired', 'dataset_4')
 
+        # test bulk export and import, with memory-mapped folders and compressed .npz files
+        with tempfile.TemporaryDirectory() as tmp_folder:
+            i.save_bulk(join(tmp_folder, 'data'))
+            i.save_bulk(join(tmp_folder, 'data.npz'), compress=True)
+            i.save_bulk(join(tmp_folder, 'dataset_4'), 'dataset_4')
+
+            i_bulk = ImportData(debug=True)
+            i_bulk.load_bulk(join(tmp_folder, 'data'))
+            i_bulk.load_bulk(join(tmp_folder, 'dataset_4'), 'dataset_bulk')
+            self.assertEqual(i_bulk.variables_list, variables_list)
+            self.assertEqual(i_bulk.scale_factors, i.scale_factors)
+            self.assertIsInstance(i_bulk.data['thrust'], numpy.memmap)
+            self.assertIsInstance(i_bulk.datasets['dataset_bulk'].values, numpy.memmap)
+            numpy.testing.assert_array_equal(i_bulk.data['thrust'], i.data['thrust'])
+            numpy.testing.assert_array_equal(i_bulk.datasets['dataset_bulk'].values, i.datasets['dataset_4'].values)
+            self.assertEqual(i_bulk.datasets['dataset_bulk'].names, i.datasets['dataset_4'].names)
+
+            i_npz = ImportData()
+            i_npz.load_bulk(join(tmp_folder, 'data.npz'))
+            numpy.testing.assert_array_equal(i_npz.data['egt_temperature'], i.data['egt_temperature'])
+            del i_bulk
+
         if os.path.exists('rpm_desired.npy'):
             os.remove('rpm_desired.npy')
         if os.path.exists('rpm_measured.npy'):
@@ -77,6 +145,33 @@ class TestImportData(unittest.TestCase):
         self.assertEqual(list(i.datasets.keys()), ['dataset_0', 'dataset_1', 'dataset_2', 'dataset_3', 'dataset_4',
                                                    'dataset_5', 'dataset_6', 'dataset_7', 'dataset_8', 'dataset_9',
                                                    'dataset_10'])
+        self.assertEqual([len(i.datasets[f'dataset_{k}']['time']) for k in range(4)], [11261, 1, 68895, 3707])
+        self.assertEqual([len(i.datasets[f'dataset_{k}']['thrust']) for k in range(6, 11)], [1033, 82833, 1001, 2398,
+                                                                                             80466])
+
+        # datasets are views on a single 2-D array, that can be used as a feature matrix
+        self.assertEqual(i.datasets['dataset_4'].keys(), ['time', 'rpm_desired', 'rpm_measured'])
+        self.assertEqual(i.datasets['dataset_4'].shape, (1000, 3))
+        self.assertTrue(i.datasets['dataset_4'].values.flags.c_contiguous)
+        self.assertIs(i.datasets['dataset_4'].values.base, i.datasets['dataset_5'].values.base)
+        self.assertTrue(numpy.shares_memory(i.datasets['dataset_4'].select(['rpm_desired', 'rpm_measured']),
+                                            i.datasets['dataset_4']['rpm_measured']))
+        numpy.testing.assert_array_equal(i.datasets['dataset_4']['time'], i.data['time'][:1000])
+
+        # test resampling on a common time base, with thrust logged at a lower rate
+        i_resample = ImportData()
+        i_resample.load(data_path_and_name, ['time', 'thrust', 'turbine_status', 'rpm_measured'])
+        thrust = numpy.array(i_resample.data['thrust'])
+        i_resample.data.update({'time_thrust': i_resample.data['time'][::5], 'thrust': thrust[::5]})
+        time = i_resample.resample(['thrust', 'turbine_status'], method='zoh', time_data_map={'thrust': 'time_thrust'})
+        numpy.testing.assert_allclose(time[:3], [0, 0.05, 0.1])
+        numpy.testing.assert_array_equal(i_resample.data['thrust'], thrust[::5])
+        self.assertEqual(i_resample.data['turbine_status'].dtype, numpy.uint8)
+
+        i_resample.load(data_path_and_name, ['time', 'rpm_measured'])
+        i_resample.resample('rpm_measured', time_step=0.2, method='decimate', time_data_name='time')
+        self.assertEqual(i_resample.data['rpm_measured'].shape, i_resample.data['time'].shape)
+        numpy.testing.assert_allclose(i_resample.data['time'][1], 0.2)
 
 
 if __name__ == '__main__':
@@ -65,6 +65,165 @@ class TestLinearMPC(unittest.TestCase):
             self.assertEqual(all(opti.variables['x_0'] == [0.8, -0.8, 0., 0.]), True)
             self.assertEqual(all(opti.variables['x_r'] == [1, -1, 0., 0.]), True)
 
+        # track a reference trajectory over the horizon, with input references
+        N = var['N']
+        time_horizon = time + 0.025 * np.arange(N + 2)
+        x_r_horizon = np.column_stack([np.cos(2 * np.pi * time_horizon), -np.cos(2 * np.pi * time_horizon),
+                                       np.zeros(N + 2), np.zeros(N + 2)])
+        u_r = np.array([0.1, -0.1])
+        opti.update(x_r=x_r_horizon[:N + 1], u_r=u_r)
+        q = opti.variables['q']
+        self.assertTrue(np.allclose(q[:n_x * 2], -var['Q'].dot(x_r_horizon[0])))
+        self.assertTrue(np.allclose(q[N * 2 * n_x:(N + 1) * 2 * n_x], -var['Q_N'].dot(x_r_horizon[N])))
+        self.assertTrue(np.allclose(q[(N + 1) * 2 * n_x:], np.tile(-var['R'].dot(u_r), N)))
+
+        # shifting the reference window is the same as updating with the next trajectory
+        opti.shift_reference(x_r=x_r_horizon[N + 1])
+        q_shifted = opti.variables['q'].copy()
+        opti.update(x_r=x_r_horizon[1:])
+        self.assertTrue(np.allclose(q_shifted, opti.variables['q']))
+        opti.update(x_r=var['x_r'], u_r=np.zeros(n_u))
+
+        # update the model, weights and bounds in place, and compare with a new setup of the same problem
+        A_new = A.copy()
+        A_new[0, 2] = 0.9
+        P_pattern = opti.variables['P'].indices.copy()
+        opti.update_model(A=A_new, Q=np.diag([3, 2, 1, 1]), u_max=np.array([4, 4]))
+        self.assertTrue(np.array_equal(opti.variables['P'].indices, P_pattern))
+
+        opti_new = LinearMPC()
+        opti_new.setup(dict(var, A=A_new, Q=np.diag([3, 2, 1, 1]), u_max=np.array([4, 4])))
+        self.assertEqual(abs(opti.variables['P'] - opti_new.variables['P']).max(), 0)
+        self.assertEqual(abs(opti.variables['A'] - opti_new.variables['A']).max(), 0)
+        self.assertTrue(np.allclose(opti.variables['q'], opti_new.variables['q']))
+        self.assertTrue(np.allclose(opti.variables['u'], opti_new.variables['u']))
+        u_star_model = opti.solve()
+        self.assertTrue(np.allclose(u_star_model, opti_new.solve(), atol=1e-2))
+
+        # the condensed formulation returns the same solution, with the same layout
+        opti_condensed = LinearMPC()
+        opti_condensed.setup(dict(var, A=A_new, Q=np.diag([3, 2, 1, 1]), u_max=np.array([4, 4])), 'condensed')
+        self.assertEqual(opti_condensed.variables['P'].shape, (N * n_u, N * n_u))
+        self.assertTrue(np.allclose(opti_condensed.solve(), opti_new.solve(), atol=1e-2))
+        opti_condensed.update_model(A=A)
+        opti_new.update_model(A=A)
+        self.assertTrue(np.allclose(opti_condensed.solve(), opti_new.solve(), atol=1e-2))
+
+        with self.assertRaises(ValueError):
+            opti_condensed.setup(var, 'dense')
+        with self.assertRaises(ValueError):
+            opti_condensed.setup(var, warm_start='zero')
+
+        # the shifted warm start does not change the solution in closed loop
+        opti_cold = LinearMPC()
+        opti_cold.setup(var, warm_start='none')
+        opti_new.setup(var, warm_start='shift')
+        x_0 = var['x_0']
+        for i in range(10):
+            u_star_cold = opti_cold.solve()
+            self.assertTrue(np.allclose(opti_new.solve(), u_star_cold, atol=1e-2))
+            x_0 = A.dot(x_0) + B.dot(u_star_cold[(N + 1) * 2 * n_x:(N + 1) * 2 * n_x + n_u])
+            opti_cold.update(x_0=x_0)
+            opti_new.update(x_0=x_0)
+
+        # when the problem is not solved within the budget, the previous solution is shifted by one step
+        opti.set_budget(max_iter=1, fallback='shift')
+        opti.update(x_0=-var['x_0'])
+        u_fallback = opti.solve()
+        self.assertTrue(np.array_equal(u_fallback[:(N - 1) * 2 * n_x], u_star_model[2 * n_x:N * 2 * n_x]))
+        self.assertTrue(np.array_equal(u_fallback[-n_u:], u_star_model[-n_u:]))
+        self.assertEqual(opti.stats.summary()['solve']['fallbacks'], 1)
+        self.assertEqual(opti.stats.records('setup').size, 1)
+
+        opti.set_budget(fallback='raise')
+        with self.assertRaises(ValueError):
+            opti.solve()
+        with self.assertRaises(ValueError):
+            opti.set_budget(fallback='ignore')
+        opti.set_budget(max_iter=4000)
+
+        # the sparsity pattern cannot change
+        with self.assertRaises(ValueError):
+            opti.update_model(A=np.ones((2 * n_x, 2 * n_x)))
+        with self.assertRaises(ValueError):
+            opti.update_model(C=A)
+
+        # the vectors updated in place match a new setup, with a constant reference or a reference trajectory
+        for formulation in ['sparse', 'condensed']:
+            opti_update = LinearMPC()
+            opti_update.setup(var, formulation)
+            x_r = np.array([0.5, -0.5, 0, 0])
+            for new_values in [{'x_0': var['x_0']}, {'x_0': x_0}, {'x_r': x_r}, {'x_r': np.tile(-x_r, (N + 1, 1))}]:
+                opti_update.update(**new_values)
+                var_update = dict(var, x_0=opti_update.parameters['x_0'], x_r=opti_update.parameters['x_r'])
+                opti_new.setup(var_update, formulation)
+                for name in ['q', 'l', 'u']:
+                    self.assertTrue(np.allclose(opti_update.variables[name], opti_new.variables[name]))
+
+        # variables without limits have no constraint rows, and the solution does not change
+        var_unbounded = dict(var, x_min=np.array([-2 * np.pi, -2 * np.pi, -np.inf, -np.inf]),
+                             x_max=np.array([2 * np.pi, 2 * np.pi, np.inf, np.inf]))
+        opti_unbounded = LinearMPC()
+        opti_unbounded.setup(var_unbounded, warm_start='none')
+        opti_unbounded.update(x_0=x_0)
+        opti_new.setup(dict(var_unbounded, x_min=np.array([-2 * np.pi, -2 * np.pi, -1e3, -1e3]),
+                            x_max=np.array([2 * np.pi, 2 * np.pi, 1e3, 1e3])), warm_start='none')
+        opti_new.update(x_0=x_0)
+        self.assertEqual(opti_unbounded.variables['A'].shape[0], opti_new.variables['A'].shape[0] - (N + 1) * n_x)
+        self.assertTrue(np.allclose(opti_unbounded.solve(), opti_new.solve(), atol=1e-2))
+        with self.assertRaises(ValueError):
+            opti_unbounded.update_model(x_max=var['x_max'])
+
+        # soft limits on the velocities: same solution when the limits can be satisfied, and a solution with
+        # positive slacks when they cannot
+        x_soft = np.array([0, 0, 1e3, 1e3])
+        opti_soft = LinearMPC()
+        opti_soft.setup(dict(var, x_soft=x_soft))
+        self.assertEqual(opti_soft.solve().slacks.shape, (N + 1, 2))
+        opti_soft.update(x_0=x_0)
+        self.assertTrue(np.allclose(opti_soft.solve()[:len(u_star_cold)], opti_cold.solve(), atol=1e-2))
+        x_0 = np.array([0.8, -0.8, 2, 0])
+        opti_cold.update(x_0=x_0)
+        with self.assertRaises(ValueError):
+            opti_cold.solve()
+        opti_soft.update(x_0=x_0)
+        u_star_soft = opti_soft.solve()
+        self.assertGreater(u_star_soft.slacks[0, 0], 0.2)
+        self.assertTrue(np.all(u_star_soft.slacks > -1e-3))
+        opti_soft.update_model(x_soft=2 * x_soft)
+        with self.assertRaises(ValueError):
+            opti_soft.update_model(x_soft=np.ones(2 * n_x))
+        with self.assertRaises(ValueError):
+            opti_soft.setup(dict(var, x_soft=x_soft), 'condensed')
+
+        # penalties on states without limits are ignored, also when they are updated
+        opti_soft.setup(dict(var_unbounded, x_soft=np.ones(2 * n_x)))
+        self.assertEqual(opti_soft.parameters['n_s'], 2)
+        opti_soft.update_model(x_soft=2 * np.ones(2 * n_x))
+
+        # rate of change of the inputs: the limits hold from the previous input, and updating u_prev in place matches
+        # a new setup
+        var_rate = dict(var, R_du=np.array([[3, 1], [1, 2]]), du_min=np.array([-0.3, -np.inf]),
+                        du_max=np.array([0.3, np.inf]), u_prev=np.array([0.5, 0]))
+        opti_rate = LinearMPC()
+        opti_rate.setup(var_rate)
+        opti_rate.solver.update_settings(verbose=False, eps_abs=1e-6, eps_rel=1e-6)
+        self.assertEqual(opti_rate.variables['A'].shape[0], opti_cold.variables['A'].shape[0] + N)
+        u_rate = opti_rate.solve().inputs
+        du = np.diff(np.vstack([var_rate['u_prev'], u_rate]), axis=0)
+        self.assertTrue(np.all(np.abs(du[:, 0]) <= 0.3 + 1e-4))
+        opti_rate.update(x_0=x_0, u_prev=u_rate[0])
+        opti_rate.update_model(R_du=2 * var_rate['R_du'], du_max=np.array([0.4, np.inf]))
+        opti_new.setup(dict(var_rate, x_0=x_0, u_prev=u_rate[0], R_du=2 * var_rate['R_du'],
+                            du_max=np.array([0.4, np.inf])))
+        self.assertEqual(abs(opti_rate.variables['P'] - opti_new.variables['P']).max(), 0)
+        for name in ['q', 'l', 'u']:
+            self.assertTrue(np.allclose(opti_rate.variables[name], opti_new.variables[name]))
+        with self.assertRaises(ValueError):
+            opti_rate.update_model(du_min=np.array([-0.3, -1]))
+        with self.assertRaises(ValueError):
+            opti_rate.setup(var_rate, 'condensed')
+
 
 if __name__ == '__main__':
     suite = unittest.TestSuite()
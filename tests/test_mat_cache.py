@@ -0,0 +1,56 @@
+# Testing of the MatCache class from the ATOMS package
+import os
+import shutil
+import tempfile
+import unittest
+from atoms.mat_cache import MatCache
+from os.path import join, dirname, abspath
+
+
+class TestMatCache(unittest.TestCase):
+
+    def test_mat_cache(self):
+
+        c = MatCache(debug=True)
+
+        current_folder_path = dirname(abspath(__file__))
+        data_path_and_name = join(current_folder_path, 'test_data/dataset_test_bench_P100-4102.mat')
+
+        # only the selected variables are read, and repeated requests are served from the cache
+        data = c.get(data_path_and_name, ['time', 'thrust'])
+        data_cached = c.get(data_path_and_name, 'time')
+        self.assertEqual(list(data.keys()), ['time', 'thrust'])
+        self.assertIs(data_cached['time'], data['time'])
+        self.assertEqual(c.n_bytes, data['time'].nbytes + data['thrust'].nbytes)
+        self.assertFalse(data['time'].flags.writeable)
+
+        # missing variables are added to the file entry
+        data_rpm = c.get(data_path_and_name, ['time', 'rpm_measured'])
+        self.assertIs(data_rpm['time'], data['time'])
+        self.assertEqual(len(c.entries), 1)
+        self.assertEqual(c.n_bytes, data['time'].nbytes + data['thrust'].nbytes + data_rpm['rpm_measured'].nbytes)
+
+        with self.assertRaises(ValueError):
+            c.get(data_path_and_name, 'not_a_variable')
+
+        # a modified file is read again
+        with tempfile.TemporaryDirectory() as tmp_folder:
+            tmp_path_and_name = join(tmp_folder, 'dataset.mat')
+            shutil.copy(data_path_and_name, tmp_path_and_name)
+            data_tmp = c.get(tmp_path_and_name, 'time')
+            os.utime(tmp_path_and_name, ns=(0, 0))
+            data_tmp_modified = c.get(tmp_path_and_name, 'time')
+            self.assertIsNot(data_tmp['time'], data_tmp_modified['time'])
+            self.assertEqual(len(c.entries), 2)
+
+        # least recently used files are evicted when the memory cap is exceeded
+        c.max_bytes = data['time'].nbytes + 1
+        c.get(data_path_and_name, 'egt_temperature')
+        self.assertEqual(len(c.entries), 0)
+        c.clear()
+        self.assertEqual(c.n_bytes, 0)
+
+
+if __name__ == '__main__':
+    suite = unittest.TestSuite()
+    suite.addTest(TestMatCache('test_mat_cache'))
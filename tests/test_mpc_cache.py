@@ -0,0 +1,63 @@
+# Testing of the MPCCache class from the ATOMS package
+import unittest
+import numpy as np
+from atoms.linearMPC import LinearMPC
+from atoms.mpc_cache import MPCCache
+from mpc_fixtures import dt, double_integrator
+
+
+class TestMPCCache(unittest.TestCase):
+
+    def test_mpc_cache(self):
+
+        # discrete-time double integrator, with two gains of the input
+        var = double_integrator()
+        var_gain = dict(var, B=np.array([[0], [2 * dt]]))
+
+        c = MPCCache(debug=True)
+        mpc = c.get(var, settings={'verbose': False})
+        mpc_gain = c.get(var_gain, formulation='condensed')
+        self.assertIsNot(mpc, mpc_gain)
+        self.assertEqual((c.n_hits, c.n_misses), (0, 2))
+        self.assertGreater(c.n_bytes, 0)
+
+        # switching back to a cached problem only updates the QP vectors
+        var_new = dict(var, x_0=np.array([0.5, 0.0]), x_r=np.array([-1.0, 0.0]), u_max=np.array([4]))
+        mpc_cached = c.get(var_new)
+        self.assertIs(mpc_cached, mpc)
+        self.assertEqual(c.n_hits, 1)
+        self.assertEqual(mpc.stats.records('setup').size, 1)
+        opti = LinearMPC()
+        opti.setup(var_new)
+        for name in ['q', 'l', 'u']:
+            self.assertTrue(np.allclose(mpc_cached.variables[name], opti.variables[name]))
+        self.assertTrue(np.allclose(mpc_cached.solve(), opti.solve(), atol=1e-3))
+
+        # a different model, weight or formulation is a different problem
+        c.get(dict(var, Q=np.diag([3, 2])))
+        c.get(var, formulation='condensed')
+        self.assertEqual(c.n_misses, 4)
+
+        # least recently used problems are evicted when the memory cap is exceeded
+        c.max_bytes = c.n_bytes - 1
+        c.get(dict(var, R=0.2 * np.eye(1)))
+        self.assertLessEqual(c.n_bytes, c.max_bytes)
+        self.assertLess(len(c.entries), 5)
+        self.assertIsNot(c.get(var_gain, formulation='condensed'), mpc_gain)
+        c.clear()
+        self.assertEqual(c.n_bytes, 0)
+
+        # the rate of change penalty makes a different problem, and a new previous input only updates the QP vectors
+        var_rate = dict(var, R_du=np.eye(1), du_min=np.array([-1]), du_max=np.array([1]))
+        mpc_rate = c.get(var_rate)
+        self.assertIsNot(mpc_rate, c.get(var))
+        var_rate.update({'u_prev': np.array([0.5])})
+        self.assertIs(c.get(var_rate), mpc_rate)
+        opti.setup(var_rate)
+        for name in ['q', 'l', 'u']:
+            self.assertTrue(np.allclose(mpc_rate.variables[name], opti.variables[name]))
+
+
+if __name__ == '__main__':
+    suite = unittest.TestSuite()
+    suite.addTest(TestMPCCache('test_mpc_cache'))
@@ -0,0 +1,57 @@
+# Testing of the CodegenLinearMPC class from the ATOMS package
+import tempfile
+import unittest
+import numpy as np
+from atoms.linearMPC import LinearMPC
+from atoms.mpc_codegen import CodegenLinearMPC
+from mpc_fixtures import double_integrator
+
+
+class TestCodegenLinearMPC(unittest.TestCase):
+
+    def test_codegen_linear_mpc(self):
+
+        # discrete-time double integrator
+        var = double_integrator()
+        A = var['A']
+        B = var['B']
+        settings = {'eps_abs': 1e-6, 'eps_rel': 1e-6}
+
+        with self.assertRaises(ValueError):
+            CodegenLinearMPC().setup(var, warm_start='shift')
+
+        with tempfile.TemporaryDirectory() as folder:
+            opti_codegen = CodegenLinearMPC(debug=True)
+            try:
+                opti_codegen.setup(var, folder=folder, extension_name='emosqp_test_mpc', settings=settings)
+            except ValueError as error:
+                self.skipTest(str(error))
+
+            opti = LinearMPC()
+            opti.setup(var, warm_start='previous')
+            opti.solver.update_settings(verbose=False, **settings)
+
+            # the same closed loop with the Python and the generated solvers
+            x_0 = var['x_0']
+            for i in range(50):
+                u_star = opti.solve()
+                u_star_codegen = opti_codegen.solve()
+                self.assertEqual(u_star_codegen.info['status'], 'solved')
+                self.assertTrue(np.allclose(u_star_codegen, u_star, atol=1e-4))
+                self.assertTrue(np.isclose(u_star_codegen.cost, u_star.cost, rtol=1e-4))
+                x_0 = A.dot(x_0) + B.dot(u_star.u_0)
+                opti.update(x_0=x_0, x_r=np.array([1.0 if i < 25 else -1.0, 0.0]))
+                opti_codegen.update(x_0=x_0, x_r=np.array([1.0 if i < 25 else -1.0, 0.0]))
+
+            # the matrices are parameters of the generated solver
+            opti.update_model(B=2 * B, u_max=np.array([4]))
+            opti_codegen.update_model(B=2 * B, u_max=np.array([4]))
+            self.assertTrue(np.allclose(opti_codegen.solve(), opti.solve(), atol=1e-4))
+
+            with self.assertRaises(ValueError):
+                opti_codegen.set_budget(max_iter=10)
+
+
+if __name__ == '__main__':
+    suite = unittest.TestSuite()
+    suite.addTest(TestCodegenLinearMPC('test_codegen_linear_mpc'))
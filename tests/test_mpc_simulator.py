@@ -0,0 +1,81 @@
+# Testing of the ClosedLoopSimulator class from the ATOMS package
+import unittest
+import numpy as np
+from atoms.linearMPC import LinearMPC
+from atoms.mpc_simulator import ClosedLoopSimulator
+from mpc_fixtures import dt, double_integrator
+
+
+class TestClosedLoopSimulator(unittest.TestCase):
+
+    def test_closed_loop_simulator(self):
+
+        # discrete-time double integrator
+        n_x = 2
+        n_u = 1
+        var = double_integrator()
+        A = var['A']
+        B = var['B']
+
+        # simulate the closed loop by hand
+        opti = LinearMPC()
+        opti.setup(var, warm_start='none')
+        n_sim = 50
+        y = np.zeros((n_sim + 1, n_x))
+        y[0] = var['x_0']
+        for i in range(n_sim):
+            u_star = opti.solve()
+            u = u_star[n_x * (var['N'] + 1):n_x * (var['N'] + 1) + n_u]
+            y[i + 1] = A.dot(y[i]) + B.dot(u)
+            opti.update(x_0=y[i + 1])
+
+        # the simulator gives the same trajectories, and reuses its buffers
+        opti_sim = LinearMPC()
+        opti_sim.setup(var, warm_start='none')
+        sim = ClosedLoopSimulator(opti_sim, debug=True)
+        states, inputs, references = sim.simulate(var['x_0'], n_sim)
+        self.assertTrue(np.allclose(states, y))
+        self.assertEqual(inputs.shape, (n_sim, n_u))
+        self.assertTrue(np.all(references == var['x_r']))
+
+        states_buffer = sim.states
+        sim.simulate(var['x_0'], n_sim, x_r=np.array([0.5, 0.0]))
+        self.assertIs(sim.states, states_buffer)
+        self.assertTrue(np.all(sim.references[:, 0] == 0.5))
+
+        # reference trajectory with preview, disturbance and model mismatch
+        time = dt * np.arange(n_sim + var['N'])
+        x_r = np.column_stack([np.sin(2 * np.pi * time), 2 * np.pi * np.cos(2 * np.pi * time)])
+        sim_mismatch = ClosedLoopSimulator(opti_sim, A=A, B=0.8 * B)
+        states, inputs, references = sim_mismatch.simulate(var['x_0'], n_sim, x_r=x_r,
+                                                           disturbance=lambda k, x, u: np.array([0, 1e-3]))
+        self.assertTrue(np.allclose(references, x_r[:n_sim]))
+        self.assertTrue(np.allclose(opti_sim.parameters['x_r'], x_r[n_sim - 1:n_sim + var['N']]))
+        self.assertTrue(np.allclose(states[1:], states[:-1].dot(A.T) + inputs.dot(0.8 * B.T) + [0, 1e-3]))
+
+        # nonlinear plant
+        states = sim.simulate(var['x_0'], n_sim, plant=lambda k, x, u: A.dot(x) + B.dot(np.tanh(u)))[0]
+        self.assertTrue(np.allclose(states[1:], states[:-1].dot(A.T) + np.tanh(sim.inputs).dot(B.T)))
+
+        # with limits on the rate of change, each simulation starts from the same previous input
+        opti_rate = LinearMPC()
+        opti_rate.setup(dict(var, R_du=np.eye(n_u), du_min=np.array([-0.5]), du_max=np.array([0.5])),
+                        warm_start='none')
+        sim_rate = ClosedLoopSimulator(opti_rate)
+        inputs = sim_rate.simulate(var['x_0'], n_sim)[1].copy()
+        self.assertTrue(np.allclose(sim_rate.simulate(var['x_0'], n_sim)[1], inputs, atol=1e-3))
+        self.assertTrue(np.all(np.abs(np.diff(np.vstack([np.zeros(n_u), inputs]), axis=0)) <= 0.5 + 1e-3))
+        inputs_prev = sim_rate.simulate(var['x_0'], n_sim, u_prev=np.array([2.0]))[1]
+        self.assertTrue(np.abs(inputs_prev[0, 0] - 2) <= 0.5 + 1e-3)
+
+        with self.assertRaises(ValueError):
+            sim.simulate(var['x_0'], n_sim, x_r=x_r[:10])
+        with self.assertRaises(ValueError):
+            ClosedLoopSimulator(opti_sim, A=np.eye(3))
+        with self.assertRaises(ValueError):
+            ClosedLoopSimulator(LinearMPC())
+
+
+if __name__ == '__main__':
+    suite = unittest.TestSuite()
+    suite.addTest(TestClosedLoopSimulator('test_closed_loop_simulator'))
@@ -0,0 +1,61 @@
+# Testing of the MPCSolution class from the ATOMS package
+import pickle
+import unittest
+import numpy as np
+from atoms.linearMPC import LinearMPC
+from atoms.mpc_solution import MPCSolution
+from mpc_fixtures import double_integrator
+
+
+class TestMPCSolution(unittest.TestCase):
+
+    def test_mpc_solution(self):
+
+        # discrete-time double integrator
+        n_x = 2
+        n_u = 1
+        var = double_integrator()
+        N = var['N']
+
+        opti = LinearMPC()
+        opti.setup(var)
+        u_star = opti.solve()
+        self.assertIsInstance(u_star, MPCSolution)
+        self.assertIn(f'Horizon: {N}, states: {n_x}, inputs: {n_u}', str(u_star))
+
+        # the accessors are reshaped views of the solution vector
+        self.assertEqual(u_star.states.shape, (N + 1, n_x))
+        self.assertEqual(u_star.inputs.shape, (N, n_u))
+        self.assertTrue(np.shares_memory(u_star.states, u_star))
+        self.assertTrue(np.shares_memory(u_star.inputs, u_star))
+        self.assertTrue(np.shares_memory(u_star.u_0, u_star))
+        self.assertTrue(np.all(u_star.states.ravel() == u_star[:(N + 1) * n_x]))
+        self.assertTrue(np.all(u_star.u_0 == u_star[n_x * (N + 1):n_x * (N + 1) + n_u]))
+        self.assertTrue(np.allclose(u_star.states[0], var['x_0'], atol=1e-4))
+
+        # slices and operations give plain arrays, and solutions are pickled as plain arrays
+        self.assertIs(type(u_star[:n_x]), np.ndarray)
+        self.assertIs(type(2 * u_star), np.ndarray)
+        self.assertIs(type(pickle.loads(pickle.dumps(u_star))), np.ndarray)
+
+        # cost and statistics of the solver
+        self.assertEqual(u_star.info['status'], 'solved')
+        self.assertFalse(u_star.info['fallback'])
+        self.assertGreater(u_star.info['iterations'], 0)
+        cost = 0.5 * np.sum((u_star.states[:N] - var['x_r']) @ var['Q'] * (u_star.states[:N] - var['x_r'])) + \
+            0.5 * (u_star.states[N] - var['x_r']) @ var['Q_N'] @ (u_star.states[N] - var['x_r']) + \
+            0.5 * np.sum(u_star.inputs @ var['R'] * u_star.inputs)
+        constant = 0.5 * N * var['x_r'] @ var['Q'] @ var['x_r'] + 0.5 * var['x_r'] @ var['Q_N'] @ var['x_r']
+        self.assertTrue(np.isclose(u_star.cost + constant, cost, rtol=1e-3))
+
+        # the condensed formulation has the same cost
+        opti_condensed = LinearMPC()
+        opti_condensed.setup(var, formulation='condensed')
+        u_star_condensed = opti_condensed.solve()
+        self.assertTrue(np.isclose(u_star_condensed.cost, u_star.cost, rtol=1e-3))
+        self.assertTrue(np.allclose(u_star_condensed.states, u_star.states, atol=1e-3))
+
+
+if __name__ == '__main__':
+    suite = unittest.TestSuite()
+    suite.addTest(TestMPCSolution('test_mpc_solution'))
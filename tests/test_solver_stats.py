@@ -0,0 +1,41 @@
+# Testing of the SolverStats class from the ATOMS package
+import unittest
+import numpy as np
+from atoms.solver_stats import SolverStats
+
+
+class TestSolverStats(unittest.TestCase):
+
+    def test_solver_stats(self):
+
+        stats = SolverStats(size=100, debug=True)
+        stats.record('setup', 0.5)
+        for k in range(150):
+            stats.record('solve', 1e-3 * (k + 1), iterations=k, primal_residual=1e-4, dual_residual=1e-5,
+                         status='solved', fallback=k % 10 == 0)
+        stats.record('update', 1e-4)
+
+        # the oldest records are overwritten, and records are returned from the oldest to the newest
+        records = stats.records()
+        self.assertEqual(stats.n_records, 152)
+        self.assertEqual(len(records), 100)
+        self.assertEqual(records['event'][-1], 'update')
+        self.assertTrue(np.all(np.diff(stats.records('solve')['iterations']) == 1))
+        self.assertEqual(stats.records('solve')['iterations'][0], 51)
+
+        summary = stats.summary()
+        self.assertEqual(list(summary.keys()), ['solve', 'update'])
+        self.assertEqual(summary['solve']['count'], 99)
+        self.assertAlmostEqual(summary['solve']['p100'], 0.15)
+        self.assertAlmostEqual(summary['solve']['iterations_p50'], 100)
+        self.assertEqual(summary['solve']['fallbacks'], 9)
+
+        stats.clear()
+        self.assertEqual(len(stats.records()), 0)
+        with self.assertRaises(ValueError):
+            SolverStats(size=0)
+
+
+if __name__ == '__main__':
+    suite = unittest.TestSuite()
+    suite.addTest(TestSolverStats('test_solver_stats'))